@@ -1,119 +1,272 @@
 """API обработчики для работы с персонами."""
 
 import json
-from utils.response_utils import send_json_response
+from utils.http_cache import version_etag
+from utils.response_utils import answer_json_not_modified, send_json_response
 from services.person_service import PersonService
+from services.relatives_service import RelativesService
+from services.search_service import SearchService
 from services.photo_service import PhotoService
 from services.blog_service import BlogService
 from services.message_service import MessageService
+from services.list_items import VersionConflict
 
 
 class PersonAPI:
     MAX_JSON_BODY_BYTES = 1024 * 1024
     MAX_UPLOAD_BODY_BYTES = 10 * 1024 * 1024
+    MAX_BATCH_PEOPLE = 200
 
-    def __init__(self, data_dirs, source_file=None, object_storage=None):
+    def __init__(
+        self,
+        data_dirs,
+        source_file=None,
+        object_storage=None,
+        json_cache=None,
+        storage_backend="json",
+    ):
         self.person_service = PersonService(source_file=source_file)
+        self.relatives_service = RelativesService(self.person_service)
+        self.search_service = SearchService(self.person_service)
         self.photo_service = PhotoService(
             data_dirs['photos'],
             object_storage=object_storage,
+            cache=json_cache,
+            backend=storage_backend,
+        )
+        self.blog_service = BlogService(
+            data_dirs['blog'],
+            cache=json_cache,
+            backend=storage_backend,
+        )
+        self.message_service = MessageService(
+            data_dirs['messages'],
+            cache=json_cache,
+            backend=storage_backend,
         )
-        self.blog_service = BlogService(data_dirs['blog'])
-        self.message_service = MessageService(data_dirs['messages'])
 
     def handle_health(self, handler):
         send_json_response(handler, {"status": "ok"})
 
-    def handle_get(self, handler, path_parts):
-        """Обработка GET запросов"""
-        person_id = path_parts[2]
-
-        if len(path_parts) == 3:
-            # GET /api/person/{id} - информация о персоне
-            person_info = self.person_service.get_person_info(person_id)
-            send_json_response(handler, person_info)
-
-        elif len(path_parts) == 4:
-            resource = path_parts[3]
-            if resource == 'photos':
-                # GET /api/person/{id}/photos
-                photos = self.photo_service.get_photos(person_id)
-                send_json_response(handler, photos)
-            elif resource == 'blog':
-                # GET /api/person/{id}/blog
-                posts = self.blog_service.get_posts(person_id)
-                send_json_response(handler, posts)
-            elif resource == 'messages':
-                # GET /api/person/{id}/messages
-                messages = self.message_service.get_messages(person_id)
-                send_json_response(handler, messages)
-            else:
-                handler.send_error(404)
-        else:
-            handler.send_error(404)
-
-    def handle_post(self, handler, path_parts):
-        """Обработка POST запросов"""
-        person_id = path_parts[2]
-        resource = path_parts[3]
-
-        if resource == 'photos':
-            self._upload_photo(handler, person_id)
-        elif resource == 'blog':
-            self._add_blog_post(handler, person_id)
-        elif resource == 'messages':
-            self._save_messages(handler, person_id)
-        else:
-            handler.send_error(404)
+    def register_routes(self, router):
+        """Регистрация маршрутов /api/person/..."""
+        router.add("GET", "/api/people", self.get_people)
+        router.add("GET", "/api/search", self.search_people)
+        person = "/api/person/{person_id}"
+        router.add("GET", person, self.get_person)
+        router.add("GET", f"{person}/relatives", self.get_relatives)
+        router.add("GET", f"{person}/photos", self.get_photos)
+        router.add("GET", f"{person}/blog", self.get_blog)
+        router.add("GET", f"{person}/messages", self.get_messages)
+        router.add("POST", f"{person}/photos", self.upload_photo)
+        router.add("POST", f"{person}/blog", self.add_blog_post)
+        router.add("POST", f"{person}/messages", self.add_message)
+        router.add("PUT", f"{person}/messages", self.save_messages)
+        router.add("PATCH", f"{person}/photos/reorder", self.reorder_photos)
+        router.add("PATCH", f"{person}/blog/{{item_id}}", self.update_blog_post)
+        router.add("PATCH", f"{person}/messages/{{item_id}}", self.update_message)
+        router.add("DELETE", f"{person}/photos/{{item_id}}", self.delete_photo)
+        router.add("DELETE", f"{person}/blog/{{item_id}}", self.delete_blog_post)
+        router.add("DELETE", f"{person}/messages/{{item_id}}", self.delete_message)
+
+    def get_person(self, handler, request):
+        """GET /api/person/{id} - информация о персоне"""
+        etag = version_etag(self.person_service.version())
+        if answer_json_not_modified(handler, etag):
+            return
+        person_info = self.person_service.get_person_info(request.params['person_id'])
+        send_json_response(handler, person_info, etag=etag)
 
-    def handle_patch(self, handler, path_parts):
-        """Обработка PATCH запросов"""
-        person_id = path_parts[2]
-        resource = path_parts[3]
+    def get_people(self, handler, request):
+        """GET /api/people?ids=node1,node2 - несколько персон одним запросом"""
+        person_ids = []
+        for value in request.query.get('ids', []):
+            for person_id in value.split(','):
+                person_id = person_id.strip()
+                if person_id and person_id not in person_ids:
+                    person_ids.append(person_id)
+        if not person_ids:
+            handler.send_error(400, "Не указаны ID персон")
+            return
+        if len(person_ids) > self.MAX_BATCH_PEOPLE:
+            handler.send_error(
+                400, f"Можно запросить не больше {self.MAX_BATCH_PEOPLE} персон"
+            )
+            return
 
-        if resource == 'photos' and len(
-                path_parts) == 5 and path_parts[4] == 'reorder':
-            self._reorder_photos(handler, person_id)
-        else:
-            handler.send_error(404)
+        etag = version_etag(self.person_service.version())
+        if answer_json_not_modified(handler, etag):
+            return
+        people = self.person_service.get_people(person_ids)
+        send_json_response(handler, {'people': people}, etag=etag)
 
-    def handle_put(self, handler, path_parts):
-        """Обработка PUT запросов"""
-        person_id = path_parts[2]
-        resource = path_parts[3]
+    def search_people(self, handler, request):
+        """GET /api/search?q=&limit=&offset= - поиск персон"""
+        query = request.query_value('q').strip()
+        if not query:
+            handler.send_error(400, "Пустой поисковый запрос")
+            return
+        try:
+            limit = int(request.query_value('limit', self.search_service.DEFAULT_LIMIT))
+            offset = int(request.query_value('offset', 0))
+        except ValueError:
+            handler.send_error(400, "Некорректные параметры страницы")
+            return
+        if not 1 <= limit <= self.search_service.MAX_LIMIT or offset < 0:
+            handler.send_error(400, "Некорректные параметры страницы")
+            return
 
-        if resource == 'messages':
-            self._save_messages(handler, person_id)
-        else:
-            handler.send_error(404)
+        etag = version_etag(self.person_service.version())
+        if answer_json_not_modified(handler, etag):
+            return
+        results = self.search_service.search(query, limit=limit, offset=offset)
+        send_json_response(handler, results, etag=etag)
 
-    def handle_delete(self, handler, path_parts):
-        """Обработка DELETE запросов"""
-        person_id = path_parts[2]
-        resource = path_parts[3]
+    def get_relatives(self, handler, request):
+        """GET /api/person/{id}/relatives?depth=N - родственники до N-го круга"""
+        max_depth = self.relatives_service.MAX_DEPTH
         try:
-            item_id = int(path_parts[4])
+            depth = int(request.query_value('depth', '1'))
         except ValueError:
-            handler.send_error(400, "Некорректный ID элемента")
+            depth = 0
+        if not 1 <= depth <= max_depth:
+            handler.send_error(400, f"Глубина должна быть от 1 до {max_depth}")
             return
 
-        if resource == 'photos':
-            try:
-                self.photo_service.delete_photo(person_id, item_id)
-                send_json_response(handler, {'success': True})
-            except (IndexError, FileNotFoundError):
-                handler.send_error(404, "Фотография не найдена")
-        elif resource == 'blog':
+        etag = version_etag(self.person_service.version())
+        if answer_json_not_modified(handler, etag):
+            return
+        relatives = self.relatives_service.get_relatives(request.params['person_id'], depth)
+        if relatives is None:
+            handler.send_error(404, "Персона не найдена")
+            return
+        send_json_response(handler, relatives, etag=etag)
+
+    def get_photos(self, handler, request):
+        """GET /api/person/{id}/photos"""
+        person_id = request.params['person_id']
+        etag = version_etag(self.photo_service.version(person_id))
+        if answer_json_not_modified(handler, etag):
+            return
+        photos = self.photo_service.get_photos(person_id)
+        send_json_response(handler, photos, etag=etag)
+
+    def get_blog(self, handler, request):
+        """GET /api/person/{id}/blog[?limit=&before=|?since=]"""
+        self._send_item_list(handler, request, self.blog_service, self.blog_service.get_posts)
+
+    def get_messages(self, handler, request):
+        """GET /api/person/{id}/messages[?limit=&before=|?since=]"""
+        self._send_item_list(
+            handler, request, self.message_service, self.message_service.get_messages
+        )
+
+    def _send_item_list(self, handler, request, service, load_all):
+        """Весь список, страница (limit, before) или изменения (since)."""
+        person_id = request.params['person_id']
+        query = request.query
+        try:
+            if 'since' in query:
+                since = int(request.query_value('since'))
+                if since < 0:
+                    raise ValueError
+            elif 'limit' in query or 'before' in query:
+                limit = int(request.query_value('limit', service.DEFAULT_LIMIT))
+                if not 1 <= limit <= service.MAX_LIMIT:
+                    raise ValueError
+        except ValueError:
+            handler.send_error(400, "Некорректные параметры страницы")
+            return
+
+        etag = version_etag(service.version(person_id))
+        if answer_json_not_modified(handler, etag):
+            return
+        if 'since' in query:
+            data = service.get_changes(person_id, since)
+        elif 'limit' in query or 'before' in query:
             try:
-                self.blog_service.delete_post(person_id, item_id)
-                send_json_response(handler, {'success': True})
-            except IndexError:
-                handler.send_error(404, "Запись не найдена")
+                data = service.get_page(person_id, limit, request.query_value('before') or None)
+            except KeyError:
+                handler.send_error(400, "Курсор страницы не найден")
+                return
+        else:
+            data = load_all(person_id)
+        send_json_response(handler, data, etag=etag)
+
+    def delete_photo(self, handler, request):
+        """DELETE /api/person/{id}/photos/{photo_id}[?version=]"""
+        self._delete_item(
+            handler, request, self.photo_service.delete_photo, 'photo', "Фотография не найдена"
+        )
+
+    def delete_blog_post(self, handler, request):
+        """DELETE /api/person/{id}/blog/{post_id}[?version=]"""
+        self._delete_item(
+            handler, request, self.blog_service.delete_post, 'post', "Запись не найдена"
+        )
+
+    def delete_message(self, handler, request):
+        """DELETE /api/person/{id}/messages/{message_id}[?version=]"""
+        self._delete_item(
+            handler, request, self.message_service.delete_message, 'message', "Сообщение не найдено"
+        )
+
+    def update_blog_post(self, handler, request):
+        """PATCH /api/person/{id}/blog/{post_id} - правка записи, в теле ее version"""
+        self._update_item(
+            handler, request, self.blog_service.update_post, 'post', "Запись не найдена"
+        )
+
+    def update_message(self, handler, request):
+        """PATCH /api/person/{id}/messages/{message_id} - правка, в теле ее version"""
+        self._update_item(
+            handler, request, self.message_service.update_message, 'message', "Сообщение не найдено"
+        )
+
+    def _update_item(self, handler, request, update, name, not_found):
+        changes = self._read_json_object(handler)
+        if changes is None:
+            return
+        version = changes.get('version')
+        if not _is_version(version):
+            handler.send_error(400, "Не указана версия элемента")
+            return
+        try:
+            item = update(request.params['person_id'], request.params['item_id'], changes, version)
+        except KeyError:
+            handler.send_error(404, not_found)
+        except VersionConflict as conflict:
+            self._send_conflict(handler, name, conflict)
+        else:
+            send_json_response(handler, {'success': True, name: item})
+
+    def _delete_item(self, handler, request, delete, name, not_found):
+        version = request.query_value('version', None)
+        try:
+            version = None if version is None else int(version)
+        except ValueError:
+            handler.send_error(400, "Некорректная версия элемента")
+            return
+        try:
+            delete(request.params['person_id'], request.params['item_id'], version)
+        except (KeyError, FileNotFoundError):
+            handler.send_error(404, not_found)
+        except VersionConflict as conflict:
+            self._send_conflict(handler, name, conflict)
         else:
-            handler.send_error(404)
+            send_json_response(handler, {'success': True})
+
+    def _send_conflict(self, handler, name, conflict):
+        """409 с текущим состоянием элемента, чтобы клиент мог повторить правку."""
+        send_json_response(
+            handler,
+            {'success': False, 'error': "Элемент уже изменен", name: conflict.current},
+            status=409,
+        )
 
-    def _upload_photo(self, handler, person_id):
+    def upload_photo(self, handler, request):
         """Загрузка фотографии"""
+        person_id = request.params['person_id']
         try:
             content_type = handler.headers.get('Content-Type', '')
             if not content_type.startswith('multipart/form-data'):
@@ -137,25 +290,25 @@ class PersonAPI:
             print(f"Ошибка загрузки фотографии: {e}")
             handler.send_error(500)
 
-    def _add_blog_post(self, handler, person_id):
-        """Добавление записи в блог"""
-        try:
-            content_length = self._content_length(handler)
-            if content_length > self.MAX_JSON_BODY_BYTES:
-                handler.send_error(413, "Запрос слишком большой")
-                return
-            post_data = handler.rfile.read(content_length).decode('utf-8')
-            post_info = json.loads(post_data)
-
-            self.blog_service.add_post(person_id, post_info)
-            send_json_response(handler, {'success': True})
+    def add_blog_post(self, handler, request):
+        """POST /api/person/{id}/blog - новая запись в начало блога"""
+        post_info = self._read_json_object(handler)
+        if post_info is None:
+            return
+        post = self.blog_service.add_post(request.params['person_id'], post_info)
+        send_json_response(handler, {'success': True, 'post': post})
 
-        except Exception as e:
-            print(f"Ошибка добавления записи в блог: {e}")
-            handler.send_error(500)
+    def add_message(self, handler, request):
+        """POST /api/person/{id}/messages - одно новое сообщение"""
+        message = self._read_json_object(handler)
+        if message is None:
+            return
+        message = self.message_service.add_message(request.params['person_id'], message)
+        send_json_response(handler, {'success': True, 'message': message})
 
-    def _save_messages(self, handler, person_id):
-        """Сохранение сообщений"""
+    def save_messages(self, handler, request):
+        """PUT /api/person/{id}/messages - замена всех сообщений (импорт)"""
+        person_id = request.params['person_id']
         try:
             content_length = self._content_length(handler)
             if content_length > self.MAX_JSON_BODY_BYTES:
@@ -171,8 +324,9 @@ class PersonAPI:
             print(f"Ошибка сохранения сообщений: {e}")
             handler.send_error(500)
 
-    def _reorder_photos(self, handler, person_id):
+    def reorder_photos(self, handler, request):
         """Изменение порядка фотографий"""
+        person_id = request.params['person_id']
         try:
             content_length = self._content_length(handler)
             if content_length > self.MAX_JSON_BODY_BYTES:
@@ -199,6 +353,26 @@ class PersonAPI:
             print(f"Ошибка изменения порядка фотографий: {e}")
             handler.send_error(500)
 
+    def _read_json_object(self, handler):
+        """JSON-объект из тела запроса; None — ответ об ошибке уже отправлен."""
+        try:
+            content_length = self._content_length(handler)
+        except ValueError as e:
+            handler.send_error(400, str(e))
+            return None
+        if content_length > self.MAX_JSON_BODY_BYTES:
+            handler.send_error(413, "Запрос слишком большой")
+            return None
+        try:
+            data = json.loads(handler.rfile.read(content_length).decode('utf-8'))
+        except ValueError:
+            handler.send_error(400, "Некорректный JSON")
+            return None
+        if not isinstance(data, dict):
+            handler.send_error(400, "Ожидается JSON-объект")
+            return None
+        return data
+
     def _content_length(self, handler):
         try:
             content_length = int(handler.headers.get('Content-Length', 0))
@@ -207,3 +381,7 @@ class PersonAPI:
         if content_length <= 0:
             raise ValueError("Пустой запрос")
         return content_length
+
+
+def _is_version(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
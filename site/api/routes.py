@@ -1,8 +1,140 @@
-"""Small route helpers shared by HTTP handlers and API classes."""
+"""Small route helpers shared by HTTP handlers and API classes.
 
-from urllib.parse import unquote, urlparse
+Routes are declared once as ``METHOD /path/{param}`` patterns and compiled
+into a trie keyed by path segment, so matching a request costs one dict
+lookup per segment instead of a chain of prefix and length checks.  The
+request target is parsed once into a ``Request`` that auth, routing,
+endpoints and response headers all share.
+"""
+
+from urllib.parse import parse_qs, unquote, urlsplit
 
 
 def parse_api_path(path):
-    parsed_path = urlparse(path).path
-    return [unquote(part) for part in parsed_path.split("/") if part]
+    return list(Request("GET", path).parts)
+
+
+class Request:
+    __slots__ = (
+        "method", "raw_path", "path", "parts", "query_string", "params", "login", "_query",
+    )
+
+    def __init__(self, method, raw_path):
+        target = urlsplit(raw_path)
+        self.method = method
+        self.raw_path = raw_path
+        self.path = target.path
+        self.parts = tuple(unquote(part) for part in target.path.split("/") if part)
+        self.query_string = target.query
+        self.params = {}
+        self.login = None
+        self._query = None
+
+    @property
+    def query(self):
+        if self._query is None:
+            self._query = parse_qs(self.query_string)
+        return self._query
+
+    def query_value(self, name, default=""):
+        return self.query.get(name, [default])[0]
+
+
+def request_for(handler):
+    """Return the parsed request of ``handler``, parsing it at most once.
+
+    The result is cached on the handler and reparsed only when the method or
+    path changes (the next request on a keep-alive connection, or the
+    ``/`` -> ``/index.html`` rewrite).
+    """
+    method = getattr(handler, "command", "GET")
+    raw_path = getattr(handler, "path", "/")
+    request = getattr(handler, "_parsed_request", None)
+    if request is None or request.raw_path != raw_path or request.method != method:
+        request = Request(method, raw_path)
+        handler._parsed_request = request
+    return request
+
+
+class RouteMatch:
+    __slots__ = ("endpoint", "params", "allowed_methods")
+
+    def __init__(self, endpoint=None, params=None, allowed_methods=()):
+        self.endpoint = endpoint
+        self.params = params or {}
+        self.allowed_methods = allowed_methods
+
+
+class _RouteNode:
+    __slots__ = ("static", "param_name", "param_node", "endpoints")
+
+    def __init__(self):
+        self.static = {}
+        self.param_name = None
+        self.param_node = None
+        self.endpoints = {}
+
+
+class Router:
+    def __init__(self):
+        self.root = _RouteNode()
+
+    def add(self, method, pattern, endpoint):
+        """Register ``endpoint(handler, request)`` for ``method`` and ``pattern``."""
+        node = self.root
+        for segment in (part for part in pattern.split("/") if part):
+            if segment.startswith("{") and segment.endswith("}"):
+                name = segment[1:-1]
+                if node.param_node is None:
+                    node.param_name, node.param_node = name, _RouteNode()
+                elif node.param_name != name:
+                    raise ValueError(
+                        f"Конфликт параметров маршрута: {{{node.param_name}}} и {segment}"
+                    )
+                node = node.param_node
+            else:
+                node = node.static.setdefault(segment, _RouteNode())
+        if method in node.endpoints:
+            raise ValueError(f"Маршрут уже зарегистрирован: {method} {pattern}")
+        node.endpoints[method] = endpoint
+
+    def match(self, method, parts):
+        """Return the ``RouteMatch`` for a request, or ``None`` for unknown paths.
+
+        ``HEAD`` falls back to the ``GET`` endpoint of the path; the caller
+        drops the body.  A known path without ``method`` yields a match with
+        no endpoint and the methods that path does support, so callers can
+        answer ``405``.
+        """
+        allowed = set()
+        for node, params in self._walk(self.root, parts, 0, {}):
+            endpoint = node.endpoints.get(method)
+            if endpoint is None and method == "HEAD":
+                endpoint = node.endpoints.get("GET")
+            if endpoint is not None:
+                return RouteMatch(endpoint, params)
+            allowed.update(node.endpoints)
+        if "GET" in allowed:
+            allowed.add("HEAD")
+        if allowed:
+            return RouteMatch(allowed_methods=tuple(sorted(allowed)))
+        return None
+
+    def _walk(self, node, parts, index, params):
+        # Static segments win over parameters; the parameter branch is only
+        # tried when the static one has no route for this path or method.
+        if index == len(parts):
+            if node.endpoints:
+                yield node, params
+            return
+        segment = parts[index]
+        static_node = node.static.get(segment)
+        if static_node is not None:
+            yield from self._walk(static_node, parts, index + 1, params)
+        if node.param_node is not None:
+            yield from self._walk(
+                node.param_node,
+                parts,
+                index + 1,
+                {**params, node.param_name: segment},
+            )
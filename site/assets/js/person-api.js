@@ -93,8 +93,8 @@ class PersonAPI {
                     'Content-Type': 'application/json',
                 },
                 body: JSON.stringify({
-                    message: message,
-                    timestamp: Date.now()
+                    text: message,
+                    timestamp: new Date().toISOString()
                 })
             });
 
@@ -115,18 +115,20 @@ class PersonAPI {
      * @param {string} personId - ID персоны
      * @param {string} messageId - ID сообщения
      * @param {string} newMessage - новый текст сообщения
-     * @returns {Promise<Object>} результат операции
+     * @param {number} version - версия сообщения, которую видел пользователь
+     * @returns {Promise<Object>} результат операции (HTTP 409 — сообщение уже изменено)
      */
-    async updateMessage(personId, messageId, newMessage) {
+    async updateMessage(personId, messageId, newMessage, version) {
         try {
-            const response = await fetch(`${this.baseUrl}/person/${personId}/messages/${messageId}`, {
-                method: 'PUT',
+            const response = await fetch(`${this.baseUrl}/person/${personId}/messages/${encodeURIComponent(messageId)}`, {
+                method: 'PATCH',
                 headers: {
                     'Content-Type': 'application/json',
                 },
                 body: JSON.stringify({
-                    message: newMessage,
-                    updated: Date.now()
+                    text: newMessage,
+                    updatedAt: new Date().toISOString(),
+                    version: version
                 })
             });
 
@@ -146,11 +148,13 @@ class PersonAPI {
      * Удаление сообщения
      * @param {string} personId - ID персоны
      * @param {string} messageId - ID сообщения
+     * @param {number} [version] - удалить, только если сообщение не изменилось
      * @returns {Promise<Object>} результат операции
      */
-    async deleteMessage(personId, messageId) {
+    async deleteMessage(personId, messageId, version) {
         try {
-            const response = await fetch(`${this.baseUrl}/person/${personId}/messages/${messageId}`, {
+            const query = version === undefined ? '' : `?version=${version}`;
+            const response = await fetch(`${this.baseUrl}/person/${personId}/messages/${encodeURIComponent(messageId)}${query}`, {
                 method: 'DELETE'
             });
 
@@ -205,7 +209,7 @@ class PersonAPI {
      */
     async deletePhoto(personId, photoId) {
         try {
-            const response = await fetch(`${this.baseUrl}/person/${personId}/photos/${photoId}`, {
+            const response = await fetch(`${this.baseUrl}/person/${personId}/photos/${encodeURIComponent(photoId)}`, {
                 method: 'DELETE'
             });
 
@@ -235,6 +235,7 @@ class PersonMessages {
             if (item.text !== undefined) {
                 messages.push({
                     id: item.id || `msg_${Date.now()}_${index}`,
+                    version: item.version || 0,
                     text: item.text,
                     timestamp: item.timestamp || new Date().toISOString(),
                     updatedAt: item.updatedAt || item.edited || item.editedAt
@@ -244,6 +245,7 @@ class PersonMessages {
             else if (item.type === 'text') {
                 messages.push({
                     id: item.id || `legacy_${Date.now()}_${index}`,
+                    version: item.version || 0,
                     text: item.content,
                     timestamp: item.date || item.editedDate || new Date().toISOString(),
                     updatedAt: item.editedDate
@@ -338,14 +340,16 @@ class PersonMessages {
      */
     async addMessage(text) {
         try {
-            const newMessage = {
-                id: `msg_${Date.now()}_${Math.random().toString(36).substr(2, 9)}`,
+            const response = await this.sendMessageRequest('POST', '', {
                 text: text,
                 timestamp: new Date().toISOString()
-            };
+            });
+            if (!response.ok) {
+                throw new Error(`Ошибка добавления сообщения: ${response.status}`);
+            }
 
-            this.messages.unshift(newMessage);
-            await this.saveMessages();
+            const data = await response.json();
+            this.messages.unshift(...this.convertLegacyMessages([data.message]));
             this.renderMessages();
 
             if (window.showSuccess) {
@@ -370,13 +374,21 @@ class PersonMessages {
                 throw new Error('Сообщение не найдено');
             }
 
-            this.messages[messageIndex] = {
-                ...this.messages[messageIndex],
+            const message = this.messages[messageIndex];
+            const response = await this.sendMessageRequest('PATCH', `/${encodeURIComponent(message.id)}`, {
                 text: text,
-                updatedAt: new Date().toISOString()
-            };
+                updatedAt: new Date().toISOString(),
+                version: message.version
+            });
+            if (await this.reloadOnConflict(response)) {
+                return;
+            }
+            if (!response.ok) {
+                throw new Error(`Ошибка обновления сообщения: ${response.status}`);
+            }
 
-            await this.saveMessages();
+            const data = await response.json();
+            this.messages[messageIndex] = this.convertLegacyMessages([data.message])[0];
             this.renderMessages();
 
             if (window.showSuccess) {
@@ -410,8 +422,20 @@ class PersonMessages {
         }
 
         try {
+            const message = this.messages[index];
+            const response = await this.sendMessageRequest(
+                'DELETE',
+                `/${encodeURIComponent(message.id)}?version=${message.version}`
+            );
+            if (await this.reloadOnConflict(response)) {
+                return;
+            }
+            // 404 — сообщение уже удалено в другом окне.
+            if (!response.ok && response.status !== 404) {
+                throw new Error(`Ошибка удаления сообщения: ${response.status}`);
+            }
+
             this.messages.splice(index, 1);
-            await this.saveMessages();
             this.renderMessages();
 
             if (window.showSuccess) {
@@ -427,27 +451,31 @@ class PersonMessages {
     }
 
     /**
-     * Сохранение сообщений на сервер
+     * Запрос к API сообщений: отправляется только одно сообщение
      */
-    async saveMessages() {
-        try {
-            const personId = window.getPersonIdFromUrl ? getPersonIdFromUrl() : this.getPersonIdFromUrl();
-            const response = await fetch(`/api/person/${personId}/messages`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify(this.messages)
-            });
-
-            if (!response.ok) {
-                throw new Error('Ошибка сохранения сообщений');
-            }
+    sendMessageRequest(method, suffix, body = null) {
+        const personId = window.getPersonIdFromUrl ? getPersonIdFromUrl() : this.getPersonIdFromUrl();
+        const options = { method: method };
+        if (body !== null) {
+            options.headers = { 'Content-Type': 'application/json' };
+            options.body = JSON.stringify(body);
+        }
+        return fetch(`/api/person/${personId}/messages${suffix}`, options);
+    }
 
-        } catch (error) {
-            console.error('Ошибка сохранения сообщений:', error);
-            throw error;
+    /**
+     * 409: сообщение изменили в другом окне — показываем актуальный список
+     */
+    async reloadOnConflict(response) {
+        if (response.status !== 409) {
+            return false;
+        }
+        if (window.showError) {
+            showError('Сообщение уже изменено в другом окне, список обновлен');
         }
+        const personId = window.getPersonIdFromUrl ? getPersonIdFromUrl() : this.getPersonIdFromUrl();
+        await this.loadMessages(personId);
+        return true;
     }
 
     /**
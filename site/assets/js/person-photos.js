@@ -557,11 +557,13 @@ class PersonPhotos {
 
         try {
             const personId = getPersonIdFromUrl();
-            const response = await fetch(`/api/person/${personId}/photos/${index}`, {
+            const photo = this.photos[index];
+            const response = await fetch(`/api/person/${personId}/photos/${encodeURIComponent(photo.id)}`, {
                 method: 'DELETE'
             });
 
-            if (!response.ok) {
+            // 404 — фотография уже удалена в другом окне.
+            if (!response.ok && response.status !== 404) {
                 throw new Error('Ошибка удаления фотографии');
             }
 
@@ -0,0 +1,293 @@
+"""Asyncio server core for the family tree site.
+
+Connections are accepted and read on a single event loop with non-blocking
+sockets, so idle keep-alive connections cost a coroutine rather than an OS
+thread.  Once a full request has arrived it is handed to
+``PersonalDataHandler`` on a bounded thread pool: routing, auth, rate
+limiting and ``PersonAPI`` stay exactly as in the threaded server, and
+blocking file and S3 work never runs on the event loop.
+"""
+
+import asyncio
+import concurrent.futures
+import io
+import os
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+
+MAX_HEADER_BYTES = 64 * 1024
+SENDFILE_CHUNK_BYTES = 1024 * 1024
+
+
+class StreamWriterFile(io.RawIOBase):
+    """``wfile`` that forwards handler output from a worker thread to the loop.
+
+    Each write waits until the transport has drained, so a slow client slows
+    down only the worker serving it instead of buffering the whole response.
+    A client that reads nothing for ``timeout`` seconds is disconnected and
+    the handler gets a ``ConnectionError``, so it can't hold a pool worker
+    indefinitely.
+    """
+
+    def __init__(self, writer, loop, timeout=30):
+        super().__init__()
+        self.writer = writer
+        self.loop = loop
+        self.timeout = timeout
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        if data:
+            self._run(self._write(data))
+        return len(data)
+
+    def sendfile(self, source, offset=0, count=None):
+        """Send part of a file with ``loop.sendfile`` (``os.sendfile`` if possible).
+
+        The file goes out in chunks, each bounded by ``timeout``, so a large
+        download by a slow but live client isn't cut off.
+        """
+        if count is None:
+            count = source.seek(0, os.SEEK_END) - offset
+        while count > 0:
+            sent = self._run(self.loop.sendfile(
+                self.writer.transport,
+                source,
+                offset,
+                min(count, SENDFILE_CHUNK_BYTES),
+            ))
+            if not sent:
+                break
+            offset += sent
+            count -= sent
+
+    def _run(self, coroutine):
+        future = asyncio.run_coroutine_threadsafe(
+            asyncio.wait_for(coroutine, self.timeout),
+            self.loop,
+        )
+        try:
+            # The loop enforces the timeout; the extra second only covers a
+            # loop too busy to deliver the result.
+            return future.result(self.timeout + 1)
+        except (asyncio.TimeoutError, concurrent.futures.TimeoutError):
+            future.cancel()
+            self.loop.call_soon_threadsafe(self.writer.transport.abort)
+            raise ConnectionAbortedError("Client stopped reading the response")
+
+    async def _write(self, data):
+        self.writer.write(data)
+        await self.writer.drain()
+
+
+class StreamRequest:
+    """In-memory stand-in for the client socket of one request.
+
+    ``PersonalDataHandler`` is built through its normal ``__init__`` with
+    this object as ``request``, so ``StreamRequestHandler.setup()`` sets
+    ``connection``, ``rfile`` and ``wfile`` as it does for a real socket:
+    ``rfile`` reads the request the loop has already received and writes
+    go to ``StreamWriterFile``.  Socket options are no-ops because the loop
+    owns the real socket; the write timeout is enforced by
+    ``StreamWriterFile``.
+    """
+
+    def __init__(self, raw_request, writer, loop, timeout=30):
+        self.rfile = io.BufferedReader(io.BytesIO(raw_request))
+        self.wfile = StreamWriterFile(writer, loop, timeout=timeout)
+
+    def makefile(self, mode="r", buffering=None):
+        return self.rfile if "r" in mode else self.wfile
+
+    def sendall(self, data):
+        self.wfile.write(data)
+
+    def sendfile(self, source, offset=0, count=None):
+        self.wfile.sendfile(source, offset, count)
+
+    def settimeout(self, timeout):
+        pass
+
+    def setblocking(self, flag):
+        pass
+
+    def setsockopt(self, *args):
+        pass
+
+
+class AsyncFamilyTreeServer:
+    def __init__(
+        self,
+        handler_class,
+        host,
+        port,
+        worker_threads=16,
+        idle_timeout=30,
+        max_body_bytes=10 * 1024 * 1024,
+        shutdown_timeout=10,
+    ):
+        self.handler_class = handler_class
+        self.host = host
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.max_body_bytes = max_body_bytes
+        self.shutdown_timeout = shutdown_timeout
+        self.executor = ThreadPoolExecutor(
+            max_workers=worker_threads,
+            thread_name_prefix="family-tree-worker",
+        )
+        self.server = None
+        self.connections = set()
+        self.stopping = None
+
+    async def start(self):
+        self.stopping = asyncio.Event()
+        self.server = await asyncio.start_server(
+            self.handle_connection,
+            self.host,
+            self.port,
+            limit=MAX_HEADER_BYTES,
+            reuse_address=True,
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        await self.stopping.wait()
+        await self.shutdown()
+
+    def request_shutdown(self):
+        if self.stopping is not None:
+            self.stopping.set()
+
+    async def shutdown(self):
+        """Stop accepting, let in-flight requests finish, then close the pool."""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+        if self.connections:
+            _, pending = await asyncio.wait(
+                list(self.connections),
+                timeout=self.shutdown_timeout,
+            )
+            for task in pending:
+                task.cancel()
+        self.executor.shutdown(wait=True)
+
+    async def handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self.connections.add(task)
+        client_address = writer.get_extra_info("peername") or ("unknown", 0)
+        loop = asyncio.get_running_loop()
+        requests_handled = 0
+        try:
+            while not self.stopping.is_set():
+                try:
+                    request = await asyncio.wait_for(
+                        self._read_request(reader),
+                        timeout=self.idle_timeout,
+                    )
+                except (
+                    asyncio.TimeoutError,
+                    asyncio.IncompleteReadError,
+                    asyncio.LimitOverrunError,
+                    ValueError,
+                ):
+                    break
+                if request is None:
+                    break
+
+                keep_alive = await loop.run_in_executor(
+                    self.executor,
+                    self._dispatch,
+                    request,
+                    writer,
+                    loop,
+                    client_address,
+                    requests_handled,
+                )
+                requests_handled += 1
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.connections.discard(task)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader):
+        head = await reader.readuntil(b"\r\n\r\n")
+        content_length = _content_length(head)
+        if content_length > self.max_body_bytes:
+            # The handler answers 413 from the headers alone; the unread body
+            # means this connection can't be reused.
+            return head, False
+        body = await reader.readexactly(content_length) if content_length else b""
+        return head + body, True
+
+    def wait_for_next_request(self, connection, timeout):
+        """Each handler serves one request; the loop reads the next one."""
+        return False
+
+    def _dispatch(self, request, writer, loop, client_address, requests_handled=0):
+        raw_request, body_complete = request
+        handler = self.handler_class.__new__(self.handler_class)
+        # The per-connection request count outlives the handler, which the
+        # normal __init__ below runs to completion (setup, handle, finish).
+        handler.requests_handled = requests_handled
+        try:
+            handler.__init__(
+                StreamRequest(raw_request, writer, loop, timeout=self.idle_timeout),
+                client_address,
+                self,
+            )
+        except ConnectionError:
+            return False
+        return body_complete and not handler.close_connection
+
+
+def _content_length(head):
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            content_length = int(value.strip())
+            if content_length < 0:
+                raise ValueError("Negative Content-Length")
+            return content_length
+    return 0
+
+
+def run_async_server(settings, handler_class):
+    """Blocking entry point used by ``server.py`` in asyncio mode."""
+    server = AsyncFamilyTreeServer(
+        handler_class,
+        settings.host,
+        settings.port,
+        worker_threads=settings.worker_threads,
+        idle_timeout=settings.keepalive_timeout_seconds,
+        max_body_bytes=handler_class.person_api.MAX_UPLOAD_BODY_BYTES,
+    )
+
+    async def main():
+        await server.start()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, server.request_shutdown)
+            except (NotImplementedError, RuntimeError):
+                pass
+        await server.serve_forever()
+
+    asyncio.run(main())
@@ -17,6 +17,10 @@ class ObjectStorageConfig:
     region_name: str = "ru-central1"
 
 
+SERVER_MODES = {"threaded", "pooled", "asyncio", "prefork"}
+STORAGE_BACKENDS = {"json", "jsonl", "sqlite"}
+
+
 @dataclass(frozen=True)
 class Settings:
     site_root: Path
@@ -25,6 +29,24 @@ class Settings:
     port: int = 8000
     data_dir: Path = None
     source_file: Path = None
+    server_mode: str = "threaded"
+    worker_threads: int = 16
+    worker_processes: int = 2
+    accept_queue_size: int = 64
+    upload_concurrency: int = 2
+    write_concurrency: int = 8
+    read_concurrency: int = 32
+    retry_after_seconds: int = 5
+    rate_limit_requests: int = 120
+    rate_limit_window_seconds: int = 60
+    login_rate_limit: int = 600
+    write_rate_limit: int = 60
+    upload_rate_limit: int = 20
+    keepalive_timeout_seconds: int = 15
+    keepalive_max_requests: int = 1000
+    compressed_cache_bytes: int = 32 * 1024 * 1024
+    json_cache_bytes: int = 16 * 1024 * 1024
+    storage_backend: str = "json"
     auth: AuthConfig = AuthConfig()
     object_storage: ObjectStorageConfig = ObjectStorageConfig()
 
@@ -44,6 +66,24 @@ def load_settings(site_root=None):
     )
     source_file = os.environ.get("FAMILY_TREE_SOURCE_FILE")
     data_dir = _project_path(project_root, data_directory)
+    server_mode = os.environ.get(
+        "FAMILY_TREE_SERVER_MODE",
+        values.get("server_mode", "threaded"),
+    ).strip().lower()
+    if server_mode not in SERVER_MODES:
+        raise ValueError(
+            f"Unknown FAMILY_TREE_SERVER_MODE: {server_mode} "
+            f"(expected one of: {', '.join(sorted(SERVER_MODES))})"
+        )
+    storage_backend = os.environ.get(
+        "FAMILY_TREE_STORAGE_BACKEND",
+        values.get("storage_backend", "json"),
+    ).strip().lower()
+    if storage_backend not in STORAGE_BACKENDS:
+        raise ValueError(
+            f"Unknown FAMILY_TREE_STORAGE_BACKEND: {storage_backend} "
+            f"(expected one of: {', '.join(sorted(STORAGE_BACKENDS))})"
+        )
 
     return Settings(
         site_root=site_root,
@@ -52,11 +92,59 @@ def load_settings(site_root=None):
         port=int(os.environ.get("FAMILY_TREE_PORT", values.get("port", 8000))),
         data_dir=data_dir,
         source_file=_project_path(project_root, source_file or "source.txt"),
+        server_mode=server_mode,
+        worker_threads=_int_setting(values, "FAMILY_TREE_WORKER_THREADS", "worker_threads", 16),
+        worker_processes=_int_setting(
+            values, "FAMILY_TREE_WORKER_PROCESSES", "worker_processes", os.cpu_count() or 2),
+        accept_queue_size=_int_setting(
+            values, "FAMILY_TREE_ACCEPT_QUEUE_SIZE", "accept_queue_size", 64),
+        upload_concurrency=_int_setting(
+            values, "FAMILY_TREE_UPLOAD_CONCURRENCY", "upload_concurrency", 2),
+        write_concurrency=_int_setting(
+            values, "FAMILY_TREE_WRITE_CONCURRENCY", "write_concurrency", 8),
+        read_concurrency=_int_setting(
+            values, "FAMILY_TREE_READ_CONCURRENCY", "read_concurrency", 32),
+        retry_after_seconds=_int_setting(
+            values, "FAMILY_TREE_RETRY_AFTER_SECONDS", "retry_after_seconds", 5),
+        rate_limit_requests=_int_setting(
+            values, "FAMILY_TREE_RATE_LIMIT_REQUESTS", "rate_limit_requests", 120),
+        rate_limit_window_seconds=_int_setting(
+            values, "FAMILY_TREE_RATE_LIMIT_WINDOW_SECONDS", "rate_limit_window_seconds", 60),
+        login_rate_limit=_int_setting(
+            values, "FAMILY_TREE_LOGIN_RATE_LIMIT", "login_rate_limit", 600),
+        write_rate_limit=_int_setting(
+            values, "FAMILY_TREE_WRITE_RATE_LIMIT", "write_rate_limit", 60),
+        upload_rate_limit=_int_setting(
+            values, "FAMILY_TREE_UPLOAD_RATE_LIMIT", "upload_rate_limit", 20),
+        keepalive_timeout_seconds=_int_setting(
+            values, "FAMILY_TREE_KEEPALIVE_TIMEOUT_SECONDS", "keepalive_timeout_seconds", 15),
+        keepalive_max_requests=_int_setting(
+            values, "FAMILY_TREE_KEEPALIVE_MAX_REQUESTS", "keepalive_max_requests", 1000),
+        compressed_cache_bytes=_int_setting(
+            values,
+            "FAMILY_TREE_COMPRESSED_CACHE_BYTES",
+            "compressed_cache_bytes",
+            32 * 1024 * 1024,
+        ),
+        json_cache_bytes=_int_setting(
+            values,
+            "FAMILY_TREE_JSON_CACHE_BYTES",
+            "json_cache_bytes",
+            16 * 1024 * 1024,
+        ),
+        storage_backend=storage_backend,
         auth=load_auth_config(),
         object_storage=load_object_storage_config(),
     )
 
 
+def _int_setting(values, env_name, config_name, default):
+    value = int(os.environ.get(env_name, values.get(config_name, default)))
+    if value <= 0:
+        raise ValueError(f"{env_name} must be a positive integer")
+    return value
+
+
 def _project_path(project_root, path_value):
     path = Path(path_value)
     if path.is_absolute():
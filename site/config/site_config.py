@@ -8,6 +8,38 @@ version = "2.0.0"
 # Настройки сервера
 host = "127.0.0.1"
 port = 8000
+server_mode = "threaded"  # "pooled", "asyncio" или "prefork"
+worker_threads = 16
+# worker_processes = 4  # для prefork; по умолчанию число CPU
+
+# Ограничения нагрузки (режимы pooled и asyncio используют пул worker_threads)
+accept_queue_size = 64
+upload_concurrency = 2
+write_concurrency = 8
+read_concurrency = 32
+retry_after_seconds = 5
+
+# Лимиты запросов за окно rate_limit_window_seconds: по IP, по логину,
+# а также отдельно на изменения и загрузку фото для одного клиента
+rate_limit_requests = 120
+rate_limit_window_seconds = 60
+login_rate_limit = 600
+write_rate_limit = 60
+upload_rate_limit = 20
+
+# HTTP/1.1 keep-alive
+keepalive_timeout_seconds = 15
+keepalive_max_requests = 1000
+
+# Память под кэш сжатых статических файлов (gzip / br / zstd)
+compressed_cache_bytes = 32 * 1024 * 1024
+
+# Память под кэш прочитанных JSON-файлов фото, блогов и сообщений
+json_cache_bytes = 16 * 1024 * 1024
+
+# Хранилище фото, блогов и сообщений: "json" (файл на персону), "jsonl"
+# (журнал с дозаписью) или "sqlite" (одна база person_data.sqlite3, см. README)
+storage_backend = "json"
 
 # Пути к файлам
 data_directory = "person_data"
@@ -1,46 +1,159 @@
 """Основной HTTP обработчик."""
 
+import functools
 import http.server
+import io
+import json
+import os
 import secrets
-import time
-from collections import defaultdict, deque
-from urllib.parse import parse_qs, quote, urlparse
-from utils.file_utils import serve_file, ensure_directories_exist
-from utils.response_utils import setup_cors_headers
+import stat
+from urllib.parse import quote, urlparse
+from utils.file_utils import serve_file, send_file_body, ensure_directories_exist
+from utils.compression import (
+    COMPRESSION_MIN_BYTES,
+    CompressedAssetCache,
+    is_compressible,
+    negotiate_encoding,
+)
+from utils.http_cache import (
+    FILE_ETAGS,
+    encoded_etag,
+    http_date,
+    is_not_modified,
+    send_not_modified,
+)
+from utils.http_range import (
+    RangeNotSatisfiable,
+    content_range,
+    parse_range,
+    range_value,
+    requested_range,
+    send_range_not_satisfiable,
+)
+from utils.limits import ConcurrencyLimiter, ServerMetrics
+from utils.rate_limit import RateLimiter
+from utils.response_utils import send_json_response, setup_cors_headers
 from api.person_api import PersonAPI
-from api.routes import parse_api_path
+from api.routes import Router, request_for
 from config.settings import load_settings
 from auth.yandex_id import YandexIDAuth
+from storage.json_store import JsonListCache
 from storage.object_storage import S3ObjectStorage
 
 
-class RateLimiter:
-    def __init__(self, limit=120, window_seconds=60):
-        self.limit = limit
-        self.window_seconds = window_seconds
-        self.requests = defaultdict(deque)
+def _call(method_name):
+    """Endpoint that calls a handler method by name, so subclasses can override it."""
+    return lambda handler, request: getattr(handler, method_name)()
 
-    def allow(self, key, now=None):
-        now = now if now is not None else time.time()
-        entries = self.requests[key]
-        cutoff = now - self.window_seconds
-        while entries and entries[0] <= cutoff:
-            entries.popleft()
-        if len(entries) >= self.limit:
+
+def route_limits(settings):
+    return {
+        "read": settings.read_concurrency,
+        "write": settings.write_concurrency,
+        "upload": settings.upload_concurrency,
+    }
+
+
+def route_rate_limits(settings):
+    return {
+        "write": settings.write_rate_limit,
+        "upload": settings.upload_rate_limit,
+    }
+
+
+def with_route_limit(method):
+    """Run ``method`` only if its route class has a free concurrency slot."""
+
+    @functools.wraps(method)
+    def wrapper(self):
+        route_class = self._route_class()
+        if not self.concurrency.try_acquire(route_class):
+            self._send_overloaded()
+            return
+        try:
+            method(self)
+        finally:
+            self.concurrency.release(route_class)
+
+    return wrapper
+
+
+class RequestBody:
+    """``rfile`` limited to the request's Content-Length.
+
+    Endpoints read the body through it as before; afterwards ``remaining``
+    tells whether the connection still holds unread body bytes.
+    """
+
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.rfile.read(size) if size else b""
+        self.remaining -= len(data)
+        return data
+
+    def readline(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.rfile.readline(size) if size else b""
+        self.remaining -= len(data)
+        return data
+
+    def discard(self, max_bytes):
+        """Read and drop the unread body if it is at most ``max_bytes``."""
+        if self.remaining > max_bytes:
             return False
-        entries.append(now)
+        while self.remaining:
+            if not self.read(min(self.remaining, 64 * 1024)):
+                return False
         return True
 
 
+class DiscardedBody:
+    """``wfile`` for a HEAD request served by a GET endpoint.
+
+    The endpoint writes its full response; ``flush_headers`` sends the
+    status line and headers to ``headers_file`` and the body is dropped.
+    """
+
+    def __init__(self, headers_file):
+        self.headers_file = headers_file
+
+    def write(self, data):
+        return len(data)
+
+    def flush(self):
+        pass
+
+
 class PersonalDataHandler(http.server.SimpleHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open between requests (Caddy pools them),
+    # so every response must carry Content-Length.  Headers and body are
+    # separate writes; without TCP_NODELAY the body waits for the client's
+    # delayed ACK (~40 ms) on a reused connection.
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    MAX_DISCARDED_BODY_BYTES = 64 * 1024
+    body_range = None
     CACHEABLE_EXTENSIONS = {
         ".css", ".js", ".svg", ".jpg", ".jpeg", ".png", ".gif", ".webp", ".ico",
     }
     settings = load_settings()
     person_api = None
+    router = None
     auth = YandexIDAuth(settings.auth)
     rate_limiter = RateLimiter()
+    route_rate_limits = route_rate_limits(settings)
     object_storage = None
+    timeout = settings.keepalive_timeout_seconds
+    compressed_assets = CompressedAssetCache(settings.compressed_cache_bytes)
+    max_requests_per_connection = settings.keepalive_max_requests
+    metrics = ServerMetrics()
+    concurrency = ConcurrencyLimiter(route_limits(settings), metrics)
 
     @classmethod
     def configure(cls, settings):
@@ -51,8 +164,21 @@ class PersonalDataHandler(http.server.SimpleHTTPRequestHandler):
             data_dirs,
             source_file=settings.source_file,
             object_storage=cls.object_storage,
+            json_cache=JsonListCache(settings.json_cache_bytes),
+            storage_backend=settings.storage_backend,
         )
         cls.auth = YandexIDAuth(settings.auth)
+        cls.rate_limiter = RateLimiter(
+            limit=settings.rate_limit_requests,
+            window_seconds=settings.rate_limit_window_seconds,
+        )
+        cls.route_rate_limits = route_rate_limits(settings)
+        cls.timeout = settings.keepalive_timeout_seconds
+        cls.compressed_assets = CompressedAssetCache(settings.compressed_cache_bytes)
+        cls.max_requests_per_connection = settings.keepalive_max_requests
+        cls.metrics = ServerMetrics()
+        cls.concurrency = ConcurrencyLimiter(route_limits(settings), cls.metrics)
+        cls.router = cls.build_router(cls.person_api)
 
     def __init__(self, *args, **kwargs):
         if self.__class__.person_api is None:
@@ -60,108 +186,286 @@ class PersonalDataHandler(http.server.SimpleHTTPRequestHandler):
 
         super().__init__(*args, **kwargs)
 
+    @classmethod
+    def build_router(cls, person_api):
+        router = Router()
+        router.add("GET", "/api/health", _call("handle_health"))
+        router.add("HEAD", "/api/health", _call("handle_health_head"))
+        router.add("GET", "/api/metrics", _call("handle_metrics"))
+        router.add("GET", "/auth/login", _call("handle_auth_login"))
+        router.add("GET", "/auth/callback", _call("handle_auth_callback"))
+        router.add("GET", "/auth/logout", _call("handle_auth_logout"))
+        router.add("GET", "/auth/logged-out", _call("handle_auth_logged_out"))
+        person_api.register_routes(router)
+        return router
+
+    @with_route_limit
     def do_GET(self):
-        if not self._check_rate_limit():
-            return
-        if not self._require_auth():
-            return
+        self.handle_request()
 
-        if self.path.startswith('/auth/'):
-            self.handle_auth_get()
-            return
+    @with_route_limit
+    def do_HEAD(self):
+        self.handle_request()
 
-        # Обработка API запросов
-        if self.path.startswith('/api/'):
-            self.handle_api_get()
-        # Обработка запросов к данным персон (включая фотографии)
-        elif self.path.startswith('/person_data/'):
-            serve_file(
-                self,
-                self.path,
-                data_dir=self.settings.data_dir,
-                object_storage=self.object_storage,
-            )
-        elif self.path == '/':
-            self.path = '/index.html'
-            super().do_GET()
-        else:
-            super().do_GET()
+    @with_route_limit
+    def do_POST(self):
+        self.handle_request()
 
-    def do_HEAD(self):
-        if not self._check_rate_limit():
-            return
-        if not self._require_auth():
-            return
+    @with_route_limit
+    def do_PUT(self):
+        self.handle_request()
 
-        if self._path_parts() == ["api", "health"]:
-            self.send_response(200)
-            self.end_headers()
-        elif self.path.startswith('/person_data/'):
-            serve_file(
-                self,
-                self.path,
-                send_body=False,
-                data_dir=self.settings.data_dir,
-                object_storage=self.object_storage,
-            )
-        else:
-            super().do_HEAD()
+    @with_route_limit
+    def do_PATCH(self):
+        self.handle_request()
 
-    def do_POST(self):
-        if not self._check_rate_limit():
-            return
-        if not self._require_auth():
-            return
+    @with_route_limit
+    def do_DELETE(self):
+        self.handle_request()
+
+    def handle_one_request(self):
+        self.requests_handled = getattr(self, "requests_handled", 0)
+        # Состояние ответа живет в обработчике соединения: HEAD не вызывает
+        # copyfile, а ответ, прерванный исключением, не доходит до
+        # end_headers, и без сброса их диапазон и заголовки достались бы
+        # следующему запросу.
+        self.body_range = None
+        self.pending_headers = ()
+        self.response_has_etag = False
+        super().handle_one_request()
+        self.requests_handled += 1
+        if self.requests_handled >= self.max_requests_per_connection:
+            self.close_connection = True
+
+    def handle(self):
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self._next_request_arrived():
+            self.handle_one_request()
+
+    def _next_request_arrived(self):
+        """Ждет следующий запрос keep-alive соединения.
+
+        Сервер с пулом потоков (``wait_for_next_request``) закрывает
+        простаивающее соединение, как только поток нужен ожидающим в очереди;
+        остальные серверы ждут запрос до ``timeout`` сокета.
+        """
+        wait = getattr(self.server, "wait_for_next_request", None)
+        if wait is None or self._has_buffered_request():
+            return True
+        return wait(self.connection, self.timeout)
 
-        if self.path.startswith('/api/'):
-            self.handle_api_post()
-        else:
-            self.send_error(404)
+    def _has_buffered_request(self):
+        # Запрос, пришедший вместе с предыдущим, уже прочитан в буфер rfile,
+        # и select о нем не узнает; неблокирующий peek не ждет сокет.
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
 
-    def do_PUT(self):
-        if not self._check_rate_limit():
+    def do_OPTIONS(self):
+        """Обработка OPTIONS запросов для CORS"""
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def handle_request(self):
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            self.send_error(411, "Требуется Content-Length")
             return
-        if not self._require_auth():
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.send_error(400, "Некорректная длина запроса")
             return
 
-        if self.path.startswith('/api/'):
-            self.handle_api_put()
-        else:
-            self.send_error(404)
-
-    def do_PATCH(self):
+        socket_rfile = self.rfile
+        body = self.rfile = RequestBody(socket_rfile, length)
+        try:
+            self.route_request()
+        finally:
+            self.rfile = socket_rfile
+            # A body the endpoint did not read would be parsed as the next
+            # request; small leftovers are drained, large ones end the connection.
+            if body.remaining and not body.discard(self.MAX_DISCARDED_BODY_BYTES):
+                self.close_connection = True
+
+    def route_request(self):
         if not self._check_rate_limit():
             return
         if not self._require_auth():
             return
+        if not self._check_client_rate_limits():
+            return
 
-        if self.path.startswith('/api/'):
-            self.handle_api_patch()
-        else:
-            self.send_error(404)
-
-    def do_DELETE(self):
-        if not self._check_rate_limit():
+        request = request_for(self)
+        match = self.router.match(self.command, request.parts)
+        if match is None:
+            self.handle_unrouted(request)
             return
-        if not self._require_auth():
+        if match.endpoint is None:
+            self.send_response(405)
+            self.send_header("Allow", ", ".join(match.allowed_methods))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
             return
 
-        if self.path.startswith('/api/'):
-            self.handle_api_delete()
-        else:
+        request.params = match.params
+        socket_wfile = self.wfile
+        if self.command == "HEAD":
+            self.wfile = DiscardedBody(socket_wfile)
+        try:
+            match.endpoint(self, request)
+        except Exception as e:
+            print(f"Ошибка API {self.command}: {e}")
+            self.send_error(500)
+        finally:
+            self.wfile = socket_wfile
+
+    def handle_unrouted(self, request):
+        """Статика и файлы персон: всё, что не описано в таблице маршрутов."""
+        section = request.parts[0] if request.parts else ""
+        if section in {"api", "auth"} or self.command not in {"GET", "HEAD"}:
             self.send_error(404)
+        elif section == "person_data":
+            # Обработка запросов к данным персон (включая фотографии)
+            serve_file(
+                self,
+                self.path,
+                send_body=self.command == "GET",
+                data_dir=self.settings.data_dir,
+                object_storage=self.object_storage,
+            )
+        elif self.command == "HEAD":
+            super().do_HEAD()
+        else:
+            if request.path == "/":
+                self.path = "/index.html"
+            super().do_GET()
 
-    def do_OPTIONS(self):
-        """Обработка OPTIONS запросов для CORS"""
+    def send_head(self):
+        """Статика с сильным ETag, сжатием, диапазонами и ответом 304."""
+        path = self.translate_path(self.path)
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            stat_result = None
+        if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+            return super().send_head()
+
+        etag = FILE_ETAGS.etag(path, stat_result)
+        content_type = self.guess_type(path)
+        encoding = None
+        self.pending_headers = []
+        if is_compressible(content_type):
+            self.pending_headers.append(("Vary", "Accept-Encoding"))
+            # Диапазоны относятся к несжатому файлу.
+            if stat_result.st_size >= COMPRESSION_MIN_BYTES and not range_value(self.headers):
+                encoding = negotiate_encoding(self.headers.get("Accept-Encoding"))
+        if encoding:
+            etag = encoded_etag(etag, encoding)
+
+        if is_not_modified(self.headers, etag, stat_result.st_mtime):
+            send_not_modified(self, etag, stat_result.st_mtime)
+            return None
+        if encoding:
+            body = self.compressed_assets.get(path, stat_result, encoding)
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Encoding", encoding)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Last-Modified", http_date(stat_result.st_mtime))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return io.BytesIO(body)
+
+        size = stat_result.st_size
+        byte_range = requested_range(self.headers, etag, stat_result.st_mtime)
+        try:
+            span = parse_range(byte_range, size) if byte_range else None
+        except RangeNotSatisfiable:
+            send_range_not_satisfiable(self, size)
+            return None
+        if span is None:
+            self.pending_headers += [("ETag", etag), ("Accept-Ranges", "bytes")]
+            return super().send_head()
+
+        start, end = span
+        source = open(path, "rb")
+        self.send_response(206)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Content-Range", content_range(start, end, size))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Last-Modified", http_date(stat_result.st_mtime))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.body_range = (start, end - start + 1)
+        return source
+
+    def copyfile(self, source, outputfile):
+        if outputfile is self.wfile:
+            offset, count = self.body_range or (0, None)
+            self.body_range = None
+            send_file_body(self, source, offset=offset, count=count)
+        else:
+            super().copyfile(source, outputfile)
+
+    def send_header(self, keyword, value):
+        if keyword.lower() == "etag":
+            self.response_has_etag = True
+        super().send_header(keyword, value)
+
+    def send_error(self, code, message=None, explain=None):
+        # Строка статуса кодируется в latin-1: русский текст уходит в тело.
+        if message and not message.isascii():
+            message, explain = None, explain or message
+        # ETag, Vary и Content-Encoding готовились для успешного ответа.
+        self.pending_headers = ()
+        self.response_has_etag = False
+        super().send_error(code, message, explain)
+
+    def handle_health(self):
+        self.person_api.handle_health(self)
+
+    def handle_health_head(self):
         self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(json.dumps({"status": "ok"}))))
         self.end_headers()
 
+    def handle_metrics(self):
+        send_json_response(self, self.metrics.snapshot())
+
     def _path_parts(self):
-        return parse_api_path(self.path)
+        return list(request_for(self).parts)
+
+    def _route_class(self):
+        command = getattr(self, "command", "GET")
+        if command in {"GET", "HEAD"}:
+            return "read"
+        if command == "POST" and self._path_parts()[-1:] == ["photos"]:
+            return "upload"
+        return "write"
+
+    def _send_overloaded(self):
+        self.close_connection = True
+        self.send_response(503)
+        self.send_header("Retry-After", str(self.settings.retry_after_seconds))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
 
     @classmethod
     def is_cacheable_path(cls, path):
-        request_path = urlparse(path).path
+        return cls._is_cacheable_request_path(urlparse(path).path)
+
+    @classmethod
+    def _is_cacheable_request_path(cls, request_path):
         if request_path in {"", "/"}:
             return False
         if request_path.startswith("/api/"):
@@ -174,31 +478,35 @@ class PersonalDataHandler(http.server.SimpleHTTPRequestHandler):
         if not self.auth.config.enabled:
             return True
 
-        if self.auth.is_public_path(self.path):
+        request = request_for(self)
+        if self.auth.is_public_path(request.path):
             return True
 
         cookie_header = self.headers.get("Cookie", "")
         login = self.auth.login_from_cookie_header(cookie_header)
         if login:
+            request.login = login
             is_write_request = getattr(self, "command", "GET") in {
                 "POST", "PUT", "PATCH", "DELETE",
             }
             if is_write_request and not self.auth.can_write(login):
                 self.send_response(403)
+                self.send_header("Content-Length", "0")
                 self.end_headers()
                 return False
             if is_write_request:
-                print(f"AUDIT write login={login} method={self.command} path={urlparse(self.path).path}")
+                print(f"AUDIT write login={login} method={self.command} path={request.path}")
             return True
 
-        request_path = urlparse(self.path).path
-        if request_path.startswith("/api/"):
+        if request.parts[:1] == ("api",):
             self.send_response(401)
+            self.send_header("Content-Length", "0")
             self.end_headers()
             return False
 
         self.send_response(302)
         self.send_header("Location", f"/auth/login?next={quote(self.path, safe='')}")
+        self.send_header("Content-Length", "0")
         self.end_headers()
         return False
 
@@ -206,34 +514,41 @@ class PersonalDataHandler(http.server.SimpleHTTPRequestHandler):
         return getattr(self, "command", "GET") in {"POST", "PUT", "PATCH", "DELETE"}
 
     def _audit_write(self, login):
-        print(f"AUDIT write login={login} method={self.command} path={urlparse(self.path).path}")
+        print(f"AUDIT write login={login} method={self.command} path={request_for(self).path}")
 
     def _check_rate_limit(self):
-        client_ip = self.client_address[0] if getattr(self, "client_address", None) else "unknown"
-        if self.rate_limiter.allow(client_ip):
+        """Лимит по IP проверяется до авторизации, чтобы защищать и OAuth."""
+        return self._allow_request(f"ip:{self._client_ip()}")
+
+    def _check_client_rate_limits(self):
+        """Лимиты по логину и по классу маршрута (запись, загрузка фото)."""
+        request = request_for(self)
+        client = f"login:{request.login}" if request.login else f"ip:{self._client_ip()}"
+        if request.login and not self._allow_request(client, self.settings.login_rate_limit):
+            return False
+        route_class = self._route_class()
+        route_limit = self.route_rate_limits.get(route_class)
+        if route_limit is None:
             return True
+        return self._allow_request(f"{route_class}:{client}", route_limit)
+
+    def _allow_request(self, key, limit=None):
+        if self.rate_limiter.allow(key, limit=limit):
+            return True
+        self.metrics.increment("rejected.rate_limit")
         self.send_response(429)
         self.send_header("Retry-After", str(self.rate_limiter.window_seconds))
+        self.send_header("Content-Length", "0")
         self.end_headers()
         return False
 
-    def handle_auth_get(self):
-        path = urlparse(self.path).path
-        if path == "/auth/login":
-            self.handle_auth_login()
-        elif path == "/auth/callback":
-            self.handle_auth_callback()
-        elif path == "/auth/logout":
-            self.handle_auth_logout()
-        elif path == "/auth/logged-out":
-            self.handle_auth_logged_out()
-        else:
-            self.send_error(404)
+    def _client_ip(self):
+        return self.client_address[0] if getattr(self, "client_address", None) else "unknown"
 
     def handle_auth_login(self):
-        query = parse_qs(urlparse(self.path).query)
-        next_path = query.get("next", ["/"])[0]
-        force_confirm = query.get("force_confirm", [""])[0].lower() in {
+        request = request_for(self)
+        next_path = request.query_value("next", "/")
+        force_confirm = request.query_value("force_confirm").lower() in {
             "1", "true", "yes",
         }
         state = secrets.token_urlsafe(24)
@@ -244,12 +559,13 @@ class PersonalDataHandler(http.server.SimpleHTTPRequestHandler):
             "Location",
             self.auth.authorization_url(state, force_confirm=force_confirm),
         )
+        self.send_header("Content-Length", "0")
         self.end_headers()
 
     def handle_auth_callback(self):
-        query = parse_qs(urlparse(self.path).query)
-        state = query.get("state", [""])[0]
-        code = query.get("code", [""])[0]
+        request = request_for(self)
+        state = request.query_value("state")
+        code = request.query_value("code")
         state_payload = self.auth.state_from_cookie_header(
             self.headers.get("Cookie", "")
         )
@@ -272,6 +588,7 @@ class PersonalDataHandler(http.server.SimpleHTTPRequestHandler):
             self.send_header("Set-Cookie", self.auth.expired_session_cookie())
             self.send_header("Set-Cookie", self.auth.expired_state_cookie())
             self.send_header("Location", "/auth/logged-out?reason=access-denied")
+            self.send_header("Content-Length", "0")
             self.end_headers()
             return
 
@@ -279,16 +596,18 @@ class PersonalDataHandler(http.server.SimpleHTTPRequestHandler):
         self.send_header("Set-Cookie", self.auth.session_set_cookie(login))
         self.send_header("Set-Cookie", self.auth.expired_state_cookie())
         self.send_header("Location", state_payload.get("next", "/"))
+        self.send_header("Content-Length", "0")
         self.end_headers()
 
     def handle_auth_logout(self):
         self.send_response(302)
         self.send_header("Set-Cookie", self.auth.expired_session_cookie())
         self.send_header("Location", "/auth/logged-out")
+        self.send_header("Content-Length", "0")
         self.end_headers()
 
     def handle_auth_logged_out(self):
-        reason = parse_qs(urlparse(self.path).query).get("reason", [""])[0]
+        reason = request_for(self).query_value("reason")
         access_denied = reason == "access-denied"
         title = "Доступа нет" if access_denied else "Вы вышли из аккаунта"
         message = (
@@ -322,79 +641,29 @@ class PersonalDataHandler(http.server.SimpleHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(encoded)
 
-    def handle_api_get(self):
-        """Обработка GET запросов к API"""
-        try:
-            path_parts = self._path_parts()
-
-            if path_parts == ["api", "health"]:
-                self.person_api.handle_health(self)
-            elif len(path_parts) >= 3 and path_parts[1] == 'person':
-                self.person_api.handle_get(self, path_parts)
-            else:
-                self.send_error(404)
-
-        except Exception as e:
-            print(f"Ошибка API GET: {e}")
-            self.send_error(500)
-
-    def handle_api_post(self):
-        """Обработка POST запросов к API"""
+    def flush_headers(self):
+        body_file = self.wfile
+        self.wfile = getattr(body_file, "headers_file", body_file)
         try:
-            path_parts = self._path_parts()
-
-            if len(path_parts) >= 4 and path_parts[1] == 'person':
-                self.person_api.handle_post(self, path_parts)
-            else:
-                self.send_error(404)
-
-        except Exception as e:
-            print(f"Ошибка API POST: {e}")
-            self.send_error(500)
-
-    def handle_api_put(self):
-        """Обработка PUT запросов к API"""
-        try:
-            path_parts = self._path_parts()
-
-            if len(path_parts) >= 4 and path_parts[1] == 'person':
-                self.person_api.handle_put(self, path_parts)
-            else:
-                self.send_error(404)
-
-        except Exception as e:
-            print(f"Ошибка API PUT: {e}")
-            self.send_error(500)
-
-    def handle_api_patch(self):
-        """Обработка PATCH запросов к API"""
-        try:
-            path_parts = self._path_parts()
-
-            if len(path_parts) >= 4 and path_parts[1] == 'person':
-                self.person_api.handle_patch(self, path_parts)
-            else:
-                self.send_error(404)
-
-        except Exception as e:
-            print(f"Ошибка API PATCH: {e}")
-            self.send_error(500)
-
-    def handle_api_delete(self):
-        """Обработка DELETE запросов к API"""
-        try:
-            path_parts = self._path_parts()
-
-            if len(path_parts) >= 5 and path_parts[1] == 'person':
-                self.person_api.handle_delete(self, path_parts)
-            else:
-                self.send_error(404)
-
-        except Exception as e:
-            print(f"Ошибка API DELETE: {e}")
-            self.send_error(500)
+            super().flush_headers()
+        finally:
+            self.wfile = body_file
 
     def end_headers(self):
-        setup_cors_headers(self, cacheable=self.is_cacheable_path(self.path))
+        for name, value in getattr(self, "pending_headers", ()):
+            self.send_header(name, value)
+        self.pending_headers = ()
+        revalidate = getattr(self, "response_has_etag", False)
+        self.response_has_etag = False
+        last_request = (
+            getattr(self, "requests_handled", 0) + 1 >= self.max_requests_per_connection
+        )
+        if last_request and not self.close_connection:
+            self.send_header("Connection", "close")
+        setup_cors_headers(
+            self,
+            cacheable=self._is_cacheable_request_path(request_for(self).path),
+            revalidate=revalidate,
+        )
 
         super().end_headers()
@@ -0,0 +1,108 @@
+"""Pre-fork serving: N worker processes behind one listening socket.
+
+The supervisor binds the socket once and forks workers that all accept from
+it, so CPU-heavy requests in one worker (JSON encoding, multipart parsing)
+no longer stall the others on the GIL.  Crashed workers are restarted.
+State that must be shared between workers is created before forking: the
+rate limiter lives in shared memory and ``JsonListStore`` updates are
+serialised with file locks.
+"""
+
+import os
+import signal
+import socket
+import time
+
+
+RESTART_BACKOFF_SECONDS = 1
+MAX_RESTART_BACKOFF_SECONDS = 30
+
+
+def listening_socket(host, port, backlog=128):
+    """Bind the shared listener.
+
+    Workers inherit this one socket and all accept from it; no per-worker
+    sockets are bound.  ``SO_REUSEADDR`` lets a restarted supervisor bind
+    the port again while old connections are still in ``TIME_WAIT``.
+    """
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(backlog)
+    return listener
+
+
+class PreforkSupervisor:
+    def __init__(self, worker_count, target, listener):
+        self.worker_count = worker_count
+        self.target = target
+        self.listener = listener
+        self.workers = {}
+        self.stopping = False
+        self.backoff = RESTART_BACKOFF_SECONDS
+
+    def run(self):
+        previous_handlers = {
+            signum: signal.signal(signum, self._handle_stop_signal)
+            for signum in (signal.SIGINT, signal.SIGTERM)
+        }
+        try:
+            for slot in range(self.worker_count):
+                self._spawn(slot)
+            self._supervise()
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+    def stop(self):
+        self.stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _handle_stop_signal(self, signum, frame):
+        self.stop()
+
+    def _spawn(self, slot):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                self.target(self.listener)
+            except BaseException as error:
+                print(f"Рабочий процесс {os.getpid()} завершился с ошибкой: {error}")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        self.workers[pid] = (slot, time.monotonic())
+        return pid
+
+    def _supervise(self):
+        while self.workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            slot, started_at = self.workers.pop(pid, (None, None))
+            if slot is None or self.stopping:
+                continue
+
+            print(
+                f"Рабочий процесс {pid} остановлен "
+                f"(код {os.waitstatus_to_exitcode(status)}), перезапуск"
+            )
+            # A worker that dies right after start would otherwise be
+            # restarted in a tight loop.
+            if time.monotonic() - started_at < MAX_RESTART_BACKOFF_SECONDS:
+                time.sleep(self.backoff)
+                self.backoff = min(self.backoff * 2, MAX_RESTART_BACKOFF_SECONDS)
+            else:
+                self.backoff = RESTART_BACKOFF_SECONDS
+            if not self.stopping:
+                self._spawn(slot)
@@ -3,9 +3,17 @@
 """Основной сервер для генеалогического дерева."""
 
 from handlers.http_handler import PersonalDataHandler
+from async_server import run_async_server
+from prefork import PreforkSupervisor, listening_socket
+from utils.shared_rate_limit import SharedRateLimiter
+import queue
+import select
+import signal
 import socketserver
 import sys
 import os
+import threading
+import time
 from config.settings import load_settings
 
 # Добавляем текущую директорию в путь для импорта модулей
@@ -16,6 +24,177 @@ class FamilyTreeTCPServer(socketserver.ThreadingTCPServer):
     allow_reuse_address = True
 
 
+class PooledFamilyTreeTCPServer(socketserver.TCPServer):
+    """TCP server with a fixed worker pool and a bounded accept queue.
+
+    Unlike ``ThreadingTCPServer`` it never starts more than ``worker_threads``
+    handler threads.  Connections that arrive while the queue is full get an
+    immediate ``503`` with ``Retry-After`` instead of another thread.
+
+    An idle keep-alive connection holds its worker only while nobody waits in
+    the accept queue: see ``wait_for_next_request``.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+    idle_poll_seconds = 0.1
+
+    def __init__(
+        self,
+        server_address,
+        handler_class,
+        worker_threads=16,
+        queue_size=64,
+        retry_after_seconds=5,
+        metrics=None,
+        listener=None,
+    ):
+        super().__init__(server_address, handler_class, bind_and_activate=listener is None)
+        if listener is not None:
+            # Pre-forked workers accept from the supervisor's socket.
+            self.socket.close()
+            self.socket = listener
+            self.server_address = listener.getsockname()
+        self.retry_after_seconds = retry_after_seconds
+        self.metrics = metrics
+        self.pending = queue.Queue(maxsize=queue_size)
+        self.workers = [
+            threading.Thread(
+                target=self._worker,
+                name=f"family-tree-worker-{index}",
+                daemon=self.daemon_threads,
+            )
+            for index in range(worker_threads)
+        ]
+        for worker in self.workers:
+            worker.start()
+        if metrics:
+            metrics.register_gauge("accept_queue.depth", self.pending.qsize)
+            metrics.register_gauge("accept_queue.capacity", lambda: queue_size)
+
+    def process_request(self, request, client_address):
+        try:
+            self.pending.put_nowait((request, client_address))
+        except queue.Full:
+            self._count("rejected.accept_queue")
+            self._reject(request)
+            self.shutdown_request(request)
+            return
+        self._count("accepted")
+
+    def wait_for_next_request(self, connection, timeout):
+        """True once ``connection`` has the next request to read.
+
+        False after ``timeout`` seconds or as soon as other connections wait
+        for a worker: the idle client is closed and reconnects, instead of
+        ``worker_threads`` idle browsers stalling everyone else.
+        """
+        deadline = time.monotonic() + (timeout if timeout is not None else float("inf"))
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select(
+                [connection], [], [], min(remaining, self.idle_poll_seconds)
+            )
+            if readable:
+                return True
+            if not self.pending.empty():
+                self._count("closed.idle_keepalive")
+                return False
+
+    def server_close(self):
+        super().server_close()
+        for _ in self.workers:
+            self.pending.put(None)
+        for worker in self.workers:
+            worker.join()
+
+    def _worker(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def _reject(self, request):
+        response = (
+            "HTTP/1.1 503 Service Unavailable\r\n"
+            f"Retry-After: {self.retry_after_seconds}\r\n"
+            "Content-Length: 0\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode("ascii")
+        try:
+            request.settimeout(1)
+            request.sendall(response)
+        except OSError:
+            pass
+
+    def _count(self, name):
+        if self.metrics:
+            self.metrics.increment(name)
+
+
+def create_server(settings):
+    address = (settings.host, settings.port)
+    if settings.server_mode == "pooled":
+        print(
+            f"Режим pooled: {settings.worker_threads} потоков, "
+            f"очередь {settings.accept_queue_size}"
+        )
+        return PooledFamilyTreeTCPServer(
+            address,
+            PersonalDataHandler,
+            worker_threads=settings.worker_threads,
+            queue_size=settings.accept_queue_size,
+            retry_after_seconds=settings.retry_after_seconds,
+            metrics=PersonalDataHandler.metrics,
+        )
+    return FamilyTreeTCPServer(address, PersonalDataHandler)
+
+
+def run_prefork(settings):
+    """Serve with ``settings.worker_processes`` pre-forked pooled workers."""
+    limiter = PersonalDataHandler.rate_limiter
+    PersonalDataHandler.rate_limiter = SharedRateLimiter(
+        limit=limiter.limit,
+        window_seconds=limiter.window_seconds,
+    )
+    listener = listening_socket(settings.host, settings.port)
+
+    def serve_worker(shared_listener):
+        httpd = PooledFamilyTreeTCPServer(
+            None,
+            PersonalDataHandler,
+            worker_threads=settings.worker_threads,
+            queue_size=settings.accept_queue_size,
+            retry_after_seconds=settings.retry_after_seconds,
+            metrics=PersonalDataHandler.metrics,
+            listener=shared_listener,
+        )
+        # shutdown() blocks until serve_forever returns, so it can't run
+        # inside the signal handler on the serving thread.
+        signal.signal(
+            signal.SIGTERM,
+            lambda signum, frame: threading.Thread(target=httpd.shutdown).start(),
+        )
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        httpd.serve_forever()
+        httpd.server_close()
+
+    print(f"Режим prefork: {settings.worker_processes} процессов")
+    try:
+        PreforkSupervisor(settings.worker_processes, serve_worker, listener).run()
+    finally:
+        listener.close()
+
+
 def main():
     """Главная функция запуска сервера"""
     settings = load_settings()
@@ -33,7 +212,16 @@ def main():
     print("Для остановки нажмите Ctrl+C")
 
     try:
-        with FamilyTreeTCPServer((host, port), PersonalDataHandler) as httpd:
+        if settings.server_mode == "prefork":
+            run_prefork(settings)
+            print("\nСервер остановлен")
+            return
+        if settings.server_mode == "asyncio":
+            print(f"Режим asyncio, рабочих потоков: {settings.worker_threads}")
+            run_async_server(settings, PersonalDataHandler)
+            print("\nСервер остановлен")
+            return
+        with create_server(settings) as httpd:
             httpd.serve_forever()
     except KeyboardInterrupt:
         print("\nСервер остановлен")
@@ -1,40 +1,28 @@
 """Сервис для работы с блогами."""
 
-from storage.json_store import JsonListStore
+from services.list_items import ItemListService
+from storage.backends import open_list_store
 
 
-class BlogService:
-    def __init__(self, blog_dir):
-        self.store = JsonListStore(blog_dir)
+class BlogService(ItemListService):
+    # Новые записи стоят в начале списка.
+    newest_first = True
+
+    def __init__(self, blog_dir, cache=None, backend="json"):
+        self.store = open_list_store(backend, blog_dir, cache=cache)
 
     def get_posts(self, person_id):
         """Получение записей блога персоны"""
-        return self.store.load(person_id)
+        return self.get_items(person_id)
 
     def add_post(self, person_id, post_info):
-        """Добавление записи в блог"""
-        posts = self._load_posts(person_id)
-
-        # Добавление новой записи в начало списка
-        posts.insert(0, post_info)
+        """Добавление записи в начало блога"""
+        return self.add_item(person_id, post_info)
 
-        self._save_posts(person_id, posts)
+    def update_post(self, person_id, post_id, changes, version):
+        """Изменение записи блога"""
+        return self.update_item(person_id, post_id, changes, version)
 
-    def delete_post(self, person_id, post_index):
+    def delete_post(self, person_id, post_id, version=None):
         """Удаление записи блога"""
-        posts = self._load_posts(person_id)
-
-        if post_index >= len(posts):
-            raise IndexError("Запись не найдена")
-
-        # Удаление записи
-        posts.pop(post_index)
-        self._save_posts(person_id, posts)
-
-    def _load_posts(self, person_id):
-        """Загрузка записей блога"""
-        return self.store.load(person_id)
-
-    def _save_posts(self, person_id, posts):
-        """Сохранение записей блога"""
-        self.store.save(person_id, posts)
+        return self.delete_item(person_id, post_id, version)
@@ -0,0 +1,258 @@
+"""Списки с устойчивыми ID: блог, сообщения, фотографии.
+
+Каждый элемент списка получает ``id``, который не меняется при правках и
+сдвигах списка, и ``version`` — номер изменения, в котором элемент появился
+или был изменен последним.  По ID работают курсоры страниц и правка или
+удаление отдельных элементов, по версиям — выдача изменений ``?since=`` и
+проверка, что элемент не изменил кто-то другой (оптимистичная блокировка).
+
+Версия — время изменения в микросекундах, но не меньше последней версии
+в списке плюс один, поэтому новая версия больше всех выданных раньше, даже
+если самый новый элемент удален.
+
+Списки, записанные до появления ID, при чтении не переписываются: элементы
+получают ID из содержимого (``legacy_ids``) и версию 0, и чтение остается
+чтением — без блокировки записи и без смены версии хранилища (ETag).
+Сохраняются эти ID при первой записи в список.
+"""
+
+import hashlib
+import json
+import time
+import uuid
+from storage.json_store import changed_records, latest_version, page_records
+
+
+class VersionConflict(Exception):
+    """Элемент изменили после того, как клиент его прочитал."""
+
+    def __init__(self, current):
+        super().__init__("Элемент уже изменен")
+        self.current = current
+
+
+def version_after(latest):
+    return max(latest + 1, time.time_ns() // 1000)
+
+
+def next_version(items):
+    return version_after(latest_version(items))
+
+
+def new_item(item, latest):
+    """Копия ``item`` с новым ID и версией новее ``latest``."""
+    return {**item, 'id': uuid.uuid4().hex, 'version': version_after(latest)}
+
+
+def stamp_items(items, previous):
+    """ID и версии для списка, присланного целиком на замену ``previous``.
+
+    Элементы без ID получают новый; новые и измененные элементы — новую
+    версию, неизмененные сохраняют прежнюю.
+    """
+    known = {
+        item['id']: item
+        for item in legacy_ids(previous)
+        if isinstance(item, dict) and item.get('id') is not None
+    }
+    version = next_version(previous)
+    stamped = []
+    for item in items:
+        if isinstance(item, dict):
+            item = dict(item)
+            item['id'] = str(item['id']) if item.get('id') not in (None, '') else uuid.uuid4().hex
+            old = known.get(item['id'])
+            if old is not None and _content(old) == _content(item):
+                item['version'] = old.get('version', 0)
+            else:
+                item['version'] = version
+        stamped.append(item)
+    return stamped
+
+
+def legacy_ids(items):
+    """Копия ``items``, в которой у элементов без ID есть устойчивый ID.
+
+    ID — хеш содержимого элемента (с номером среди одинаковых), поэтому
+    каждое чтение старого списка дает клиенту те же ID.  Версия таких
+    элементов — 0.
+    """
+    if not _unstamped(items):
+        return items
+    seen = {}
+    stamped = []
+    for item in items:
+        if isinstance(item, dict) and 'id' not in item:
+            digest = hashlib.blake2b(
+                json.dumps(item, sort_keys=True, ensure_ascii=False).encode('utf-8'),
+                digest_size=12,
+            ).hexdigest()
+            seen[digest] = seen.get(digest, 0) + 1
+            item_id = digest if seen[digest] == 1 else f"{digest}-{seen[digest]}"
+            item = {**item, 'id': item_id, 'version': item.get('version', 0)}
+        stamped.append(item)
+    return stamped
+
+
+def find_item(items, item_id):
+    """Индекс элемента с ``id`` равным ``item_id``; KeyError, если его нет."""
+    for index, item in enumerate(items):
+        if isinstance(item, dict) and item.get('id') == item_id:
+            return index
+    raise KeyError(item_id)
+
+
+class _Unstamped(Exception):
+    """Элемент не найден в списке, записанном до появления ID."""
+
+
+def _find_stamped(items, item_id):
+    try:
+        return find_item(items, item_id)
+    except KeyError:
+        if _unstamped(items):
+            raise _Unstamped(item_id)
+        raise
+
+
+def _check_version(item, version):
+    if version is not None and item.get('version', 0) != version:
+        raise VersionConflict(item)
+
+
+def _content(item):
+    return {key: value for key, value in item.items() if key != 'version'}
+
+
+def _unstamped(items):
+    return any(isinstance(item, dict) and 'id' not in item for item in items)
+
+
+class ItemListService:
+    """Общая часть сервисов блога, сообщений и фотографий поверх хранилища списков.
+
+    ``newest_first`` — порядок списка в хранилище: новые элементы стоят
+    в начале (блог, сообщения) или в конце (фотографии).  Изменение одного
+    элемента передается хранилищу одной операцией (``insert``, ``apply``),
+    и хранилища ``jsonl`` и ``sqlite`` записывают одну строку, не сравнивая
+    списки целиком.
+    """
+
+    DEFAULT_LIMIT = 50
+    MAX_LIMIT = 200
+    newest_first = True
+
+    def version(self, person_id):
+        return self.store.version(person_id)
+
+    def get_items(self, person_id):
+        """Весь список; элементы старых списков получают ID из ``legacy_ids``."""
+        return legacy_ids(self.store.load(person_id))
+
+    def add_item(self, person_id, item):
+        """Добавляет элемент с новыми ID и версией; возвращает его."""
+        if not isinstance(item, dict):
+            raise ValueError("Элемент должен быть объектом")
+        added = self.store.insert(
+            person_id,
+            lambda latest: new_item(item, latest),
+            at_start=self.newest_first,
+        )
+        # Хранилище могло положить элемент в общий кэш: наружу отдаем копию.
+        return dict(added)
+
+    def update_item(self, person_id, item_id, changes, version):
+        """Меняет поля элемента, если его версия все еще ``version``.
+
+        ``id`` и ``version`` в ``changes`` не учитываются.  KeyError —
+        элемента нет, VersionConflict — его уже изменили.
+        """
+        changes = {key: value for key, value in changes.items() if key not in ('id', 'version')}
+
+        def edit(items):
+            index = _find_stamped(items, item_id)
+            _check_version(items[index], version)
+            return {'replace': [index, {**items[index], **changes, 'version': next_version(items)}]}
+
+        return dict(self._apply(person_id, edit)['replace'][1])
+
+    def delete_item(self, person_id, item_id, version=None):
+        """Удаляет элемент по ID; с ``version`` — только неизмененный."""
+        deleted = []
+
+        def remove(items):
+            index = _find_stamped(items, item_id)
+            _check_version(items[index], version)
+            deleted.append(dict(items[index]))
+            return {'delete': index}
+
+        self._apply(person_id, remove)
+        return deleted[0]
+
+    def get_page(self, person_id, limit=DEFAULT_LIMIT, before=None):
+        """``limit`` элементов старше элемента ``before`` (или самых новых).
+
+        ``next`` — курсор следующей страницы, None на последней.  ``version``
+        годится для ``get_changes``: изменения после чтения страницы будут
+        новее.  KeyError — курсора нет в списке.
+        """
+        items, more = self._read(
+            person_id,
+            lambda: self.store.page(person_id, limit, before, self.newest_first),
+            lambda items, more: _unstamped(items),
+            lambda items: page_records(items, limit, before, self.newest_first),
+        )
+        oldest = items[-1 if self.newest_first else 0] if items else None
+        return {
+            'items': items,
+            'next': oldest.get('id') if more and isinstance(oldest, dict) else None,
+            'version': max(
+                (item.get('version', 0) for item in items if isinstance(item, dict)),
+                default=0,
+            ),
+        }
+
+    def get_changes(self, person_id, since):
+        """Элементы, добавленные или измененные после версии ``since``.
+
+        ``ids`` — ID всех элементов в порядке списка: по нему клиент убирает
+        удаленные элементы и расставляет остальные.
+        """
+        items, ids = self._read(
+            person_id,
+            lambda: self.store.changes(person_id, since),
+            lambda items, ids: None in ids,
+            lambda items: changed_records(items, since),
+        )
+        return {
+            'items': items,
+            'ids': ids,
+            'version': max(
+                [since] + [item.get('version', 0) for item in items if isinstance(item, dict)]
+            ),
+        }
+
+    def _read(self, person_id, read, unstamped, from_list):
+        """``read()``; для списка без ID — ``from_list`` по всему списку с ``legacy_ids``.
+
+        Курсор страницы может указывать на элемент без ID, которого индекс
+        хранилища не знает, поэтому старый список читается целиком.
+        """
+        try:
+            result = read()
+        except KeyError:
+            items = self.store.load(person_id)
+            if not _unstamped(items):
+                raise
+            return from_list(legacy_ids(items))
+        if unstamped(*result):
+            result = from_list(legacy_ids(self.store.load(person_id)))
+        return result
+
+    def _apply(self, person_id, fn):
+        """``store.apply``; первая запись в старый список сохраняет его ID."""
+        try:
+            return self.store.apply(person_id, fn)
+        except _Unstamped:
+            self.store.update(person_id, legacy_ids)
+            return self.store.apply(person_id, fn)
@@ -1,16 +1,34 @@
 """Сервис для работы с сообщениями."""
 
-from storage.json_store import JsonListStore
+from services.list_items import ItemListService, stamp_items
+from storage.backends import open_list_store
 
 
-class MessageService:
-    def __init__(self, messages_dir):
-        self.store = JsonListStore(messages_dir)
+class MessageService(ItemListService):
+    # Страница сообщений показывает новые сообщения первыми.
+    newest_first = True
+
+    def __init__(self, messages_dir, cache=None, backend="json"):
+        self.store = open_list_store(backend, messages_dir, cache=cache)
 
     def get_messages(self, person_id):
         """Получение сообщений чата персоны"""
-        return self.store.load(person_id)
+        return self.get_items(person_id)
+
+    def add_message(self, person_id, message):
+        """Добавление сообщения"""
+        return self.add_item(person_id, message)
+
+    def update_message(self, person_id, message_id, changes, version):
+        """Изменение сообщения"""
+        return self.update_item(person_id, message_id, changes, version)
+
+    def delete_message(self, person_id, message_id, version=None):
+        """Удаление сообщения"""
+        return self.delete_item(person_id, message_id, version)
 
     def save_messages(self, person_id, messages):
-        """Сохранение сообщений чата персоны"""
-        self.store.save(person_id, messages)
+        """Замена всех сообщений чата персоны (импорт)"""
+        if not isinstance(messages, list):
+            raise ValueError("Сообщения должны быть списком")
+        self.store.update(person_id, lambda current: stamp_items(messages, current))
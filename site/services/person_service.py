@@ -2,60 +2,101 @@
 
 import re
 from pathlib import Path
+from utils.file_snapshot import FileSnapshot
+
+
+LAST_PARENS = re.compile(r'\(([^)]+)\)(?![^(]*\()')
+PARENS_WITH_DIGITS = re.compile(r'\(([^)]*\d[^)]*)\)')
+ANY_PARENS = re.compile(r'\s*\([^)]+\)')
+HAS_DATE_CHARS = re.compile(r'[\d\-]')
 
 
 class PersonService:
+    """Карточки персон из source.txt.
+
+    Файл разбирается один раз в словарь ``числовой ID -> запись``.  Индекс
+    перечитывается, только когда у файла меняются mtime, размер или inode
+    (см. ``FileSnapshot``).
+    """
+
     def __init__(self, source_file=None):
         project_root = Path(__file__).resolve().parents[2]
         self.source_file = Path(source_file) if source_file else project_root / "source.txt"
+        self._snapshot = FileSnapshot(self.source_file, _build_index, empty={})
+
+    def version(self):
+        """Версия source.txt: все карточки персон меняются вместе с ним."""
+        try:
+            stat_result = self.source_file.stat()
+        except FileNotFoundError:
+            return "0"
+        return f"{stat_result.st_mtime_ns:x}.{stat_result.st_size:x}.{stat_result.st_ino:x}"
 
     def get_person_info(self, person_id):
         """Получение информации о персоне из source.txt"""
         try:
-            # Извлекаем числовой ID из person_id (убираем префикс "node" если
-            # есть)
-            numeric_id = person_id
-            if person_id.startswith('node'):
-                numeric_id = person_id[4:]  # убираем "node"
-
-            if self.source_file.exists():
-                lines = self.source_file.read_text(encoding="utf-8").splitlines()
-
-                for line in lines:
-                    line = line.strip()
-                    search_pattern = f"{numeric_id} -"
-
-                    if line.startswith(search_pattern):
-                        person_info = line[line.find('-') + 1:].strip()
-
-                        # Попытка извлечь даты из последних скобок
-                        dates_match = re.search(
-                            r'\(([^)]+)\)(?![^(]*\()', person_info)
-                        dates = dates_match.group(1) if dates_match else ''
-
-                        # Если в скобках не даты, пробуем найти другие скобки
-                        if dates and not re.search(r'[\d\-]', dates):
-                            all_dates = re.findall(
-                                r'\(([^)]*\d[^)]*)\)', person_info)
-                            dates = all_dates[-1] if all_dates else ''
-
-                        name = re.sub(r'\s*\([^)]+\)', '', person_info).strip()
-
-                        return {
-                            'id': person_id,
-                            'name': name,
-                            'dates': dates,
-                            'full_info': person_info
-                        }
-
-            # Если персона не найдена
-            return {
-                'id': person_id,
-                'name': f'Персона {person_id}',
-                'dates': '',
-                'full_info': f'Персона {person_id}'
-            }
-
+            return _person_info(self.records(), person_id)
         except Exception as e:
             print(f"Ошибка получения информации о персоне: {e}")
             raise
+
+    def get_people(self, person_ids):
+        """Карточки нескольких персон по одному снимку индекса."""
+        index = self.records()
+        return [_person_info(index, person_id) for person_id in person_ids]
+
+    def records(self):
+        """Текущий индекс ``числовой ID -> запись``; после построения не меняется."""
+        return self._snapshot.get()
+
+
+def _person_info(index, person_id):
+    # Извлекаем числовой ID из person_id (убираем префикс "node" если есть)
+    numeric_id = person_id
+    if person_id.startswith('node'):
+        numeric_id = person_id[4:]  # убираем "node"
+
+    record = index.get(numeric_id)
+    if record is not None:
+        return {'id': person_id, **record}
+
+    # Если персона не найдена
+    return {
+        'id': person_id,
+        'name': f'Персона {person_id}',
+        'dates': '',
+        'full_info': f'Персона {person_id}'
+    }
+
+
+def _build_index(source_file):
+    index = {}
+    for line in source_file.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        numeric_id, separator, _ = line.partition(' -')
+        if not separator or numeric_id in index:
+            # Как и при построчном поиске, побеждает первая строка с ID.
+            continue
+        index[numeric_id] = _parse_person_line(line)
+    return index
+
+
+def _parse_person_line(line):
+    person_info = line[line.find('-') + 1:].strip()
+
+    # Попытка извлечь даты из последних скобок
+    dates_match = LAST_PARENS.search(person_info)
+    dates = dates_match.group(1) if dates_match else ''
+
+    # Если в скобках не даты, пробуем найти другие скобки
+    if dates and not HAS_DATE_CHARS.search(dates):
+        all_dates = PARENS_WITH_DIGITS.findall(person_info)
+        dates = all_dates[-1] if all_dates else ''
+
+    name = ANY_PARENS.sub('', person_info).strip()
+
+    return {
+        'name': name,
+        'dates': dates,
+        'full_info': person_info
+    }
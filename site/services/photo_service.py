@@ -5,11 +5,15 @@ import uuid
 from email import policy
 from email.parser import BytesParser
 from pathlib import Path
+from services.list_items import ItemListService
 from utils.response_utils import get_current_timestamp
-from storage.json_store import JsonListStore, validate_record_id
+from storage.backends import open_list_store
+from storage.json_store import validate_record_id
 
 
-class PhotoService:
+class PhotoService(ItemListService):
+    # Новые фотографии добавляются в конец галереи.
+    newest_first = False
     ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
     ALLOWED_CONTENT_TYPES = {
         ".jpg": "image/jpeg",
@@ -18,15 +22,15 @@ class PhotoService:
         ".webp": "image/webp",
     }
 
-    def __init__(self, photos_dir, object_storage=None):
+    def __init__(self, photos_dir, object_storage=None, cache=None, backend="json"):
         self.photos_dir = Path(photos_dir)
         self.photos_dir.mkdir(parents=True, exist_ok=True)
-        self.store = JsonListStore(self.photos_dir)
+        self.store = open_list_store(backend, self.photos_dir, cache=cache)
         self.object_storage = object_storage
 
     def get_photos(self, person_id):
         """Получение списка фотографий персоны"""
-        return self._load_photos_list(person_id)
+        return self.get_items(person_id)
 
     def upload_photo(self, person_id, post_data, boundary):
         """Загрузка фотографии"""
@@ -57,29 +61,21 @@ class PhotoService:
                 file_path = person_photos_dir / unique_filename
                 file_path.write_bytes(file_data)
 
-            photos = self._load_photos_list(safe_person_id)
-            new_photo = {
+            return self.add_item(safe_person_id, {
                 "url": f"/person_data/photos/{safe_person_id}/{unique_filename}",
                 "caption": original_filename,
                 "date": get_current_timestamp(),
                 "filename": unique_filename,
-            }
-
-            photos.append(new_photo)
-            self._save_photos_list(safe_person_id, photos)
-
-            return new_photo
+            })
 
         raise ValueError("Файл не найден в запросе")
 
-    def delete_photo(self, person_id, photo_index):
+    def delete_photo(self, person_id, photo_id, version=None):
         """Удаление фотографии"""
-        photos = self._load_photos_list(person_id)
-
-        if photo_index < 0 or photo_index >= len(photos):
-            raise IndexError("Фотография не найдена")
+        photo_to_delete = self.delete_item(person_id, photo_id, version)
 
-        photo_to_delete = photos[photo_index]
+        # Файл удаляется после сохранения списка: при сбое останется лишний
+        # файл, а не запись о фотографии, которой нет.
         if "filename" in photo_to_delete:
             safe_person_id = validate_record_id(person_id)
             filename = Path(photo_to_delete["filename"]).name
@@ -89,16 +85,15 @@ class PhotoService:
             if photo_path.exists():
                 photo_path.unlink()
 
-        photos.pop(photo_index)
-        self._save_photos_list(person_id, photos)
-
     def reorder_photos(self, person_id, new_photos=None, new_order=None):
         """Изменение порядка фотографий"""
-        photos = self._load_photos_list(person_id)
-
         if new_photos is not None:
             raise ValueError("Принимается только порядок фотографий по индексам")
-        elif new_order is not None:
+        elif new_order is None:
+            raise ValueError(
+                "Не указан ни новый порядок, ни новый список фотографий")
+
+        def reorder(photos):
             if not isinstance(new_order, list) or len(
                     new_order) != len(photos):
                 raise ValueError("Неверный порядок фотографий")
@@ -106,20 +101,9 @@ class PhotoService:
             if not all(0 <= idx < len(photos) for idx in new_order):
                 raise ValueError("Неверные индексы в порядке фотографий")
 
-            reordered_photos = [photos[idx] for idx in new_order]
-            self._save_photos_list(person_id, reordered_photos)
-            return reordered_photos
-        else:
-            raise ValueError(
-                "Не указан ни новый порядок, ни новый список фотографий")
-
-    def _load_photos_list(self, person_id):
-        """Загрузка списка фотографий"""
-        return self.store.load(person_id)
+            return [photos[idx] for idx in new_order]
 
-    def _save_photos_list(self, person_id, photos):
-        """Сохранение списка фотографий"""
-        self.store.save(person_id, photos)
+        return self.store.update(person_id, reorder)
 
     def _storage_key(self, person_id, filename):
         safe_person_id = validate_record_id(person_id)
@@ -0,0 +1,141 @@
+"""Сервис родственных связей: родители, супруги, дети, братья и сестры."""
+
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from utils.file_snapshot import FileSnapshot
+
+
+TREE_GEN_DIR = Path(__file__).resolve().parents[2] / "tree_gen"
+RELATION_KINDS = ("parents", "spouses", "children", "siblings")
+
+
+class FamilyGraph:
+    """Списки соседей каждой персоны, собранные из модели ``FamilyTreeBuilder``.
+
+    Соседи первого круга готовы сразу после построения; окрестности большей
+    глубины считаются обходом в ширину и кэшируются (LRU) до замены графа.
+    """
+
+    def __init__(self, builder, max_cached=4096):
+        relations = {}
+
+        def links(person_id):
+            if person_id not in relations:
+                relations[person_id] = {kind: {} for kind in RELATION_KINDS}
+            return relations[person_id]
+
+        def marry(parent1, parent2, children=()):
+            links(parent1)["spouses"][parent2] = None
+            links(parent2)["spouses"][parent1] = None
+            for child in children:
+                adopt(parent1, child)
+                adopt(parent2, child)
+
+        def adopt(parent, child):
+            links(parent)["children"][child] = None
+            links(child)["parents"][parent] = None
+
+        for person_id in builder.people:
+            links(person_id)
+        for parent1, parent2, children in builder.marriages:
+            marry(parent1, parent2, children)
+        for parent1, parent2 in builder.childless_marriages:
+            marry(parent1, parent2)
+        for parent1, parent2 in builder.unknown_children_marriages:
+            marry(parent1, parent2)
+        for parent1, parent2, known_children, _ in builder.mixed_children_marriages:
+            marry(parent1, parent2, known_children)
+        for parent, child in builder.single_parent_children:
+            adopt(parent, child)
+
+        for person_id, person_links in relations.items():
+            for parent in person_links["parents"]:
+                for sibling in relations[parent]["children"]:
+                    if sibling != person_id:
+                        person_links["siblings"][sibling] = None
+
+        # dict с ключами-ID сохраняет порядок из source.txt и убирает повторы.
+        self.relations = {
+            person_id: {kind: tuple(person_links[kind]) for kind in RELATION_KINDS}
+            for person_id, person_links in relations.items()
+        }
+        self.max_cached = max_cached
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def __contains__(self, person_id):
+        return person_id in self.relations
+
+    def neighbourhood(self, person_id, depth):
+        """``[(ID, расстояние), ...]`` в порядке обхода, начиная с самой персоны."""
+        key = (person_id, depth)
+        with self._cache_lock:
+            found = self._cache.get(key)
+            if found is not None:
+                self._cache.move_to_end(key)
+                return found
+
+        distances = {person_id: 0}
+        frontier = [person_id]
+        for distance in range(1, depth + 1):
+            next_frontier = []
+            for current in frontier:
+                for kind in RELATION_KINDS:
+                    for relative in self.relations[current][kind]:
+                        if relative not in distances:
+                            distances[relative] = distance
+                            next_frontier.append(relative)
+            frontier = next_frontier
+        found = tuple(distances.items())
+
+        with self._cache_lock:
+            self._cache[key] = found
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        return found
+
+
+class RelativesService:
+    """Окрестность персоны в графе родства на заданную глубину.
+
+    Граф строится тем же ``FamilyTreeBuilder``, что рисует SVG, и
+    перестраивается при изменении source.txt.  Имена и даты берутся из
+    ``PersonService``, чтобы карточки совпадали с ``/api/person/{id}``.
+    """
+
+    MAX_DEPTH = 4
+
+    def __init__(self, person_service, source_file=None):
+        self.person_service = person_service
+        self.source_file = Path(source_file) if source_file else person_service.source_file
+        self._graph = FileSnapshot(self.source_file, _build_graph)
+
+    def get_relatives(self, person_id, depth=1):
+        """Персоны на расстоянии не больше ``depth``; None — персоны нет в графе."""
+        numeric_id = person_id[4:] if person_id.startswith('node') else person_id
+        graph = self._graph.get()
+        if graph is None or not numeric_id.isdigit() or int(numeric_id) not in graph:
+            return None
+
+        neighbourhood = graph.neighbourhood(int(numeric_id), depth)
+        cards = self.person_service.get_people([f"node{found}" for found, _ in neighbourhood])
+        people = []
+        for (found, distance), card in zip(neighbourhood, cards):
+            person = {**card, 'distance': distance}
+            for kind in RELATION_KINDS:
+                person[kind] = [f"node{relative}" for relative in graph.relations[found][kind]]
+            people.append(person)
+        return {'id': person_id, 'depth': depth, 'people': people}
+
+
+def _build_graph(source_file):
+    # tree_gen импортирует свои модули без пакета, как при запуске run.py.
+    if str(TREE_GEN_DIR) not in sys.path:
+        sys.path.append(str(TREE_GEN_DIR))
+    from family_tree_builder import FamilyTreeBuilder
+
+    builder = FamilyTreeBuilder()
+    builder.parse_source_file(str(source_file))
+    return FamilyGraph(builder)
@@ -0,0 +1,63 @@
+"""Поиск персон по имени, отчеству, фамилии и годам."""
+
+import heapq
+import threading
+from utils.text_search import SearchIndex
+
+
+class SearchService:
+    """Поисковый индекс поверх карточек ``PersonService``.
+
+    Индекс строится при создании сервиса.  Когда source.txt меняется,
+    ``PersonService`` отдает новый снимок записей, и в индексе
+    переиндексируются только добавленные, измененные и удаленные персоны.
+    """
+
+    DEFAULT_LIMIT = 20
+    MAX_LIMIT = 100
+
+    def __init__(self, person_service):
+        self.person_service = person_service
+        self.index = SearchIndex()
+        self._records = {}
+        self._positions = {}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        records = self.person_service.records()
+        if records is self._records:
+            return
+        with self._lock:
+            previous = self._records
+            if records is previous:
+                return
+            for doc_id in previous.keys() - records.keys():
+                self.index.remove(doc_id)
+            for doc_id, record in records.items():
+                if doc_id.isdigit() and previous.get(doc_id) != record:
+                    self.index.add(doc_id, record['full_info'])
+            # При равном весе результаты идут в порядке source.txt.
+            self._positions = {doc_id: position for position, doc_id in enumerate(records)}
+            self._records = records
+
+    def search(self, query, limit=DEFAULT_LIMIT, offset=0):
+        self.refresh()
+        with self._lock:
+            scores = self.index.search(query)
+            positions = self._positions
+
+        # Сортировать все совпадения не нужно: хватает первых offset + limit.
+        ranked = heapq.nsmallest(
+            offset + limit,
+            scores,
+            key=lambda doc_id: (-scores[doc_id], positions[doc_id]),
+        )
+        page = ranked[offset:]
+        return {
+            'query': query,
+            'total': len(scores),
+            'offset': offset,
+            'limit': limit,
+            'results': self.person_service.get_people([f"node{doc_id}" for doc_id in page]),
+        }
@@ -0,0 +1,20 @@
+"""Выбор хранилища списков по настройке ``storage_backend``."""
+
+from storage.json_store import JsonListStore
+from storage.log_store import JsonLogStore
+from storage.sqlite_store import SqliteListStore
+
+
+LIST_STORES = {
+    "json": JsonListStore,
+    "jsonl": JsonLogStore,
+    "sqlite": SqliteListStore,
+}
+
+
+def open_list_store(backend, root_dir, cache=None):
+    try:
+        store_class = LIST_STORES[backend]
+    except KeyError:
+        raise ValueError(f"Unknown storage backend: {backend}") from None
+    return store_class(root_dir, cache=cache)
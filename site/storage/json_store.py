@@ -6,11 +6,22 @@ callers should not be able to escape the configured data directory.
 """
 
 import json
+import os
 import re
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
 
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows development machines
+    fcntl = None
+
 
 SAFE_RECORD_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+_RECORD_LOCKS = [threading.Lock() for _ in range(64)]
 
 
 def validate_record_id(record_id):
@@ -20,36 +31,322 @@ def validate_record_id(record_id):
     return record_id
 
 
+@contextmanager
+def file_lock(file_path):
+    """Exclusive advisory lock shared by threads and pre-forked workers."""
+    if fcntl is None:
+        yield
+        return
+
+    lock_path = Path(file_path).with_name(f"{Path(file_path).name}.lock")
+    with lock_path.open("a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def record_lock(file_path):
+    """Lock one record against other threads and pre-forked workers.
+
+    Threads of one process queue on a striped in-process lock first, so only
+    one of them at a time holds the lock file; ``flock`` then serializes
+    processes.
+    """
+    stripe = zlib.crc32(str(file_path).encode("utf-8")) % len(_RECORD_LOCKS)
+    with _RECORD_LOCKS[stripe], file_lock(file_path):
+        yield
+
+
+class JsonListCache:
+    """LRU of parsed JSON lists shared by several ``JsonListStore`` instances.
+
+    An entry is trusted only while the file still has the ``(mtime_ns, size,
+    inode)`` it was read with, so changes made by other processes (prefork
+    workers) are noticed on the next read.  Saves go through the cache, and a
+    per-file write counter keeps a slow reader from putting back data older
+    than a save that finished while it was reading.  Memory is bounded by the
+    total size of the cached files.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._writes = {}
+
+    def get(self, key, stamp):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stamp:
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def peek(self, key):
+        """``(stamp, records)`` without validating the stamp, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[2]
+
+    def writes(self, key):
+        with self._lock:
+            return self._writes.get(key, 0)
+
+    def put(self, key, stamp, records, size, writes=None):
+        """Cache ``records``; ``writes`` is the counter seen before reading.
+
+        ``writes=None`` marks a save, which always wins and bumps the counter.
+        """
+        with self._lock:
+            current = self._writes.get(key, 0)
+            if writes is None:
+                self._writes[key] = current + 1
+            elif writes != current:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            if size <= self.max_bytes:
+                self._entries[key] = (stamp, size, records)
+                self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+
 class JsonListStore:
-    def __init__(self, root_dir):
+    def __init__(self, root_dir, cache=None):
         self.root_dir = Path(root_dir)
         self.root_dir.mkdir(parents=True, exist_ok=True)
+        self.cache = cache
 
     def load(self, record_id):
-        file_path = self._file_path(record_id)
-        if not file_path.exists():
-            return []
+        return copy_records(self._records(record_id))
 
-        with file_path.open("r", encoding="utf-8") as source:
-            data = json.load(source)
+    def page(self, record_id, limit, cursor=None, newest_first=True):
+        """One page of the list; see ``page_records``."""
+        items, more = page_records(self._records(record_id), limit, cursor, newest_first)
+        return copy_records(items), more
 
-        if isinstance(data, list):
-            return data
+    def changes(self, record_id, since):
+        """Items changed after ``since`` and all item IDs; see ``changed_records``."""
+        items, ids = changed_records(self._records(record_id), since)
+        return copy_records(items), ids
 
-        raise ValueError(f"Expected a JSON list in {file_path}")
+    def version(self, record_id):
+        """Версия записи для ETag: меняется при каждом сохранении."""
+        try:
+            stat_result = self._file_path(record_id).stat()
+        except FileNotFoundError:
+            return "0"
+        # save() replaces the file, so the inode changes even when the new
+        # content has the same size within one mtime tick.
+        return f"{stat_result.st_mtime_ns:x}.{stat_result.st_size:x}.{stat_result.st_ino:x}"
 
     def save(self, record_id, records):
-        if not isinstance(records, list):
-            raise ValueError("JsonListStore can only save lists")
+        file_path = self._file_path(record_id)
+        with record_lock(file_path):
+            self._write(file_path, records)
+
+    def update(self, record_id, fn):
+        """Atomically replace the record's list with ``fn(current_list)``.
 
+        The record stays locked from reading to writing, so concurrent
+        updates of one record (threads or worker processes) apply one after
+        another instead of losing each other's changes.  If ``fn`` raises,
+        nothing is written.  Returns the saved list.
+        """
         file_path = self._file_path(record_id)
-        temp_path = file_path.with_suffix(".json.tmp")
+        with record_lock(file_path):
+            records = fn(self.load(record_id))
+            self._write(file_path, records)
+        return records
+
+    def apply(self, record_id, fn):
+        """Atomically apply the operation ``fn(current_list)`` to the record.
+
+        ``fn`` gets the shared current list, which it must not modify, and
+        returns one operation (see ``apply_operation``) or None for no change.
+        The ``jsonl`` and ``sqlite`` stores write just that operation instead
+        of comparing the old and the new list.  Returns the operation.
+        """
+        file_path = self._file_path(record_id)
+        with record_lock(file_path):
+            current = self._records(record_id)
+            operation = fn(current)
+            if operation is not None:
+                self._write(file_path, apply_operation(current, operation))
+        return operation
+
+    def insert(self, record_id, make_item, at_start=False):
+        """Add ``make_item(latest_version)`` to the start or the end; returns it.
+
+        ``latest_version`` is the highest item ``version`` in the record, so
+        the new item can get a newer one without the list being read.
+        """
+        operation = self.apply(
+            record_id,
+            lambda records: {
+                "prepend" if at_start else "append": make_item(latest_version(records)),
+            },
+        )
+        return next(iter(operation.values()))
+
+    def _records(self, record_id):
+        """The current list; it may be shared with the cache, so don't modify it."""
+        file_path = self._file_path(record_id)
+        if self.cache is None:
+            return self._read(file_path)[1]
+
+        key = str(file_path)
+        try:
+            stat_result = file_path.stat()
+        except FileNotFoundError:
+            return []
+        records = self.cache.get(key, _stamp(stat_result))
+        if records is None:
+            writes = self.cache.writes(key)
+            stat_result, records = self._read(file_path)
+            if stat_result is not None:
+                self.cache.put(key, _stamp(stat_result), records, stat_result.st_size, writes)
+        return records
 
+    def _write(self, file_path, records):
+        if not isinstance(records, list):
+            raise ValueError("JsonListStore can only save lists")
+
+        # Unique temp names keep concurrent writers from truncating each
+        # other's half-written file before the atomic replace.
+        temp_path = file_path.with_name(
+            f"{file_path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
         with temp_path.open("w", encoding="utf-8") as target:
             json.dump(records, target, ensure_ascii=False, indent=2)
+            target.flush()
+            os.fsync(target.fileno())
 
         temp_path.replace(file_path)
+        fsync_directory(file_path.parent)
+        if self.cache is not None:
+            stat_result = file_path.stat()
+            self.cache.put(
+                str(file_path),
+                _stamp(stat_result),
+                copy_records(records),
+                stat_result.st_size,
+            )
+
+    def _read(self, file_path):
+        """``(stat, records)`` of the file; stat comes from the opened file."""
+        try:
+            source = file_path.open("r", encoding="utf-8")
+        except FileNotFoundError:
+            return None, []
+
+        with source:
+            # save() replaces the file, so this stat matches what json.load reads.
+            stat_result = os.fstat(source.fileno())
+            data = json.load(source)
+
+        if isinstance(data, list):
+            return stat_result, data
+
+        raise ValueError(f"Expected a JSON list in {file_path}")
 
     def _file_path(self, record_id):
         safe_id = validate_record_id(record_id)
         return self.root_dir / f"{safe_id}.json"
+
+
+def fsync_directory(directory):
+    """Make the rename itself durable; Windows cannot open directories."""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _stamp(stat_result):
+    return stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino
+
+
+def copy_records(records):
+    # Callers reorder and edit the list and its flat records; a deep copy
+    # would cost more than reading the file again.
+    return [dict(record) if isinstance(record, dict) else record for record in records]
+
+
+def page_records(records, limit, cursor=None, newest_first=True):
+    """Up to ``limit`` items of ``records``, from the newest to older ones.
+
+    ``newest_first`` lists keep the newest item at index 0 (blog, messages)
+    and are paged forward from the start; the others keep it at the end
+    (photos) and are paged backward from the end.  ``cursor`` is the ``id``
+    of the oldest item of the previous page.  Returns ``(items in list order,
+    whether older items remain)``; raises KeyError for an unknown cursor.
+    """
+    if newest_first:
+        start = 0 if cursor is None else _index_of(records, cursor) + 1
+        return records[start:start + limit], start + limit < len(records)
+    stop = len(records) if cursor is None else _index_of(records, cursor)
+    start = max(stop - limit, 0)
+    return records[start:stop], start > 0
+
+
+def apply_operation(records, operation):
+    """A new list with one operation applied; ``records`` is not modified.
+
+    Operations are ``{"append": item}``, ``{"prepend": item}``,
+    ``{"delete": index}`` and ``{"replace": [index, item]}``, the lines of
+    the ``jsonl`` log.
+    """
+    if "append" in operation:
+        return records + [operation["append"]]
+    if "prepend" in operation:
+        return [operation["prepend"]] + records
+    if "delete" in operation:
+        index = operation["delete"]
+        return records[:index] + records[index + 1:]
+    if "replace" in operation:
+        index, item = operation["replace"]
+        return records[:index] + [item] + records[index + 1:]
+    raise ValueError(f"Unknown list operation: {sorted(operation)}")
+
+
+def operation_item(operation):
+    """The item an operation adds or writes; None for a removal."""
+    if "replace" in operation:
+        return operation["replace"][1]
+    return operation.get("append", operation.get("prepend"))
+
+
+def latest_version(records):
+    """The highest item ``version`` in ``records`` (0 for none)."""
+    return max((item_field(record, "version", 0) for record in records), default=0)
+
+
+def changed_records(records, since):
+    """``(items with a version above since, IDs of all items)``, in list order."""
+    changed = [record for record in records if item_field(record, "version", 0) > since]
+    return changed, [item_field(record, "id") for record in records]
+
+
+def item_field(record, name, default=None):
+    return record.get(name, default) if isinstance(record, dict) else default
+
+
+def _index_of(records, item_id):
+    for index, record in enumerate(records):
+        if item_field(record, "id") == item_id:
+            return index
+    raise KeyError(item_id)
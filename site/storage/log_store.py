@@ -0,0 +1,360 @@
+"""
+Append-only JSON Lines storage for lists that mostly grow (chat, blog).
+
+Each record is a ``<id>.jsonl`` file of operations, one per line::
+
+    {"set": [...]}      the whole list; always the first line
+    {"append": item}
+    {"prepend": item}
+    {"delete": index}
+    {"replace": [index, item]}
+
+The services pass single-item changes as operations (``insert()`` and
+``apply()``), which are written as one line as they are, so adding or
+editing a message or a post costs one small write however long the history
+is.  ``update()`` with a whole new list compares it with the old one and
+writes operation lines when the change is that simple.  Any other change,
+and every ``compact_after`` operations, rewrites the file as a single
+``set`` line through a temp file and an atomic rename (compaction).
+
+A small per-file position index (inode, offset, operation count and the
+latest item version) makes ``insert()`` independent of the list: it reads
+only lines other workers appended since.  The replayed lists themselves
+live in the shared ``JsonListCache`` under the same position, so a later
+read only replays lines appended since, by this or another worker process;
+a list that is not cached is replayed in full, as ``JsonListStore`` reads
+its whole file.
+
+Existing ``<id>.json`` files written by ``JsonListStore`` are migrated on
+first access and renamed to ``<id>.json.migrated``; ``migrate_all()``
+converts a whole directory up front.
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from storage.json_store import (
+    apply_operation,
+    changed_records,
+    copy_records,
+    fsync_directory,
+    item_field,
+    latest_version,
+    operation_item,
+    page_records,
+    record_lock,
+    validate_record_id,
+)
+
+
+# Write positions per log file: ``{path: (inode, offset, operations, latest)}``
+# with ``latest`` the highest item version written.  Entries are a few numbers
+# and live outside the ``JsonListCache`` byte budget, so an append never needs
+# the log replayed, however large it grows.
+_POSITIONS = {}
+
+
+class JsonLogStore:
+    def __init__(self, root_dir, cache=None, compact_after=1000):
+        self.root_dir = Path(root_dir)
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self.cache = cache
+        self.compact_after = compact_after
+
+    def load(self, record_id):
+        return copy_records(self._records(record_id))
+
+    def page(self, record_id, limit, cursor=None, newest_first=True):
+        """One page of the list; see ``page_records``."""
+        items, more = page_records(self._records(record_id), limit, cursor, newest_first)
+        return copy_records(items), more
+
+    def changes(self, record_id, since):
+        """Items changed after ``since`` and all item IDs; see ``changed_records``."""
+        items, ids = changed_records(self._records(record_id), since)
+        return copy_records(items), ids
+
+    def version(self, record_id):
+        """Версия записи для ETag: меняется при каждом сохранении."""
+        file_path = self._file_path(record_id)
+        self._migrate_unlocked(file_path)
+        try:
+            stat_result = file_path.stat()
+        except FileNotFoundError:
+            return "0"
+        # Appends change the size, rewrites the inode.
+        return f"{stat_result.st_mtime_ns:x}.{stat_result.st_size:x}.{stat_result.st_ino:x}"
+
+    def save(self, record_id, records):
+        if not isinstance(records, list):
+            raise ValueError("JsonLogStore can only save lists")
+        self.update(record_id, lambda current: records)
+
+    def update(self, record_id, fn):
+        """Atomically replace the record's list with ``fn(current_list)``.
+
+        Same contract as ``JsonListStore.update``; the change is written as
+        operation lines when possible.
+        """
+        file_path = self._file_path(record_id)
+        with record_lock(file_path):
+            self._migrate(file_path)
+            current, position = self._replay(file_path)
+            records = fn(copy_records(current))
+            if not isinstance(records, list):
+                raise ValueError("JsonLogStore can only save lists")
+            self._write(file_path, current, records, position)
+        return records
+
+    def apply(self, record_id, fn):
+        """Write the operation ``fn(current_list)`` as one log line.
+
+        Same contract as ``JsonListStore.apply``; nothing is compared.
+        """
+        file_path = self._file_path(record_id)
+        with record_lock(file_path):
+            self._migrate(file_path)
+            current, position = self._replay(file_path)
+            operation = fn(current)
+            if operation is not None:
+                self._append(file_path, position, [operation], apply_operation(current, operation))
+        return operation
+
+    def insert(self, record_id, make_item, at_start=False):
+        """Append or prepend ``make_item(latest_version)`` without reading the list.
+
+        The latest version and the write position come from the position
+        index, which only reads lines other workers appended since.
+        """
+        file_path = self._file_path(record_id)
+        with record_lock(file_path):
+            self._migrate(file_path)
+            position = self._position(file_path)
+            item = make_item(position[3] if position else 0)
+            self._append(file_path, position, [{"prepend" if at_start else "append": item}])
+        return item
+
+    def migrate_all(self):
+        """Convert every legacy ``.json`` record in the directory; returns the count."""
+        migrated = 0
+        for legacy_path in sorted(self.root_dir.glob("*.json")):
+            file_path = legacy_path.with_suffix(".jsonl")
+            if not file_path.exists():
+                self._migrate_unlocked(file_path)
+                migrated += 1
+        return migrated
+
+    def _records(self, record_id):
+        """The current list; it may be shared with the cache, so don't modify it."""
+        file_path = self._file_path(record_id)
+        self._migrate_unlocked(file_path)
+        return self._replay(file_path)[0]
+
+    def _replay(self, file_path):
+        """``(records, (inode, offset, operations, latest))`` for the complete lines.
+
+        A line without its newline is a write still in progress (or cut off
+        by a crash) and is left for the next reader or writer.
+        """
+        key = str(file_path)
+        writes = self.cache.writes(key) if self.cache is not None else None
+        try:
+            source = file_path.open("rb")
+        except FileNotFoundError:
+            return [], None
+
+        with source:
+            stat_result = os.fstat(source.fileno())
+            cached = self.cache.peek(key) if self.cache is not None else None
+            if (
+                cached is not None
+                and cached[0][0] == stat_result.st_ino
+                and cached[0][1] <= stat_result.st_size
+            ):
+                (inode, offset, operations, latest), records = cached
+                if offset == stat_result.st_size:
+                    return records, cached[0]
+                # The cached list is shared: apply new lines to a copy.
+                records = list(records)
+                source.seek(offset)
+            else:
+                inode, offset, operations, latest, records = stat_result.st_ino, 0, 0, 0, []
+
+            for line in source:
+                if not line.endswith(b"\n"):
+                    break
+                operation = json.loads(line)
+                records = _apply(records, operation, file_path)
+                operations, latest = _advance(operations, latest, operation)
+                offset += len(line)
+
+        position = (inode, offset, operations, latest)
+        _POSITIONS[key] = position
+        if self.cache is not None:
+            self.cache.put(key, position, records, offset, writes)
+        return records, position
+
+    def _position(self, file_path):
+        """The write position of the log, or None if there is no file yet.
+
+        The index entry is trusted while the inode matches; lines appended by
+        other workers since are read, but not applied to any list.  Without a
+        usable entry the log is replayed once.
+        """
+        key = str(file_path)
+        try:
+            source = file_path.open("rb")
+        except FileNotFoundError:
+            return None
+
+        with source:
+            stat_result = os.fstat(source.fileno())
+            position = _POSITIONS.get(key)
+            if (
+                position is None
+                or position[0] != stat_result.st_ino
+                or position[1] > stat_result.st_size
+            ):
+                return self._replay(file_path)[1]
+
+            inode, offset, operations, latest = position
+            if offset < stat_result.st_size:
+                source.seek(offset)
+                for line in source:
+                    if not line.endswith(b"\n"):
+                        break
+                    operations, latest = _advance(operations, latest, json.loads(line))
+                    offset += len(line)
+
+        position = (inode, offset, operations, latest)
+        _POSITIONS[key] = position
+        return position
+
+    def _write(self, file_path, current, records, position):
+        if records == current:
+            return
+        operations = diff_records(current, records)
+        if operations is None:
+            self._rewrite(file_path, records)
+            return
+        self._append(file_path, position, operations, copy_records(records))
+
+    def _append(self, file_path, position, operations, records=None):
+        """Write operation lines at ``position``, or compact the log when due.
+
+        ``records`` is the resulting list if the caller has it; it goes to the
+        cache.  Without it readers apply the new lines to their cached list.
+        """
+        if position is None or position[2] + len(operations) > self.compact_after:
+            if records is None:
+                records = self._replay(file_path)[0]
+                for operation in operations:
+                    records = apply_operation(records, operation)
+            self._rewrite(file_path, records)
+            return
+
+        inode, offset, count, latest = position
+        data = b"".join(
+            (json.dumps(operation, ensure_ascii=False) + "\n").encode("utf-8")
+            for operation in operations
+        )
+        with file_path.open("r+b") as target:
+            # Drop a half-written line left by a crashed writer.
+            target.seek(offset)
+            target.truncate()
+            target.write(data)
+            target.flush()
+            os.fsync(target.fileno())
+
+        for operation in operations:
+            count, latest = _advance(count, latest, operation)
+        position = (inode, offset + len(data), count, latest)
+        _POSITIONS[str(file_path)] = position
+        if self.cache is not None and records is not None:
+            self.cache.put(str(file_path), position, records, position[1])
+
+    def _rewrite(self, file_path, records):
+        temp_path = file_path.with_name(
+            f"{file_path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        data = (json.dumps({"set": records}, ensure_ascii=False) + "\n").encode("utf-8")
+        with temp_path.open("wb") as target:
+            target.write(data)
+            target.flush()
+            os.fsync(target.fileno())
+
+        temp_path.replace(file_path)
+        fsync_directory(file_path.parent)
+        position = (file_path.stat().st_ino, len(data), 0, latest_version(records))
+        _POSITIONS[str(file_path)] = position
+        if self.cache is not None:
+            self.cache.put(str(file_path), position, copy_records(records), len(data))
+
+    def _migrate_unlocked(self, file_path):
+        if not file_path.exists() and file_path.with_suffix(".json").exists():
+            with record_lock(file_path):
+                self._migrate(file_path)
+
+    def _migrate(self, file_path):
+        """Move a legacy ``.json`` list into the log; the caller holds the lock."""
+        legacy_path = file_path.with_suffix(".json")
+        if file_path.exists() or not legacy_path.exists():
+            return
+
+        with legacy_path.open("r", encoding="utf-8") as source:
+            data = json.load(source)
+        if not isinstance(data, list):
+            raise ValueError(f"Expected a JSON list in {legacy_path}")
+
+        self._rewrite(file_path, data)
+        legacy_path.replace(legacy_path.with_name(f"{legacy_path.name}.migrated"))
+
+    def _file_path(self, record_id):
+        safe_id = validate_record_id(record_id)
+        return self.root_dir / f"{safe_id}.jsonl"
+
+
+def _apply(records, operation, file_path):
+    """Apply one log line in place to a list owned by the replay."""
+    if "set" in operation:
+        return list(operation["set"])
+    if "append" in operation:
+        records.append(operation["append"])
+    elif "prepend" in operation:
+        records.insert(0, operation["prepend"])
+    elif "delete" in operation:
+        del records[operation["delete"]]
+    elif "replace" in operation:
+        index, item = operation["replace"]
+        records[index] = item
+    else:
+        raise ValueError(f"Unknown operation in {file_path}: {sorted(operation)}")
+    return records
+
+
+def _advance(operations, latest, operation):
+    """``(operations since set, latest version)`` after one more log line."""
+    if "set" in operation:
+        return 0, max(latest, latest_version(operation["set"]))
+    return operations + 1, max(latest, item_field(operation_item(operation), "version", 0))
+
+
+def diff_records(old, new):
+    """Operations turning ``old`` into ``new``, or None if a rewrite is simpler."""
+    if len(new) > len(old) and new[:len(old)] == old:
+        return [{"append": item} for item in new[len(old):]]
+    if len(new) == len(old) + 1 and new[1:] == old:
+        return [{"prepend": new[0]}]
+    if len(new) == len(old) - 1:
+        index = next(
+            (index for index, item in enumerate(new) if item != old[index]),
+            len(new),
+        )
+        if new[index:] == old[index + 1:]:
+            return [{"delete": index}]
+    if len(new) == len(old):
+        changed = [index for index, item in enumerate(new) if item != old[index]]
+        if len(changed) == 1:
+            return [{"replace": [changed[0], new[changed[0]]]}]
+    return None
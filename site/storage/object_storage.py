@@ -1,6 +1,7 @@
 """Object storage adapters for private file blobs."""
 
 import mimetypes
+from utils.http_range import RangeNotSatisfiable
 
 
 class S3ObjectStorage:
@@ -47,27 +48,55 @@ class S3ObjectStorage:
             ContentType=content_type,
         )
 
-    def get_object(self, key):
+    def get_object(self, key, byte_range=None):
+        stored_object = self.open_object(key, byte_range=byte_range)
+        if not stored_object:
+            return None
+
+        return {
+            "data": stored_object["body"].read(),
+            "content_type": stored_object["content_type"],
+            "etag": stored_object["etag"],
+            "content_range": stored_object["content_range"],
+        }
+
+    def open_object(self, key, byte_range=None):
+        """Return the object's streaming body without reading it into memory.
+
+        ``byte_range`` is an HTTP ``Range`` value passed through to S3; the
+        result then carries the ``content_range`` S3 answered with.
+        """
+        request = {"Bucket": self.bucket, "Key": key}
+        if byte_range:
+            request["Range"] = byte_range
         try:
-            response = self.client.get_object(Bucket=self.bucket, Key=key)
+            response = self.client.get_object(**request)
         except Exception as error:
             if self._is_not_found(error):
                 return None
+            if byte_range and self._error_code(error) == "InvalidRange":
+                size = self.client.head_object(Bucket=self.bucket, Key=key)["ContentLength"]
+                raise RangeNotSatisfiable(size) from error
             raise
 
         content_type = response.get("ContentType") or _guess_content_type(key)
         return {
-            "data": response["Body"].read(),
+            "body": response["Body"],
             "content_type": content_type,
+            "content_length": response.get("ContentLength"),
+            "etag": response.get("ETag"),
+            "content_range": response.get("ContentRange"),
         }
 
     def delete(self, key):
         self.client.delete_object(Bucket=self.bucket, Key=key)
 
     def _is_not_found(self, error):
+        return self._error_code(error) in {"404", "NoSuchKey", "NotFound"}
+
+    def _error_code(self, error):
         response = getattr(error, "response", {})
-        code = response.get("Error", {}).get("Code")
-        return code in {"404", "NoSuchKey", "NotFound"}
+        return response.get("Error", {}).get("Code")
 
 
 def _guess_content_type(key):
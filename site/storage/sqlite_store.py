@@ -0,0 +1,457 @@
+"""
+SQLite storage for the person lists (photos, blog, messages).
+
+All collections share one database, ``person_data.sqlite3`` in the data
+directory, so a backup is a single file and cross-person queries are plain
+SQL.  List items are rows ordered by ``position`` and indexed by person and
+by their ``timestamp``/``date`` field, their ``id`` and their ``version``, so
+a page or the changes since a version are read without loading the list.
+As in ``JsonLogStore``, ``update()`` diffs the old and the new list: an
+append, a prepend, one removal or one edit becomes a single INSERT, DELETE
+or UPDATE; any other change replaces the record's rows.
+Every change bumps the record's version, which is what ``version()``
+returns and what validates entries of the shared ``JsonListCache``.  Like
+item versions in ``services.list_items``, it is the time in microseconds but
+at least the previous version plus one, so a database created again from
+the JSON files doesn't hand out versions that old ETags still carry.
+
+The database runs in WAL mode, so readers never wait for a writer.  Each
+process keeps a small pool of connections shared by its threads (each
+pre-forked worker has its own); the sqlite3 module keeps the prepared
+statements per connection.  Writes start with ``BEGIN IMMEDIATE``, which
+serializes them across threads and processes.
+
+Run ``python -m storage.sqlite_store`` from ``site/`` to copy existing JSON
+directories into the database.
+"""
+
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from storage.json_store import (
+    JsonListStore,
+    apply_operation,
+    copy_records,
+    item_field,
+    validate_record_id,
+)
+from storage.log_store import JsonLogStore, diff_records
+
+
+DATABASE_NAME = "person_data.sqlite3"
+COLLECTIONS = ("photos", "blog", "messages")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    collection TEXT NOT NULL,
+    record_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (collection, record_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    collection TEXT NOT NULL,
+    record_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    created,
+    item_id TEXT,
+    item_version INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS items_by_record ON items (collection, record_id, position);
+CREATE INDEX IF NOT EXISTS items_by_created ON items (collection, created);
+CREATE INDEX IF NOT EXISTS items_by_id ON items (collection, record_id, item_id);
+-- Covers the ordered list of IDs sent with every change set.
+CREATE INDEX IF NOT EXISTS items_ids_in_order ON items (collection, record_id, position, item_id);
+CREATE INDEX IF NOT EXISTS items_by_version ON items (collection, record_id, item_version);
+"""
+
+SELECT_VERSION = "SELECT version FROM records WHERE collection = ? AND record_id = ?"
+SET_VERSION = "INSERT OR REPLACE INTO records (collection, record_id, version) VALUES (?, ?, ?)"
+SELECT_ITEMS = (
+    "SELECT position, data FROM items WHERE collection = ? AND record_id = ? ORDER BY position"
+)
+INSERT_ITEM = (
+    "INSERT INTO items (collection, record_id, position, created, item_id, item_version, data)"
+    " VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+SELECT_POSITION = (
+    "SELECT position FROM items WHERE collection = ? AND record_id = ? AND item_id = ?"
+)
+SELECT_NEWER_PAGE = (
+    "SELECT data FROM items WHERE collection = ? AND record_id = ? AND position > ?"
+    " ORDER BY position LIMIT ?"
+)
+SELECT_OLDER_PAGE = (
+    "SELECT data FROM items WHERE collection = ? AND record_id = ? AND position < ?"
+    " ORDER BY position DESC LIMIT ?"
+)
+SELECT_CHANGED = (
+    "SELECT data FROM items WHERE collection = ? AND record_id = ? AND item_version > ?"
+    " ORDER BY position"
+)
+# Latest item version and the position range; SQLite answers each single
+# MIN/MAX subquery with one index lookup instead of a scan of the rows.
+SELECT_BOUNDS = (
+    "SELECT"
+    " (SELECT MAX(item_version) FROM items WHERE collection = ?1 AND record_id = ?2),"
+    " (SELECT MIN(position) FROM items WHERE collection = ?1 AND record_id = ?2),"
+    " (SELECT MAX(position) FROM items WHERE collection = ?1 AND record_id = ?2)"
+)
+SELECT_IDS = "SELECT item_id FROM items WHERE collection = ? AND record_id = ? ORDER BY position"
+UPDATE_ITEM = (
+    "UPDATE items SET created = ?, item_id = ?, item_version = ?, data = ?"
+    " WHERE collection = ? AND record_id = ? AND position = ?"
+)
+DELETE_ITEM = "DELETE FROM items WHERE collection = ? AND record_id = ? AND position = ?"
+DELETE_ITEMS = "DELETE FROM items WHERE collection = ? AND record_id = ?"
+# Bounds for "no cursor": positions are 64-bit integers around zero.
+FIRST_POSITION = -(2 ** 63)
+LAST_POSITION = 2 ** 63 - 1
+
+# Idle connections per (pid, database), shared by all threads of a process.
+MAX_IDLE_CONNECTIONS = 8
+_idle = {}
+_idle_lock = threading.Lock()
+
+
+@contextmanager
+def connect(database):
+    """A connection to ``database`` from the process's pool.
+
+    The connection goes back to the pool afterwards, so the threaded server
+    does not open a connection, and rerun the PRAGMAs, for every HTTP
+    connection thread.  Connections beyond ``MAX_IDLE_CONNECTIONS`` are
+    closed.  The pool is keyed by pid: connections inherited through
+    ``fork()`` belong to the parent and are never used by the worker.
+    """
+    key = (os.getpid(), database)
+    with _idle_lock:
+        idle = _idle.get(key)
+        connection = idle.pop() if idle else None
+    if connection is None:
+        connection = sqlite3.connect(
+            database, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        # The JSON stores fsync every save; keep the same guarantee.
+        connection.execute("PRAGMA synchronous=FULL")
+    try:
+        yield connection
+    finally:
+        with _idle_lock:
+            idle = _idle.setdefault(key, [])
+            if not connection.in_transaction and len(idle) < MAX_IDLE_CONNECTIONS:
+                idle.append(connection)
+                connection = None
+        if connection is not None:
+            connection.close()
+
+
+def close_idle_connections(database=None):
+    """Close this process's pooled connections (to ``database`` or to all)."""
+    pid = os.getpid()
+    with _idle_lock:
+        keys = [key for key in _idle if key[0] == pid and database in (None, key[1])]
+        connections = [connection for key in keys for connection in _idle.pop(key)]
+    for connection in connections:
+        connection.close()
+
+
+atexit.register(close_idle_connections)
+
+
+@contextmanager
+def transaction(connection, begin="BEGIN"):
+    connection.execute(begin)
+    try:
+        yield connection
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
+
+
+class SqliteListStore:
+    """``JsonListStore`` interface on top of the shared SQLite database.
+
+    ``root_dir`` is the collection directory (``person_data/blog``); its name
+    is the collection and the database lives in its parent.
+    """
+
+    def __init__(self, root_dir, cache=None):
+        root_dir = Path(root_dir)
+        root_dir.parent.mkdir(parents=True, exist_ok=True)
+        self.collection = root_dir.name
+        self.database = str(root_dir.parent / DATABASE_NAME)
+        self.cache = cache
+        with connect(self.database) as connection:
+            connection.executescript(SCHEMA)
+
+    def load(self, record_id):
+        record_id = validate_record_id(record_id)
+        with connect(self.database) as connection, transaction(connection):
+            _, _, records, _ = self._snapshot(connection, record_id)
+        return copy_records(records)
+
+    def page(self, record_id, limit, cursor=None, newest_first=True):
+        """One page of the list, same as ``page_records`` but read by position."""
+        record_id = validate_record_id(record_id)
+        key = (self.collection, record_id)
+        with connect(self.database) as connection, transaction(connection):
+            if cursor is None:
+                position = FIRST_POSITION if newest_first else LAST_POSITION
+            else:
+                row = connection.execute(SELECT_POSITION, (*key, cursor)).fetchone()
+                if row is None:
+                    raise KeyError(cursor)
+                position = row[0]
+            query = SELECT_NEWER_PAGE if newest_first else SELECT_OLDER_PAGE
+            rows = connection.execute(query, (*key, position, limit + 1)).fetchall()
+
+        items = [json.loads(data) for data, in rows[:limit]]
+        if not newest_first:
+            items.reverse()
+        return items, len(rows) > limit
+
+    def changes(self, record_id, since):
+        """Items changed after ``since`` and all item IDs, from the indexes."""
+        record_id = validate_record_id(record_id)
+        key = (self.collection, record_id)
+        with connect(self.database) as connection, transaction(connection):
+            items = [json.loads(data) for data, in connection.execute(SELECT_CHANGED, (*key, since))]
+            ids = [item_id for item_id, in connection.execute(SELECT_IDS, key)]
+        return items, ids
+
+    def version(self, record_id):
+        """Версия записи для ETag: меняется при каждом сохранении."""
+        record_id = validate_record_id(record_id)
+        with connect(self.database) as connection:
+            return str(self._version(connection, record_id))
+
+    def exists(self, record_id):
+        return self.version(record_id) != "0"
+
+    def save(self, record_id, records):
+        if not isinstance(records, list):
+            raise ValueError("SqliteListStore can only save lists")
+        self.update(record_id, lambda current: records)
+
+    def update(self, record_id, fn):
+        """Atomically replace the record's list with ``fn(current_list)``.
+
+        Same contract as ``JsonListStore.update``; the change is written as
+        single-row statements when possible.
+        """
+        record_id = validate_record_id(record_id)
+        with connect(self.database) as connection, transaction(connection, "BEGIN IMMEDIATE"):
+            version, positions, current, size = self._snapshot(connection, record_id)
+            records = fn(copy_records(current))
+            if not isinstance(records, list):
+                raise ValueError("SqliteListStore can only save lists")
+            if records == current:
+                return records
+            positions, size = self._write(connection, record_id, positions, current, records, size)
+            version = _next_version(version)
+            connection.execute(SET_VERSION, (self.collection, record_id, version))
+
+        if self.cache is not None:
+            self.cache.put(
+                self._cache_key(record_id),
+                version,
+                (positions, copy_records(records), size),
+                size,
+            )
+        return records
+
+    def apply(self, record_id, fn):
+        """Write the operation ``fn(current_list)`` as one statement.
+
+        Same contract as ``JsonListStore.apply``; nothing is compared.
+        """
+        record_id = validate_record_id(record_id)
+        with connect(self.database) as connection, transaction(connection, "BEGIN IMMEDIATE"):
+            version, positions, current, size = self._snapshot(connection, record_id)
+            operation = fn(current)
+            if operation is None:
+                return None
+            positions, size = self._apply(connection, record_id, positions, current, [operation], size)
+            version = _next_version(version)
+            connection.execute(SET_VERSION, (self.collection, record_id, version))
+
+        if self.cache is not None:
+            records = apply_operation(current, operation)
+            self.cache.put(self._cache_key(record_id), version, (positions, records, size), size)
+        return operation
+
+    def insert(self, record_id, make_item, at_start=False):
+        """Add ``make_item(latest_version)`` with one INSERT, read from the indexes."""
+        record_id = validate_record_id(record_id)
+        key = (self.collection, record_id)
+        with connect(self.database) as connection, transaction(connection, "BEGIN IMMEDIATE"):
+            version = self._version(connection, record_id)
+            latest, first, last = connection.execute(SELECT_BOUNDS, key).fetchone()
+            item = make_item(latest or 0)
+            if first is None:
+                position = 0
+            else:
+                position = first - 1 if at_start else last + 1
+            data = json.dumps(item, ensure_ascii=False)
+            connection.execute(INSERT_ITEM, (*key, position, *_columns(item), data))
+            cache_key = self._cache_key(record_id)
+            cached = self.cache.get(cache_key, version) if self.cache is not None else None
+            version = _next_version(version)
+            connection.execute(SET_VERSION, (*key, version))
+
+        if cached is not None:
+            positions, records, size = cached
+            if at_start:
+                positions, records = [position] + positions, [item] + records
+            else:
+                positions, records = positions + [position], records + [item]
+            size += len(data)
+            self.cache.put(cache_key, version, (positions, records, size), size)
+        return item
+
+    def _version(self, connection, record_id):
+        row = connection.execute(SELECT_VERSION, (self.collection, record_id)).fetchone()
+        return row[0] if row else 0
+
+    def _snapshot(self, connection, record_id):
+        """``(version, positions, records, size)``; the caller holds a transaction."""
+        version = self._version(connection, record_id)
+        key = self._cache_key(record_id)
+        if self.cache is not None:
+            writes = self.cache.writes(key)
+            cached = self.cache.get(key, version)
+            if cached is not None:
+                return (version, *cached)
+
+        positions, records, size = [], [], 0
+        for position, data in connection.execute(SELECT_ITEMS, (self.collection, record_id)):
+            positions.append(position)
+            records.append(json.loads(data))
+            size += len(data)
+        if self.cache is not None:
+            self.cache.put(key, version, (positions, records, size), size, writes)
+        return version, positions, records, size
+
+    def _write(self, connection, record_id, positions, current, records, size):
+        """Store the change; returns the new ``(positions, size)``."""
+        operations = diff_records(current, records)
+        if operations is None:
+            connection.execute(DELETE_ITEMS, (self.collection, record_id))
+            return self._apply(
+                connection, record_id, [], [], [{"append": item} for item in records], 0
+            )
+        return self._apply(connection, record_id, positions, current, operations, size)
+
+    def _apply(self, connection, record_id, positions, current, operations, size):
+        """Run single-row statements for ``operations``; returns ``(positions, size)``."""
+        positions = list(positions)
+        for operation in operations:
+            if "delete" in operation:
+                index = operation["delete"]
+                connection.execute(DELETE_ITEM, (self.collection, record_id, positions.pop(index)))
+                size -= len(json.dumps(current[index], ensure_ascii=False))
+                continue
+            if "replace" in operation:
+                index, item = operation["replace"]
+                data = json.dumps(item, ensure_ascii=False)
+                connection.execute(
+                    UPDATE_ITEM,
+                    (*_columns(item), data, self.collection, record_id, positions[index]),
+                )
+                size += len(data) - len(json.dumps(current[index], ensure_ascii=False))
+                continue
+            if "prepend" in operation:
+                item = operation["prepend"]
+                position = positions[0] - 1 if positions else 0
+                positions.insert(0, position)
+            else:
+                item = operation["append"]
+                position = positions[-1] + 1 if positions else 0
+                positions.append(position)
+            data = json.dumps(item, ensure_ascii=False)
+            connection.execute(
+                INSERT_ITEM,
+                (self.collection, record_id, position, *_columns(item), data),
+            )
+            size += len(data)
+        return positions, size
+
+    def _cache_key(self, record_id):
+        return f"{self.database}:{self.collection}/{record_id}"
+
+
+def _next_version(version):
+    return max(version + 1, time.time_ns() // 1000)
+
+
+def _columns(item):
+    """Indexed columns of an item: ``(created, item_id, item_version)``."""
+    return _created(item), item_field(item, "id"), item_field(item, "version", 0)
+
+
+def _created(item):
+    if isinstance(item, dict):
+        created = item.get("timestamp", item.get("date"))
+        if isinstance(created, (str, int, float)):
+            return created
+    return None
+
+
+def migrate_json_directories(data_dir, collections=COLLECTIONS):
+    """Copy JSON and JSON Lines records into the database.
+
+    Records that are already in the database are skipped, so the migration
+    can be repeated.  The files stay in place as a backup.  Returns
+    ``{collection: number of copied records}``.
+    """
+    data_dir = Path(data_dir)
+    copied = {}
+    for collection in collections:
+        directory = data_dir / collection
+        target = SqliteListStore(directory)
+        copied[collection] = 0
+        if not directory.is_dir():
+            continue
+        record_ids = sorted({path.stem for path in directory.glob("*.json")} | {
+            path.stem for path in directory.glob("*.jsonl")
+        })
+        for record_id in record_ids:
+            if target.exists(record_id):
+                continue
+            if (directory / f"{record_id}.jsonl").exists():
+                records = JsonLogStore(directory).load(record_id)
+            else:
+                records = JsonListStore(directory).load(record_id)
+            target.save(record_id, records)
+            copied[collection] += 1
+    return copied
+
+
+def main():
+    import argparse
+    from config.settings import load_settings
+
+    parser = argparse.ArgumentParser(
+        description="Перенос фото, блогов и сообщений из JSON-файлов в SQLite"
+    )
+    parser.add_argument("data_dir", nargs="?", help="каталог данных (по умолчанию из настроек)")
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir) if args.data_dir else load_settings().data_dir
+    copied = migrate_json_directories(data_dir)
+    for collection, count in copied.items():
+        print(f"{collection}: перенесено записей: {count}")
+    print(f"База данных: {data_dir / DATABASE_NAME}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Сжатие ответов: выбор кодировки по Accept-Encoding и кэш сжатой статики.
+
+gzip есть всегда; brotli и zstd подключаются, если доступны модули
+``brotli`` и ``compression.zstd`` (Python 3.14) или ``zstandard``.
+"""
+
+import gzip
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from compression import zstd
+    zstandard = None
+except ImportError:
+    zstd = None
+    try:
+        import zstandard
+    except ImportError:
+        zstandard = None
+
+
+COMPRESSION_MIN_BYTES = 1024
+COMPRESSIBLE_TYPES = {
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "image/svg+xml",
+    "text/css",
+    "text/html",
+    "text/javascript",
+    "text/plain",
+}
+
+
+def _zstd_compress(data, level):
+    # compression.zstd тоже содержит ZstdCompressor, но его compress() без
+    # mode=FLUSH_FRAME возвращает незавершенный кадр; поэтому у модуля из
+    # stdlib берем только функцию compress(), которая пишет кадр целиком.
+    if zstd is not None:
+        return zstd.compress(data, level=level)
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+# (encoding, static level, dynamic level, compress) in server preference order.
+# Static assets are compressed once and cached, so they get the slow levels.
+ENCODERS = [
+    encoder
+    for encoder in (
+        ("zstd", 19, 3, _zstd_compress) if zstd or zstandard else None,
+        ("br", 11, 5, lambda data, level: brotli.compress(data, quality=level)) if brotli else None,
+        ("gzip", 9, 5, lambda data, level: gzip.compress(data, compresslevel=level, mtime=0)),
+    )
+    if encoder
+]
+SUPPORTED_ENCODINGS = tuple(name for name, *_ in ENCODERS)
+
+
+def is_compressible(content_type):
+    return content_type.split(";", 1)[0].strip().lower() in COMPRESSIBLE_TYPES
+
+
+def negotiate_encoding(accept_encoding):
+    """Лучшая поддерживаемая кодировка из Accept-Encoding или None."""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    wildcard = accepted.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for name in SUPPORTED_ENCODINGS:
+        quality = accepted.get(name, wildcard)
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def compress(data, encoding, static=False):
+    for name, static_level, dynamic_level, compress_bytes in ENCODERS:
+        if name == encoding:
+            return compress_bytes(data, static_level if static else dynamic_level)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+class CompressedAssetCache:
+    """LRU сжатых статических файлов, ограниченный суммарным размером.
+
+    Ключ включает mtime и размер файла, поэтому измененный файл просто
+    получает новую запись, а старая вытесняется.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, path, stat_result, encoding):
+        key = (str(path), stat_result.st_mtime_ns, stat_result.st_size, encoding)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                return data
+
+        with open(path, "rb") as source:
+            data = compress(source.read(), encoding, static=True)
+
+        if len(data) <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = data
+                    self.size += len(data)
+                while self.size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.size -= len(evicted)
+        return data
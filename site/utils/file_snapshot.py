@@ -0,0 +1,42 @@
+"""Данные, построенные из файла и перестраиваемые при его изменении."""
+
+import threading
+from pathlib import Path
+
+
+class FileSnapshot:
+    """Результат ``build(path)``, привязанный к mtime, размеру и inode файла.
+
+    Перед каждым чтением делается один ``stat``; построение повторяется,
+    только если файл изменился или был подменен.  Снимок и штамп файла
+    хранятся в одном кортеже и заменяются одним присваиванием, поэтому
+    параллельные запросы видят либо старый, либо новый снимок целиком.
+    Для отсутствующего файла возвращается ``empty``.
+    """
+
+    def __init__(self, path, build, empty=None):
+        self.path = Path(path)
+        self.build = build
+        self.empty = empty
+        self._snapshot = (None, empty)
+        self._lock = threading.Lock()
+
+    def get(self):
+        try:
+            stat_result = self.path.stat()
+            stamp = (stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino)
+        except FileNotFoundError:
+            stamp = None
+
+        snapshot = self._snapshot
+        if snapshot[0] == stamp:
+            return snapshot[1]
+
+        with self._lock:
+            # Другой поток мог уже перестроить снимок, пока мы ждали.
+            snapshot = self._snapshot
+            if snapshot[0] != stamp:
+                value = self.build(self.path) if stamp else self.empty
+                snapshot = (stamp, value)
+                self._snapshot = snapshot
+        return snapshot[1]
@@ -4,6 +4,16 @@ import mimetypes
 import shutil
 import urllib.parse
 from pathlib import Path
+from storage.sqlite_store import DATABASE_NAME
+from utils.http_cache import FILE_ETAGS, answer_not_modified, http_date
+from utils.http_range import (
+    RangeNotSatisfiable,
+    content_range,
+    parse_range,
+    range_value,
+    requested_range,
+    send_range_not_satisfiable,
+)
 
 
 def serve_file(handler, file_path, send_body=True, data_dir=None, object_storage=None):
@@ -24,19 +34,13 @@ def serve_file(handler, file_path, send_body=True, data_dir=None, object_storage
             handler.send_error(403, "Доступ запрещен")
             return
 
+        # База SQLite с ее WAL-файлами содержит данные всех персон сразу.
+        if full_path.name.startswith(DATABASE_NAME):
+            handler.send_error(403, "Доступ запрещен")
+            return
+
         if object_storage and relative_path.startswith("photos/"):
-            stored_object = object_storage.get_object(relative_path)
-            if stored_object:
-                data = stored_object["data"]
-                handler.send_response(200)
-                handler.send_header(
-                    "Content-Type",
-                    stored_object.get("content_type", "application/octet-stream"),
-                )
-                handler.send_header("Content-Length", str(len(data)))
-                handler.end_headers()
-                if send_body:
-                    handler.wfile.write(data)
+            if _serve_stored_object(handler, object_storage, relative_path, send_body):
                 return
 
         if not full_path.exists() or not full_path.is_file():
@@ -48,20 +52,106 @@ def serve_file(handler, file_path, send_body=True, data_dir=None, object_storage
         if mime_type is None:
             mime_type = "application/octet-stream"
 
-        handler.send_response(200)
+        stat_result = full_path.stat()
+        etag = FILE_ETAGS.etag(full_path, stat_result)
+        if answer_not_modified(handler, etag, stat_result.st_mtime):
+            return
+
+        size = stat_result.st_size
+        byte_range = requested_range(handler.headers, etag, stat_result.st_mtime)
+        span = parse_range(byte_range, size) if byte_range else None
+        start, end = span or (0, size - 1)
+
+        handler.send_response(206 if span else 200)
         handler.send_header("Content-Type", mime_type)
-        handler.send_header("Content-Length", str(full_path.stat().st_size))
+        handler.send_header("Content-Length", str(end - start + 1))
+        if span:
+            handler.send_header("Content-Range", content_range(start, end, size))
+        handler.send_header("Accept-Ranges", "bytes")
+        handler.send_header("ETag", etag)
+        handler.send_header("Last-Modified", http_date(stat_result.st_mtime))
         handler.end_headers()
         if not send_body:
             return
         with full_path.open("rb") as source:
-            shutil.copyfileobj(source, handler.wfile)
+            send_file_body(handler, source, offset=start, count=end - start + 1)
 
+    except RangeNotSatisfiable as error:
+        send_range_not_satisfiable(handler, error.size)
     except Exception as e:
         print(f"Ошибка обслуживания файла: {e}")
         handler.send_error(500)
 
 
+def _serve_stored_object(handler, object_storage, key, send_body):
+    """Фото из S3; диапазон передается в хранилище как есть. False — нет объекта."""
+    byte_range = range_value(handler.headers)
+    stored_object = (
+        object_storage.get_object(key, byte_range=byte_range)
+        if byte_range
+        else object_storage.get_object(key)
+    )
+    if not stored_object:
+        return False
+
+    # Фотографии в хранилище не перезаписываются: ETag из S3 стабилен.
+    etag = stored_object.get("etag")
+    if etag and answer_not_modified(handler, etag):
+        return True
+    if byte_range and not requested_range(handler.headers, etag):
+        # If-Range не совпал с объектом: клиенту нужен файл целиком.
+        stored_object = object_storage.get_object(key)
+        if not stored_object:
+            return False
+
+    data = stored_object["data"]
+    partial = stored_object.get("content_range")
+    handler.send_response(206 if partial else 200)
+    handler.send_header(
+        "Content-Type",
+        stored_object.get("content_type", "application/octet-stream"),
+    )
+    handler.send_header("Content-Length", str(len(data)))
+    if partial:
+        handler.send_header("Content-Range", partial)
+    handler.send_header("Accept-Ranges", "bytes")
+    if etag:
+        handler.send_header("ETag", etag)
+    handler.end_headers()
+    if send_body:
+        handler.wfile.write(data)
+    return True
+
+
+def send_file_body(handler, source, offset=0, count=None):
+    """Отправка файла клиенту без копирования через Python, если это возможно.
+
+    ``socket.sendfile`` использует ``os.sendfile`` и сам откатывается на
+    обычную отправку для объектов без файлового дескриптора.  В asyncio-режиме
+    сокетом владеет цикл событий, и ``connection`` (``StreamRequest``)
+    отправляет файл через ``loop.sendfile``.  Без соединения (тесты) данные
+    копируются в ``handler.wfile``.
+    """
+    if count == 0:
+        return
+    sendfile = getattr(getattr(handler, "connection", None), "sendfile", None)
+    if sendfile is not None:
+        handler.wfile.flush()
+        sendfile(source, offset, count)
+        return
+
+    source.seek(offset)
+    if count is None:
+        shutil.copyfileobj(source, handler.wfile)
+        return
+    while count > 0:
+        chunk = source.read(min(count, 1024 * 1024))
+        if not chunk:
+            break
+        handler.wfile.write(chunk)
+        count -= len(chunk)
+
+
 def ensure_directories_exist(data_dir):
     """Создание необходимых директорий для данных"""
     directories = ["photos", "blog", "messages"]
@@ -0,0 +1,120 @@
+"""ETag и условные запросы (If-None-Match / If-Modified-Since)."""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+
+
+class FileETagCache:
+    """Сильные ETag для файлов: размер и хеш содержимого.
+
+    Хеш требует чтения всего файла, поэтому он запоминается по ключу
+    ``(путь, mtime_ns, размер, inode)`` и пересчитывается только после
+    изменения файла. Кэш ограничен числом записей (LRU).
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def etag(self, path, stat_result):
+        key = (str(path), stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino)
+        with self._lock:
+            etag = self._entries.get(key)
+            if etag is not None:
+                self._entries.move_to_end(key)
+                return etag
+
+        digest = hashlib.blake2b(digest_size=12)
+        with open(path, "rb") as source:
+            for chunk in iter(lambda: source.read(1024 * 1024), b""):
+                digest.update(chunk)
+        etag = f'"{stat_result.st_size:x}-{digest.hexdigest()}"'
+
+        with self._lock:
+            self._entries[key] = etag
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+
+FILE_ETAGS = FileETagCache()
+ENCODING_SUFFIX = re.compile(r'-(?:gzip|br|zstd)"$')
+
+
+def version_etag(*versions):
+    """ETag для JSON-ответа, собранный из версий хранилищ."""
+    return '"v-' + "-".join(str(version) for version in versions) + '"'
+
+
+def encoded_etag(etag, encoding):
+    """ETag сжатого варианта: у каждого представления свой сильный ETag."""
+    return f'{etag[:-1]}-{encoding}"' if etag else etag
+
+
+def http_date(timestamp):
+    return formatdate(timestamp, usegmt=True)
+
+
+def is_not_modified(headers, etag, last_modified=None):
+    """Проверка условного GET.
+
+    ``If-None-Match`` важнее ``If-Modified-Since`` (RFC 9110, 13.2.2) и
+    сравнивается слабо: прокси со сжатием помечают ETag как ``W/``.
+    """
+    if_none_match = headers.get("If-None-Match")
+    if if_none_match is not None:
+        if etag is None:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        candidates = {_opaque_tag(tag) for tag in if_none_match.split(",")}
+        return _opaque_tag(etag) in candidates
+
+    if_modified_since = headers.get("If-Modified-Since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+
+def holds_encoded_variant(headers, etag):
+    """Прислал ли клиент в If-None-Match ETag сжатого варианта ресурса ``etag``."""
+    target = _opaque_tag(etag)
+    return any(
+        ENCODING_SUFFIX.search(tag.strip()) and _opaque_tag(tag) == target
+        for tag in headers.get("If-None-Match", "").split(",")
+    )
+
+
+def answer_not_modified(handler, etag, last_modified=None):
+    """Ответить 304, если у клиента актуальная копия; вернуть True в этом случае."""
+    if not is_not_modified(handler.headers, etag, last_modified):
+        return False
+    send_not_modified(handler, etag, last_modified)
+    return True
+
+
+def send_not_modified(handler, etag, last_modified=None, vary=None):
+    handler.send_response(304)
+    if vary:
+        handler.send_header("Vary", vary)
+    if etag:
+        handler.send_header("ETag", etag)
+    if last_modified is not None:
+        handler.send_header("Last-Modified", http_date(last_modified))
+    handler.end_headers()
+
+
+def _opaque_tag(tag):
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    # Сжатый вариант не изменился, если не изменился исходный ресурс.
+    return ENCODING_SUFFIX.sub('"', tag)
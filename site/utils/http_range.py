@@ -0,0 +1,87 @@
+"""Запросы диапазонов байтов (Range / If-Range, RFC 9110, раздел 14).
+
+Поддерживается один диапазон на запрос: браузеры и мобильные клиенты
+докачивают файлы именно так.  Запрос нескольких диапазонов обслуживается
+целиком ответом ``200``, что стандарт разрешает.
+"""
+
+import re
+from email.utils import parsedate_to_datetime
+
+
+RANGE_SPEC = re.compile(r"^bytes=\s*(\d*)\s*-\s*(\d*)\s*$", re.IGNORECASE)
+
+
+class RangeNotSatisfiable(Exception):
+    def __init__(self, size):
+        super().__init__(f"Range not satisfiable for {size} bytes")
+        self.size = size
+
+
+def requested_range(headers, etag=None, last_modified=None):
+    """Заголовок Range, если он применим к текущей версии ресурса, иначе None.
+
+    ``If-Range`` с устаревшим ETag или датой означает «пришлите файл целиком».
+    """
+    range_header = range_value(headers)
+    if range_header is None:
+        return None
+
+    if_range = headers.get("If-Range")
+    if if_range is None:
+        return range_header
+    if_range = if_range.strip()
+    if if_range.startswith('"'):
+        # Strong comparison only: a weak validator can't vouch for byte offsets.
+        return range_header if etag and if_range == etag else None
+    if last_modified is None:
+        return None
+    try:
+        since = parsedate_to_datetime(if_range).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+    return range_header if int(last_modified) == int(since) else None
+
+
+def range_value(headers):
+    """Заголовок Range одного диапазона байтов без учета If-Range."""
+    range_header = headers.get("Range")
+    if not range_header or not RANGE_SPEC.match(range_header):
+        return None
+    return range_header
+
+
+def parse_range(range_header, size):
+    """``(start, end)`` включительно для ресурса длиной ``size``.
+
+    Возвращает None для синтаксически неверного диапазона (его нужно
+    игнорировать) и бросает ``RangeNotSatisfiable``, если диапазон целиком
+    за концом файла.
+    """
+    first, last = RANGE_SPEC.match(range_header).groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N: the last N bytes.
+        suffix = int(last)
+        if suffix == 0:
+            raise RangeNotSatisfiable(size)
+        return max(0, size - suffix), size - 1
+
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(size)
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def content_range(start, end, size):
+    return f"bytes {start}-{end}/{size}"
+
+
+def send_range_not_satisfiable(handler, size):
+    handler.send_response(416)
+    handler.send_header("Content-Range", f"bytes */{size}")
+    handler.send_header("Content-Length", "0")
+    handler.end_headers()
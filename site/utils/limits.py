@@ -0,0 +1,70 @@
+"""Concurrency limits and counters for overload protection."""
+
+import threading
+from collections import defaultdict
+
+
+class ServerMetrics:
+    """Thread-safe counters plus gauges that are read on demand."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._gauges = {}
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def register_gauge(self, name, read_value):
+        with self._lock:
+            self._gauges[name] = read_value
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        return {
+            "counters": counters,
+            "gauges": {name: read_value() for name, read_value in gauges.items()},
+        }
+
+
+class ConcurrencyLimiter:
+    """Per-route-class slots; callers that find no free slot are refused.
+
+    Acquisition never blocks: an overloaded server should answer 503 right
+    away instead of queueing more work behind the requests it already has.
+    """
+
+    def __init__(self, limits, metrics=None):
+        self.limits = dict(limits)
+        self.metrics = metrics or ServerMetrics()
+        self._lock = threading.Lock()
+        self._in_flight = {route_class: 0 for route_class in self.limits}
+        for route_class in self.limits:
+            self.metrics.register_gauge(
+                f"in_flight.{route_class}",
+                lambda route_class=route_class: self._in_flight[route_class],
+            )
+
+    def try_acquire(self, route_class):
+        limit = self.limits.get(route_class)
+        if limit is None:
+            return True
+        with self._lock:
+            if self._in_flight[route_class] >= limit:
+                admitted = False
+            else:
+                self._in_flight[route_class] += 1
+                admitted = True
+        self.metrics.increment(
+            f"{'admitted' if admitted else 'rejected'}.{route_class}"
+        )
+        return admitted
+
+    def release(self, route_class):
+        if route_class not in self.limits:
+            return
+        with self._lock:
+            self._in_flight[route_class] -= 1
@@ -0,0 +1,83 @@
+"""Sliding-window rate limiting with bounded memory.
+
+Each key keeps two fixed-window counters: the current window and the one
+before it.  The request rate is estimated by weighting the previous count by
+the part of it that still overlaps the sliding window, which behaves like a
+log of timestamps but needs three numbers per key.  ``SharedRateLimiter``
+stores the same state in shared memory for pre-forked workers.
+"""
+
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+
+def sliding_window(state, now, window_seconds, limit):
+    """Count one request against ``state = (window_start, count, previous)``.
+
+    Returns ``(allowed, new_state)``; ``state`` is ``None`` for a new key.
+    """
+    window_start = now - (now % window_seconds)
+    started_at, count, previous = state or (window_start, 0, 0)
+    if started_at != window_start:
+        is_adjacent = started_at == window_start - window_seconds
+        previous = count if is_adjacent else 0
+        count = 0
+        started_at = window_start
+
+    elapsed = (now - window_start) / window_seconds
+    allowed = previous * (1 - elapsed) + count < limit
+    if allowed:
+        count += 1
+    return allowed, (started_at, count, previous)
+
+
+class RateLimiter:
+    """In-process sliding-window limiter.
+
+    Keys are spread over ``stripes`` independently locked dicts, so threads
+    checking different clients rarely contend.  Each dict is kept in order
+    of last use, so idle keys are always at its front: a key idle for two
+    windows no longer affects any decision and is dropped the next time its
+    stripe grows, and ``max_keys`` caps memory by dropping the least recently
+    used key even when every key is still active.  Eviction never scans the
+    stripe.
+    """
+
+    def __init__(self, limit=120, window_seconds=60, stripes=16, max_keys=65536):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.max_keys_per_stripe = max(1, max_keys // stripes)
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._states = [OrderedDict() for _ in range(stripes)]
+
+    def allow(self, key, now=None, limit=None):
+        now = now if now is not None else time.time()
+        stripe = zlib.crc32(str(key).encode("utf-8")) % len(self._locks)
+        states = self._states[stripe]
+        with self._locks[stripe]:
+            state = states.get(key)
+            if state is None:
+                if len(states) >= self.max_keys_per_stripe:
+                    self._evict(states, now)
+            else:
+                states.move_to_end(key)
+            allowed, states[key] = sliding_window(
+                state,
+                now,
+                self.window_seconds,
+                self.limit if limit is None else limit,
+            )
+        return allowed
+
+    def __len__(self):
+        return sum(len(states) for states in self._states)
+
+    def _evict(self, states, now):
+        idle_before = now - 2 * self.window_seconds
+        while states and next(iter(states.values()))[0] <= idle_before:
+            states.popitem(last=False)
+        # Still full of active keys: drop the least recently used one.
+        if len(states) >= self.max_keys_per_stripe:
+            states.popitem(last=False)
@@ -4,6 +4,13 @@
 
 import json
 from datetime import datetime
+from utils.compression import COMPRESSION_MIN_BYTES, compress, negotiate_encoding
+from utils.http_cache import (
+    encoded_etag,
+    holds_encoded_variant,
+    is_not_modified,
+    send_not_modified,
+)
 
 NO_CACHE_HEADERS = {
     "Cache-Control": "no-cache, no-store, must-revalidate",
@@ -15,16 +22,50 @@ STATIC_CACHE_HEADERS = {
     "Cache-Control": "public, max-age=3600",
 }
 
+# Ответы с ETag браузер хранит, но перед использованием сверяет с сервером.
+REVALIDATE_HEADERS = {
+    "Cache-Control": "private, no-cache",
+}
+
 
-def send_json_response(handler, data):
+def send_json_response(handler, data, etag=None, status=200):
     """Отправка JSON ответа"""
-    response = json.dumps(data, ensure_ascii=False)
+    body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+    encoding = None
+    if len(body) >= COMPRESSION_MIN_BYTES:
+        encoding = negotiate_encoding(handler.headers.get('Accept-Encoding'))
+    if encoding:
+        body = compress(body, encoding)
+        etag = encoded_etag(etag, encoding)
 
-    handler.send_response(200)
+    handler.send_response(status)
     handler.send_header('Content-Type', 'application/json; charset=utf-8')
-    handler.send_header('Content-Length', str(len(response.encode('utf-8'))))
+    handler.send_header('Content-Length', str(len(body)))
+    handler.send_header('Vary', 'Accept-Encoding')
+    if encoding:
+        handler.send_header('Content-Encoding', encoding)
+    if etag:
+        handler.send_header('ETag', etag)
     handler.end_headers()
-    handler.wfile.write(response.encode('utf-8'))
+    handler.wfile.write(body)
+
+
+def answer_json_not_modified(handler, etag):
+    """Ответить 304 на запрос JSON, если у клиента актуальная копия.
+
+    304 несет ETag того варианта, который отправил бы ``send_json_response``,
+    и ``Vary``.  Сжимаются только тела от ``COMPRESSION_MIN_BYTES``, а тело
+    здесь еще не собрано; клиент со сжатым вариантом получил его для того же
+    тела, поэтому сжато оно и сейчас — выбранной кодировкой.
+    """
+    if not is_not_modified(handler.headers, etag):
+        return False
+    if holds_encoded_variant(handler.headers, etag):
+        encoding = negotiate_encoding(handler.headers.get('Accept-Encoding'))
+        if encoding:
+            etag = encoded_etag(etag, encoding)
+    send_not_modified(handler, etag, vary='Accept-Encoding')
+    return True
 
 
 def get_current_timestamp():
@@ -32,8 +73,13 @@ def get_current_timestamp():
     return datetime.now().isoformat()
 
 
-def setup_cors_headers(handler, cacheable=False):
+def setup_cors_headers(handler, cacheable=False, revalidate=False):
     """Настройка общих заголовков ответа для same-origin сайта."""
-    headers = STATIC_CACHE_HEADERS if cacheable else NO_CACHE_HEADERS
+    if cacheable:
+        headers = STATIC_CACHE_HEADERS
+    elif revalidate:
+        headers = REVALIDATE_HEADERS
+    else:
+        headers = NO_CACHE_HEADERS
     for name, value in headers.items():
         handler.send_header(name, value)
@@ -0,0 +1,108 @@
+"""Rate limiter with counters in shared memory for pre-forked workers."""
+
+import hashlib
+import mmap
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from utils.rate_limit import sliding_window
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - no fork() and no prefork mode there
+    fcntl = None
+
+
+class SharedRateLimiter:
+    """Sliding-window rate limiter backed by a fixed-size shared-memory table.
+
+    The table is a ``MAP_SHARED`` mapping of an unlinked temp file, so it must
+    be created in the supervisor before workers are forked; every worker then
+    counts against the same limits.  Workers take turns with a POSIX record
+    lock (``lockf``) on that file: it belongs to the process holding it and
+    the kernel drops it when that process dies, so a worker killed while
+    updating the table can't leave the others blocked forever, as a held
+    ``multiprocessing.Lock`` would.  Threads of one process queue on a
+    thread lock first, since record locks don't exclude them.  The algorithm is ``sliding_window`` from
+    ``utils.rate_limit``.  Slots are found by a short linear probe;
+    when every probed slot is busy the stalest one is reused, so memory stays
+    bounded no matter how many client addresses show up.
+    """
+
+    SLOT = struct.Struct("<QdII")
+    PROBES = 8
+
+    def __init__(self, limit=120, window_seconds=60, slots=8192):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.slots = slots
+        self.file = tempfile.TemporaryFile()
+        self.file.truncate(slots * self.SLOT.size)
+        self.memory = mmap.mmap(self.file.fileno(), slots * self.SLOT.size)
+        self.thread_lock = threading.Lock()
+
+    def allow(self, key, now=None, limit=None):
+        now = now if now is not None else time.time()
+        key_hash = _key_hash(key)
+        window_start = now - (now % self.window_seconds)
+
+        with self._locked():
+            index = self._find_slot(key_hash, window_start)
+            stored_hash, started_at, count, previous = self.SLOT.unpack_from(
+                self.memory, index * self.SLOT.size
+            )
+            state = (started_at, count, previous) if stored_hash == key_hash else None
+            allowed, (started_at, count, previous) = sliding_window(
+                state,
+                now,
+                self.window_seconds,
+                self.limit if limit is None else limit,
+            )
+            self.SLOT.pack_into(
+                self.memory,
+                index * self.SLOT.size,
+                key_hash,
+                started_at,
+                count,
+                previous,
+            )
+        return allowed
+
+    @contextmanager
+    def _locked(self):
+        with self.thread_lock:
+            if fcntl is None:
+                yield
+                return
+            fcntl.lockf(self.file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self.file.fileno(), fcntl.LOCK_UN)
+
+    def _find_slot(self, key_hash, window_start):
+        base = key_hash % self.slots
+        reusable = None
+        stalest, stalest_start = base, None
+        for probe in range(self.PROBES):
+            index = (base + probe) % self.slots
+            stored_hash, started_at, _, _ = self.SLOT.unpack_from(
+                self.memory, index * self.SLOT.size
+            )
+            if stored_hash == key_hash:
+                return index
+            expired = started_at < window_start - self.window_seconds
+            if reusable is None and (stored_hash == 0 or expired):
+                reusable = index
+            if stalest_start is None or started_at < stalest_start:
+                stalest, stalest_start = index, started_at
+        return reusable if reusable is not None else stalest
+
+
+def _key_hash(key):
+    digest = hashlib.blake2b(str(key).encode("utf-8"), digest_size=8).digest()
+    # Zero marks an empty slot.
+    return int.from_bytes(digest, "little") or 1
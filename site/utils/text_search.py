@@ -0,0 +1,201 @@
+"""Полнотекстовый поиск по коротким документам (ФИО и даты).
+
+Токены приводятся к нижнему регистру, ``ё`` заменяется на ``е``.  Индекс
+держит три структуры:
+
+* обратный индекс ``токен -> документы`` для точных совпадений;
+* префиксное дерево токенов для поиска по началу слова («Ив» -> «Иванов»);
+* триграммы токенов для опечаток: кандидаты отбираются по числу общих
+  триграмм (каждая правка портит не больше трех), а затем проверяются
+  расстоянием редактирования.
+
+Документы добавляются и удаляются по одному, поэтому индекс можно
+обновлять по разнице между старыми и новыми данными.
+"""
+
+import re
+from collections import Counter
+
+
+TOKEN = re.compile(r"[0-9a-zа-я]+")
+
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.6
+FUZZY_SCORE = 0.4
+# Расстояние считается только для кандидатов с наибольшим числом общих триграмм.
+MAX_FUZZY_CANDIDATES = 200
+
+
+def fold(text):
+    return text.lower().replace("ё", "е")
+
+
+def tokenize(text):
+    return TOKEN.findall(fold(text))
+
+
+def trigrams(token):
+    padded = f"${token}$"
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+def max_typos(token):
+    # Опечатки в годах не угадываются: 1875 не ошибка в 1870.
+    if len(token) < 4 or token.isdigit():
+        return 0
+    return 1 if len(token) < 8 else 2
+
+
+def edit_distance(left, right, limit):
+    """Расстояние Дамерау-Левенштейна (с перестановкой соседних букв).
+
+    Больше ``limit`` не считается: возвращается ``limit + 1``.
+    """
+    if abs(len(left) - len(right)) > limit:
+        return limit + 1
+    previous_row = None
+    row = list(range(len(right) + 1))
+    for i, left_char in enumerate(left, 1):
+        before, previous_row, row = previous_row, row, [i] + [0] * len(right)
+        for j, right_char in enumerate(right, 1):
+            cost = left_char != right_char
+            row[j] = min(row[j - 1] + 1, previous_row[j] + 1, previous_row[j - 1] + cost)
+            if (
+                before is not None
+                and i > 1 and j > 1
+                and left_char == right[j - 2]
+                and left[i - 2] == right_char
+            ):
+                row[j] = min(row[j], before[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+    return row[-1]
+
+
+class PrefixTrie:
+    """Префиксное дерево на вложенных словарях; ``None`` отмечает конец слова."""
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, word):
+        node = self.root
+        for char in word:
+            node = node.setdefault(char, {})
+        node[None] = True
+
+    def remove(self, word):
+        path = [self.root]
+        for char in word:
+            node = path[-1].get(char)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].pop(None, None)
+        # Убираем опустевшие ветви снизу вверх.
+        for depth in range(len(word), 0, -1):
+            if path[depth]:
+                break
+            del path[depth - 1][word[depth - 1]]
+
+    def words_with_prefix(self, prefix):
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return
+        stack = [(prefix, node)]
+        while stack:
+            word, node = stack.pop()
+            for char, child in node.items():
+                if char is None:
+                    yield word
+                else:
+                    stack.append((word + char, child))
+
+
+class SearchIndex:
+    def __init__(self):
+        self.postings = {}
+        self.documents = {}
+        self.prefixes = PrefixTrie()
+        self.token_trigrams = {}
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, doc_id, text):
+        if doc_id in self.documents:
+            self.remove(doc_id)
+        tokens = tuple(dict.fromkeys(tokenize(text)))
+        self.documents[doc_id] = tokens
+        for token in tokens:
+            documents = self.postings.get(token)
+            if documents is None:
+                documents = self.postings[token] = set()
+                self.prefixes.add(token)
+                for trigram in trigrams(token):
+                    self.token_trigrams.setdefault(trigram, set()).add(token)
+            documents.add(doc_id)
+
+    def remove(self, doc_id):
+        for token in self.documents.pop(doc_id, ()):
+            documents = self.postings[token]
+            documents.discard(doc_id)
+            if documents:
+                continue
+            del self.postings[token]
+            self.prefixes.remove(token)
+            for trigram in trigrams(token):
+                tokens = self.token_trigrams[trigram]
+                tokens.discard(token)
+                if not tokens:
+                    del self.token_trigrams[trigram]
+
+    def search(self, query):
+        """``{doc_id: score}`` документов, где нашлось каждое слово запроса."""
+        scores = None
+        for term in dict.fromkeys(tokenize(query)):
+            term_scores = {}
+            for token, score in self._expand(term).items():
+                for doc_id in self.postings[token]:
+                    if score > term_scores.get(doc_id, 0):
+                        term_scores[doc_id] = score
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {
+                    doc_id: score + term_scores[doc_id]
+                    for doc_id, score in scores.items()
+                    if doc_id in term_scores
+                }
+            if not scores:
+                return {}
+        return scores or {}
+
+    def _expand(self, term):
+        """Токены индекса, подходящие к слову запроса, с их весом."""
+        matches = {}
+        for token in self.prefixes.words_with_prefix(term):
+            # Чем больше набрано от слова, тем выше вес дополнения.
+            matches[token] = PREFIX_SCORE * len(term) / len(token)
+        if term in self.postings:
+            matches[term] = EXACT_SCORE
+        if matches:
+            # Слово или его начало есть в индексе: считаем, что опечатки нет.
+            return matches
+
+        limit = max_typos(term)
+        if limit:
+            term_trigrams = trigrams(term)
+            shared = Counter()
+            for trigram in term_trigrams:
+                shared.update(self.token_trigrams.get(trigram, ()))
+            required = len(term_trigrams) - 3 * limit
+            for token, count in shared.most_common(MAX_FUZZY_CANDIDATES):
+                if count < required:
+                    break
+                distance = edit_distance(term, token, limit)
+                if distance <= limit:
+                    matches[token] = FUZZY_SCORE / distance
+        return matches
@@ -1,6 +1,9 @@
+import io
+import json
 import sys
 import tempfile
 import unittest
+import zipfile
 from pathlib import Path
 
 
@@ -9,7 +12,10 @@ TREE_GEN_ROOT = PROJECT_ROOT / "tree_gen"
 sys.path.insert(0, str(TREE_GEN_ROOT))
 
 from family_tree_builder import FamilyTreeBuilder
+from export_gedcom import open_photo_lists
+from gedcom7_exporter import Gedcom7Exporter, PersonPhotoSource
 from gedcom_exporter import GedcomExporter
+from gedcom_incremental import IncrementalGedcomWriter
 
 
 class GedcomExporterTest(unittest.TestCase):
@@ -43,7 +49,7 @@ class GedcomExporterTest(unittest.TestCase):
         self.assertIn("1 NAME Иван Иванович /Иванов/", gedcom)
         self.assertIn("1 BIRT\n2 DATE 1 FEB 1980", gedcom)
         self.assertIn("1 DEAT\n2 DATE 3 APR 2020", gedcom)
-        self.assertIn("0 @F1@ FAM", gedcom)
+        self.assertIn("0 @F1_2@ FAM", gedcom)
         self.assertIn("1 HUSB @I1@", gedcom)
         self.assertIn("1 WIFE @I2@", gedcom)
         self.assertIn("1 CHIL @I3@", gedcom)
@@ -80,10 +86,206 @@ class GedcomExporterTest(unittest.TestCase):
 
         gedcom = GedcomExporter(builder).to_string()
 
-        self.assertIn("0 @F1@ FAM", gedcom)
+        self.assertIn("0 @F1_C2@ FAM", gedcom)
         self.assertIn("1 HUSB @I1@", gedcom)
         self.assertIn("1 CHIL @I2@", gedcom)
 
 
+class IncrementalGedcomWriterTest(unittest.TestCase):
+    def build_tree(self, temp_dir, source_text):
+        source_file = Path(temp_dir) / "source.txt"
+        source_file.write_text(source_text, encoding="utf-8")
+        builder = FamilyTreeBuilder()
+        builder.parse_source_file(source_file)
+        return builder
+
+    def test_patches_changed_records_and_matches_full_export(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = Path(temp_dir) / "family_tree.ged"
+            first = self.build_tree(
+                temp_dir,
+                "1 - Иванов Иван (1980)\n2 - Иванова Мария (1982)\n3 - Иванов Петр (2005)\n1 -- 2 (3)\n",
+            )
+            IncrementalGedcomWriter(GedcomExporter(first)).write_file(output_path)
+
+            second = self.build_tree(
+                temp_dir,
+                "1 - Иванов Иван (1980-2020)\n2 - Иванова Мария (1982)\n1 -- 2\n",
+            )
+            report = IncrementalGedcomWriter(GedcomExporter(second)).write_file(output_path)
+
+            self.assertEqual(
+                output_path.read_text(encoding="utf-8"),
+                GedcomExporter(second).to_string(),
+            )
+            self.assertTrue(IncrementalGedcomWriter.manifest_path(output_path).exists())
+
+        self.assertEqual(report.added, [])
+        self.assertEqual(report.changed, ["@I1@", "@F1_2@"])
+        self.assertEqual(report.removed, ["@I3@"])
+        self.assertEqual(report.reused, 3)
+        self.assertTrue(report.rewritten)
+
+    def test_new_marriage_touches_only_its_family_and_members(self):
+        people = (
+            "1 - Иванов Иван (1950)\n2 - Иванова Мария (1952)\n3 - Иванов Петр (1975)\n"
+            "4 - Петрова Анна (1977)\n5 - Иванов Олег (2000)\n6 - Сидорова Ольга (1980)\n"
+            "7 - Иванова Вера (2001)\n"
+        )
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = Path(temp_dir) / "family_tree.ged"
+            first = self.build_tree(temp_dir, people + "1 -- 2 (3)\n3 -- 4 (5)\n")
+            IncrementalGedcomWriter(GedcomExporter(first)).write_file(output_path)
+
+            second = self.build_tree(temp_dir, people + "1 -- 6 (7)\n1 -- 2 (3)\n3 -- 4 (5)\n")
+            report = IncrementalGedcomWriter(GedcomExporter(second)).write_file(output_path)
+
+            self.assertEqual(
+                output_path.read_text(encoding="utf-8"),
+                GedcomExporter(second).to_string(),
+            )
+
+        self.assertEqual(report.added, ["@F1_6@"])
+        self.assertEqual(report.changed, ["@I1@", "@I6@", "@I7@"])
+        self.assertEqual(report.removed, [])
+
+    def test_unchanged_export_leaves_file_untouched(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = Path(temp_dir) / "family_tree.ged"
+            builder = self.build_tree(temp_dir, "1 - Иванов Иван (1980)\n")
+            IncrementalGedcomWriter(GedcomExporter(builder)).write_file(output_path)
+            mtime = output_path.stat().st_mtime_ns
+
+            report = IncrementalGedcomWriter(GedcomExporter(builder)).write_file(output_path)
+
+            self.assertFalse(report.rewritten)
+            self.assertFalse(report.has_changes)
+            self.assertEqual(output_path.stat().st_mtime_ns, mtime)
+
+    def test_hand_edited_file_is_fully_rewritten(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = Path(temp_dir) / "family_tree.ged"
+            builder = self.build_tree(temp_dir, "1 - Иванов Иван (1980)\n")
+            IncrementalGedcomWriter(GedcomExporter(builder)).write_file(output_path)
+            output_path.write_text("0 HEAD\n0 TRLR\n", encoding="utf-8")
+
+            report = IncrementalGedcomWriter(GedcomExporter(builder)).write_file(output_path)
+
+            self.assertEqual(report.reused, 0)
+            self.assertEqual(
+                output_path.read_text(encoding="utf-8"),
+                GedcomExporter(builder).to_string(),
+            )
+
+
+class FakeStreamingObjectStorage:
+    def __init__(self, objects):
+        self.objects = objects
+
+    def open_object(self, key):
+        if key not in self.objects:
+            return None
+        return {"body": io.BytesIO(self.objects[key]), "content_type": "image/png"}
+
+
+class Gedcom7ExporterTest(unittest.TestCase):
+    def build_tree(self, source_text):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source_file = Path(temp_dir) / "source.txt"
+            source_file.write_text(source_text, encoding="utf-8")
+            builder = FamilyTreeBuilder()
+            builder.parse_source_file(source_file)
+            return builder
+
+    def test_writes_gedcom7_header_without_legacy_char_tag(self):
+        builder = self.build_tree("1 - Иванов Иван (1980)\n")
+
+        gedcom = Gedcom7Exporter(builder).to_string()
+
+        self.assertTrue(gedcom.startswith("0 HEAD\n1 GEDC\n2 VERS 7.0\n"))
+        self.assertNotIn("1 CHAR", gedcom)
+        self.assertIn("1 NOTE Original: Иванов Иван (1980)", gedcom)
+
+    def test_gedzip_packages_photos_and_skips_missing_files(self):
+        builder = self.build_tree("1 - Иванов Иван (1980)\n2 - Иванова Мария (1982)\n")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            data_dir = Path(temp_dir) / "person_data"
+            (data_dir / "photos" / "node1").mkdir(parents=True)
+            (data_dir / "photos" / "node1" / "face.png").write_bytes(b"local-image")
+            (data_dir / "photos" / "node1.json").write_text(
+                json.dumps([
+                    {"filename": "face.png", "caption": "Портрет"},
+                    {"filename": "lost.png"},
+                ]),
+                encoding="utf-8",
+            )
+            (data_dir / "photos" / "node2.json").write_text(
+                json.dumps([{"filename": "s3.png"}]),
+                encoding="utf-8",
+            )
+            media_source = PersonPhotoSource(
+                data_dir,
+                open_photo_lists(data_dir, "json"),
+                object_storage=FakeStreamingObjectStorage({"photos/node2/s3.png": b"s3-image"}),
+            )
+            archive_path = Path(temp_dir) / "family_tree.gdz"
+
+            packaged = Gedcom7Exporter(builder, media_source=media_source).write_gedzip(archive_path)
+
+            with zipfile.ZipFile(archive_path) as archive:
+                gedcom = archive.read("gedcom.ged").decode("utf-8")
+                self.assertEqual(archive.read("photos/node1/face.png"), b"local-image")
+                self.assertEqual(archive.read("photos/node2/s3.png"), b"s3-image")
+                self.assertNotIn("photos/node1/lost.png", archive.namelist())
+
+        self.assertEqual(packaged, ["photos/node1/face.png", "photos/node2/s3.png"])
+        self.assertIn("0 @O1@ OBJE\n1 FILE photos/node1/face.png\n2 FORM image/png\n2 TITL Портрет", gedcom)
+        self.assertIn("1 OBJE @O1@", gedcom)
+        self.assertNotIn("lost.png", gedcom)
+        self.assertTrue(gedcom.endswith("0 TRLR\n"))
+
+    def test_gedzip_reads_photo_lists_of_every_storage_backend(self):
+        builder = self.build_tree("1 - Иванов Иван (1980)\n")
+
+        for backend in ("json", "jsonl", "sqlite"):
+            with self.subTest(backend=backend), tempfile.TemporaryDirectory() as temp_dir:
+                data_dir = Path(temp_dir) / "person_data"
+                (data_dir / "photos" / "node1").mkdir(parents=True)
+                (data_dir / "photos" / "node1" / "face.png").write_bytes(b"local-image")
+                photo_lists = open_photo_lists(data_dir, backend)
+                photo_lists.save("node1", [{"filename": "face.png", "caption": "Портрет"}])
+                archive_path = Path(temp_dir) / "family_tree.gdz"
+
+                packaged = Gedcom7Exporter(
+                    builder,
+                    media_source=PersonPhotoSource(data_dir, photo_lists),
+                ).write_gedzip(archive_path)
+
+                self.assertEqual(packaged, ["photos/node1/face.png"])
+
+    def test_gedzip_keeps_photos_of_lists_migrated_to_jsonl(self):
+        builder = self.build_tree("1 - Иванов Иван (1980)\n")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            data_dir = Path(temp_dir) / "person_data"
+            (data_dir / "photos" / "node1").mkdir(parents=True)
+            (data_dir / "photos" / "node1" / "face.png").write_bytes(b"local-image")
+            (data_dir / "photos" / "node1.json").write_text(
+                json.dumps([{"filename": "face.png"}]),
+                encoding="utf-8",
+            )
+            # The site migrates the list on first access and keeps only a backup.
+            open_photo_lists(data_dir, "jsonl").load("node1")
+            self.assertFalse((data_dir / "photos" / "node1.json").exists())
+
+            packaged = Gedcom7Exporter(
+                builder,
+                media_source=PersonPhotoSource(data_dir, open_photo_lists(data_dir, "jsonl")),
+            ).write_gedzip(Path(temp_dir) / "family_tree.gdz")
+
+        self.assertEqual(packaged, ["photos/node1/face.png"])
+
+
 if __name__ == "__main__":
     unittest.main()
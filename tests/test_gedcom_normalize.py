@@ -0,0 +1,72 @@
+import sys
+import unittest
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+TREE_GEN_ROOT = PROJECT_ROOT / "tree_gen"
+sys.path.insert(0, str(TREE_GEN_ROOT))
+
+from gedcom_normalize import (
+    format_date,
+    gedcom_date_to_source_date,
+    gedcom_name_to_display,
+    parse_dates,
+)
+
+
+class GedcomNormalizeTest(unittest.TestCase):
+    def test_source_dates_are_converted_to_gedcom_values(self):
+        cases = {
+            "01.02.1980": "1 FEB 1980",
+            "02.1980": "FEB 1980",
+            "1980": "1980",
+            "около 1900": "ABT 1900",
+            "~1900": "ABT 1900",
+            "до 01.05.1945": "BEF 1 MAY 1945",
+            "после 1990": "AFT 1990",
+            "между 1900 и 1905": "BET 1900 AND 1905",
+            "с 1914 по 1918": "FROM 1914 TO 1918",
+            "неизвестны": "",
+            "когда-то": "",
+            "01.13.1980": "",
+        }
+        for source, expected in cases.items():
+            with self.subTest(source=source):
+                self.assertEqual(format_date(source), expected)
+
+    def test_gedcom_dates_round_trip_to_source_notation(self):
+        for source in [
+            "01.02.1980",
+            "02.1980",
+            "1980",
+            "около 1900",
+            "до 01.05.1945",
+            "после 1990",
+            "между 1900 и 1905",
+            "с 1914 по 1918",
+        ]:
+            with self.subTest(source=source):
+                self.assertEqual(gedcom_date_to_source_date(format_date(source)), source)
+
+    def test_unsupported_gedcom_dates_are_kept_verbatim(self):
+        self.assertEqual(gedcom_date_to_source_date("INT 1900 (war)"), "INT 1900 (war)")
+        self.assertEqual(gedcom_date_to_source_date("@#DGREGORIAN@ 1 FEB 1980"), "01.02.1980")
+
+    def test_parse_dates_splits_birth_and_death(self):
+        self.assertEqual(
+            parse_dates("Иванов Иван (около 1900-до 1950)"),
+            ("ABT 1900", "BEF 1950", ""),
+        )
+        self.assertEqual(
+            parse_dates("Петрова Мария (неизвестны)"),
+            ("", "", "Date text: неизвестны"),
+        )
+
+    def test_gedcom_name_is_displayed_surname_first(self):
+        self.assertEqual(gedcom_name_to_display("Иван Иванович /Иванов/"), "Иванов Иван Иванович")
+        self.assertEqual(gedcom_name_to_display("Single"), "Single")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,6 +9,7 @@ TREE_GEN_ROOT = PROJECT_ROOT / "tree_gen"
 sys.path.insert(0, str(TREE_GEN_ROOT))
 
 from family_tree_builder import FamilyTreeBuilder
+from gedcom_exporter import GedcomExporter
 from gedcom_tree_builder import GedcomTreeBuilder
 
 
@@ -79,6 +80,78 @@ class GedcomTreeBuilderTest(unittest.TestCase):
         self.assertEqual(builder.people[11], "One Child")
         self.assertEqual(builder.single_parent_children, [(10, 11)])
 
+    def test_source_id_wins_over_earlier_xref_digits(self):
+        builder = self.build_tree(
+            "\n".join([
+                "0 HEAD",
+                "0 @I5@ INDI",
+                "1 NAME Xref /Five/",
+                "0 @I7@ INDI",
+                "1 NAME Source /Five/",
+                "1 NOTE Source ID: 5",
+                "0 @I1000@ INDI",
+                "1 NAME Source /Seven/",
+                "1 NOTE Source ID: 7",
+                "0 TRLR",
+            ]) + "\n"
+        )
+
+        self.assertEqual(builder.people[5], "Five Source")
+        self.assertEqual(builder.people[7], "Seven Source")
+        self.assertEqual(builder.people[1000], "Five Xref")
+
+    def test_dangling_xrefs_get_unknown_ids_after_claimed_ones(self):
+        builder = self.build_tree(
+            "\n".join([
+                "0 HEAD",
+                "0 @I1000@ INDI",
+                "1 NAME Parent /One/",
+                "0 @F1@ FAM",
+                "1 HUSB @I1000@",
+                "1 WIFE @MISSING@",
+                "1 CHIL @ALSO_MISSING@",
+                "0 TRLR",
+            ]) + "\n"
+        )
+
+        self.assertEqual(builder.people, {1000: "One Parent", 1001: "?", 1002: "?"})
+        self.assertEqual(builder.marriages, [(1000, 1001, [1002])])
+
+    def test_in_memory_model_matches_written_gedcom(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source_file = Path(temp_dir) / "source.txt"
+            source_file.write_text(
+                "\n".join([
+                    "1 - Иванов Иван (01.02.1980-03.04.2020)",
+                    "2 - Иванова Мария (1982)",
+                    "3 - Иванов Петр (неизвестны)",
+                    "4 - Сидоров Сергей @home (1970)",
+                    "1 -- 2 (3,?)",
+                    "4 -- ?",
+                    "4 -> 3",
+                ]),
+                encoding="utf-8",
+            )
+            source_builder = FamilyTreeBuilder()
+            source_builder.parse_source_file(source_file)
+            exporter = GedcomExporter(source_builder)
+            model = exporter.build_model()
+            gedcom_file = Path(temp_dir) / "tree.ged"
+            exporter.write_file(gedcom_file, model)
+
+            from_file = GedcomTreeBuilder()
+            from_file.parse_gedcom_file(gedcom_file)
+            from_model = GedcomTreeBuilder()
+            from_model.load_gedcom_model(model)
+
+        self.assertEqual(from_model.people, from_file.people)
+        self.assertEqual(from_model.marriages, from_file.marriages)
+        self.assertEqual(from_model.childless_marriages, from_file.childless_marriages)
+        self.assertEqual(
+            from_model.single_parent_children,
+            from_file.single_parent_children,
+        )
+
     def test_svg_node_ids_are_normalized_to_graph_titles(self):
         svg = "\n".join([
             '<svg>',
@@ -1,8 +1,13 @@
 import json
+import os
+import sqlite3
 import sys
 import tempfile
+import threading
 import unittest
+from contextlib import closing
 from pathlib import Path
+from unittest.mock import patch
 
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
@@ -12,7 +17,14 @@ sys.path.insert(0, str(SITE_ROOT))
 from services.message_service import MessageService
 from services.person_service import PersonService
 from services.photo_service import PhotoService
-from storage.json_store import JsonListStore
+from services.relatives_service import RelativesService
+from services.search_service import SearchService
+from services.blog_service import BlogService
+from services.list_items import VersionConflict
+from storage.json_store import JsonListCache, JsonListStore
+from storage.log_store import JsonLogStore
+from storage import sqlite_store
+from storage.sqlite_store import SqliteListStore, close_idle_connections, migrate_json_directories
 
 
 class FakeObjectStorage:
@@ -48,6 +60,363 @@ class JsonListStoreTest(unittest.TestCase):
             with self.assertRaises(ValueError):
                 store.load("../source")
 
+    def test_version_changes_on_every_save(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = JsonListStore(temp_dir)
+
+            missing = store.version("node1")
+            store.save("node1", [{"text": "hello"}])
+            first = store.version("node1")
+            store.save("node1", [{"text": "hello"}])
+
+            self.assertEqual(missing, "0")
+            self.assertNotEqual(first, missing)
+            self.assertNotEqual(store.version("node1"), first)
+
+    def test_concurrent_saves_never_leave_a_partial_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = JsonListStore(temp_dir)
+            payloads = [[{"writer": writer, "text": "x" * 2000}] for writer in range(8)]
+
+            threads = [
+                threading.Thread(target=store.save, args=("node1", payload))
+                for payload in payloads
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertIn(store.load("node1"), payloads)
+            self.assertEqual(list(Path(temp_dir).glob("*.tmp")), [])
+
+
+    def test_concurrent_updates_keep_every_change(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = JsonListStore(temp_dir, cache=JsonListCache())
+
+            def add(writer):
+                for item in range(10):
+                    store.update("node1", lambda records: records + [f"{writer}-{item}"])
+
+            threads = [threading.Thread(target=add, args=(writer,)) for writer in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(len(store.load("node1")), 80)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+    def test_updates_from_forked_workers_are_serialized(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = JsonListStore(temp_dir)
+
+            pid = os.fork()
+            if pid == 0:
+                for item in range(50):
+                    store.update("node1", lambda records: records + [f"child-{item}"])
+                os._exit(0)
+            for item in range(50):
+                store.update("node1", lambda records: records + [f"parent-{item}"])
+            os.waitpid(pid, 0)
+
+            self.assertEqual(len(store.load("node1")), 100)
+
+    def test_failed_update_writes_nothing(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = JsonListStore(temp_dir)
+            store.save("node1", ["kept"])
+
+            def fail(records):
+                records.append("lost")
+                raise IndexError("Запись не найдена")
+
+            with self.assertRaises(IndexError):
+                store.update("node1", fail)
+
+            self.assertEqual(store.load("node1"), ["kept"])
+
+
+class JsonListCacheTest(unittest.TestCase):
+    def test_cached_reads_follow_saves_and_outside_changes(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = JsonListStore(temp_dir, cache=JsonListCache())
+            other_process = JsonListStore(temp_dir)
+
+            store.save("node1", [{"text": "first"}])
+            loaded = store.load("node1")
+            loaded[0]["text"] = "edited by caller"
+            loaded.append({"text": "appended by caller"})
+            self.assertEqual(store.load("node1"), [{"text": "first"}])
+
+            other_process.save("node1", [{"text": "second"}])
+            self.assertEqual(store.load("node1"), [{"text": "second"}])
+            (Path(temp_dir) / "node1.json").unlink()
+            self.assertEqual(store.load("node1"), [])
+
+    def test_hits_skip_the_file_and_lru_is_bounded_by_bytes(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = JsonListCache(max_bytes=300)
+            store = JsonListStore(temp_dir, cache=cache)
+            for person_id in ("node1", "node2", "node3"):
+                JsonListStore(temp_dir).save(person_id, [{"text": "x" * 100}])
+
+            store.load("node1")
+            with patch.object(JsonListStore, "_read", side_effect=AssertionError("disk read")):
+                self.assertEqual(store.load("node1"), [{"text": "x" * 100}])
+            store.load("node2")
+            store.load("node3")
+
+            self.assertLessEqual(cache.size, 300)
+            self.assertEqual(len(cache._entries), 2)
+
+    def test_stale_read_does_not_replace_a_newer_save(self):
+        cache = JsonListCache()
+        writes = cache.writes("node1")
+        cache.put("node1", (2, 1, 1), [{"text": "saved"}], 10)
+        cache.put("node1", (1, 1, 1), [{"text": "stale"}], 10, writes)
+
+        self.assertEqual(cache.get("node1", (2, 1, 1)), [{"text": "saved"}])
+
+
+class JsonLogStoreTest(unittest.TestCase):
+    def log_lines(self, temp_dir, record_id="node1"):
+        text = (Path(temp_dir) / f"{record_id}.jsonl").read_text(encoding="utf-8")
+        return [json.loads(line) for line in text.splitlines()]
+
+    def test_small_changes_are_appended_as_operations(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = JsonLogStore(temp_dir, cache=JsonListCache())
+            reader = JsonLogStore(temp_dir)
+
+            store.save("node1", [{"id": "m1"}])
+            store.save("node1", [{"id": "m1"}, {"id": "m2"}])
+            store.update("node1", lambda records: [{"id": "m0"}] + records)
+            store.update("node1", lambda records: [records[0], records[2]])
+
+            self.assertEqual(self.log_lines(temp_dir), [
+                {"set": [{"id": "m1"}]},
+                {"append": {"id": "m2"}},
+                {"prepend": {"id": "m0"}},
+                {"delete": 1},
+            ])
+            self.assertEqual(store.load("node1"), [{"id": "m0"}, {"id": "m2"}])
+            self.assertEqual(reader.load("node1"), [{"id": "m0"}, {"id": "m2"}])
+
+    def test_rewrites_and_compacts_into_a_single_snapshot(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = JsonLogStore(temp_dir, compact_after=3)
+
+            store.save("node1", ["a", "b"])
+            store.save("node1", ["b", "a"])
+            self.assertEqual(self.log_lines(temp_dir), [{"set": ["b", "a"]}])
+
+            for item in "cde":
+                store.update("node1", lambda records: records + [item])
+            self.assertEqual(len(self.log_lines(temp_dir)), 4)
+
+            store.update("node1", lambda records: records + ["f"])
+            self.assertEqual(self.log_lines(temp_dir), [{"set": ["b", "a", "c", "d", "e", "f"]}])
+            self.assertEqual(store.load("node1"), ["b", "a", "c", "d", "e", "f"])
+
+    def test_cached_reader_follows_appends_from_other_processes(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = JsonLogStore(temp_dir, cache=JsonListCache())
+            other_process = JsonLogStore(temp_dir)
+
+            other_process.save("node1", ["a"])
+            self.assertEqual(store.load("node1"), ["a"])
+            other_process.update("node1", lambda records: records + ["b"])
+            self.assertEqual(store.load("node1"), ["a", "b"])
+            other_process.save("node1", ["z"])
+            self.assertEqual(store.load("node1"), ["z"])
+
+    def test_inserts_and_item_operations_do_not_replay_the_log(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = JsonLogStore(temp_dir)
+            other_process = JsonLogStore(temp_dir)
+            store.save("node1", [{"id": "m1", "version": 5}])
+            with (Path(temp_dir) / "node1.jsonl").open("a", encoding="utf-8") as log:
+                log.write(json.dumps({"append": {"id": "m2", "version": 9}}) + "\n")
+
+            with patch.object(JsonLogStore, "_replay", side_effect=AssertionError("replayed")):
+                added = store.insert(
+                    "node1", lambda latest: {"id": "m3", "version": latest + 1}, at_start=True
+                )
+            other_process.apply("node1", lambda records: {"delete": 1})
+
+            self.assertEqual(added, {"id": "m3", "version": 10})
+            self.assertEqual(self.log_lines(temp_dir)[2:], [
+                {"prepend": {"id": "m3", "version": 10}},
+                {"delete": 1},
+            ])
+            self.assertEqual(store.load("node1"), [
+                {"id": "m3", "version": 10}, {"id": "m2", "version": 9},
+            ])
+
+    def test_half_written_line_is_ignored_and_replaced(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = JsonLogStore(temp_dir)
+            store.save("node1", ["a"])
+            with (Path(temp_dir) / "node1.jsonl").open("a", encoding="utf-8") as log:
+                log.write('{"append": "cut')
+
+            self.assertEqual(store.load("node1"), ["a"])
+            store.update("node1", lambda records: records + ["b"])
+
+            self.assertEqual(self.log_lines(temp_dir), [{"set": ["a"]}, {"append": "b"}])
+
+    def test_migrates_legacy_json_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            JsonListStore(temp_dir).save("node1", [{"text": "old"}])
+            JsonListStore(temp_dir).save("node2", [{"text": "older"}])
+            store = JsonLogStore(temp_dir)
+
+            self.assertEqual(store.load("node1"), [{"text": "old"}])
+            self.assertEqual(store.migrate_all(), 1)
+
+            self.assertEqual(store.load("node2"), [{"text": "older"}])
+            self.assertEqual(sorted(path.name for path in Path(temp_dir).glob("*.json*[dl]")), [
+                "node1.json.migrated", "node1.jsonl", "node2.json.migrated", "node2.jsonl",
+            ])
+
+    def test_blog_service_works_on_the_log_backend(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            service = BlogService(temp_dir, backend="jsonl")
+
+            first = service.add_post("node1", {"text": "first"})
+            service.add_post("node1", {"text": "second"})
+            service.delete_post("node1", first["id"])
+
+            self.assertEqual([post["text"] for post in service.get_posts("node1")], ["second"])
+            self.assertEqual(len(self.log_lines(temp_dir)), 3)
+
+
+class SqliteListStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(close_idle_connections)
+
+    def rows(self, data_dir, record_id="node1"):
+        with closing(sqlite3.connect(Path(data_dir) / "person_data.sqlite3")) as connection:
+            return connection.execute(
+                "SELECT id, position, created FROM items WHERE record_id = ? ORDER BY position",
+                (record_id,),
+            ).fetchall()
+
+    def test_small_changes_touch_single_rows(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = SqliteListStore(Path(temp_dir) / "messages", cache=JsonListCache())
+
+            store.save("node1", [{"text": "a", "timestamp": 1}])
+            versions = [int(store.version("node1"))]
+            store.update("node1", lambda records: records + [{"text": "b", "timestamp": 2}])
+            versions.append(int(store.version("node1")))
+            first_ids = [row[0] for row in self.rows(temp_dir)]
+            store.update("node1", lambda records: [{"text": "z", "date": "2024-01-01"}] + records)
+            versions.append(int(store.version("node1")))
+            store.update("node1", lambda records: records[:2])
+            versions.append(int(store.version("node1")))
+            # A database created again must not repeat versions old ETags carry.
+            recreated = SqliteListStore(Path(temp_dir) / "recreated" / "messages")
+            recreated.save("node1", [{"text": "a", "timestamp": 1}])
+
+            self.assertEqual(store.load("node1"), [
+                {"text": "z", "date": "2024-01-01"}, {"text": "a", "timestamp": 1},
+            ])
+            self.assertEqual(self.rows(temp_dir), [
+                (first_ids[1] + 1, -1, "2024-01-01"), (first_ids[0], 0, 1),
+            ])
+            self.assertEqual(versions, sorted(set(versions)))
+            self.assertGreater(int(recreated.version("node1")), versions[-1])
+            self.assertEqual(store.version("node2"), "0")
+
+    def test_collections_share_one_database_and_rewrite_on_reorder(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            blog = SqliteListStore(Path(temp_dir) / "blog")
+            photos = SqliteListStore(Path(temp_dir) / "photos")
+
+            blog.save("node1", ["post"])
+            photos.save("node1", ["a", "b", "c"])
+            photos.save("node1", ["c", "a", "b"])
+
+            self.assertEqual(blog.load("node1"), ["post"])
+            self.assertEqual(photos.load("node1"), ["c", "a", "b"])
+            self.assertEqual([path.name for path in Path(temp_dir).glob("*.sqlite3")], [
+                "person_data.sqlite3",
+            ])
+
+    def test_cached_readers_notice_writes_of_other_workers(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            reader = SqliteListStore(Path(temp_dir) / "blog", cache=JsonListCache())
+            writer = SqliteListStore(Path(temp_dir) / "blog", cache=JsonListCache())
+
+            writer.save("node1", ["a"])
+            self.assertEqual(reader.load("node1"), ["a"])
+            writer.update("node1", lambda records: records + ["b"])
+            self.assertEqual(reader.load("node1"), ["a", "b"])
+
+    def test_concurrent_and_failed_updates(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = SqliteListStore(Path(temp_dir) / "messages", cache=JsonListCache())
+
+            def add(writer):
+                for item in range(10):
+                    store.update("node1", lambda records: records + [f"{writer}-{item}"])
+
+            threads = [threading.Thread(target=add, args=(writer,)) for writer in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            def fail(records):
+                records.append("lost")
+                raise IndexError("Запись не найдена")
+
+            with self.assertRaises(IndexError):
+                store.update("node1", fail)
+
+            self.assertEqual(len(store.load("node1")), 80)
+            self.assertEqual(len(self.rows(temp_dir)), 80)
+
+    def test_migrates_json_directories_once(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            JsonListStore(Path(temp_dir) / "blog").save("node1", [{"text": "post"}])
+            JsonLogStore(Path(temp_dir) / "messages").save("node1", [{"text": "hi"}])
+            JsonListStore(Path(temp_dir) / "messages").save("node2", [{"text": "old"}])
+
+            self.assertEqual(migrate_json_directories(temp_dir), {
+                "photos": 0, "blog": 1, "messages": 2,
+            })
+            self.assertEqual(migrate_json_directories(temp_dir), {
+                "photos": 0, "blog": 0, "messages": 0,
+            })
+
+            service = BlogService(Path(temp_dir) / "blog", backend="sqlite")
+            service.add_post("node1", {"text": "new"})
+            self.assertEqual([post["text"] for post in service.get_posts("node1")], ["new", "post"])
+            messages = SqliteListStore(Path(temp_dir) / "messages")
+            self.assertEqual(messages.load("node1"), [{"text": "hi"}])
+            self.assertTrue((Path(temp_dir) / "messages" / "node2.json").exists())
+
+
+    def test_threads_share_pooled_connections(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = SqliteListStore(Path(temp_dir) / "messages")
+            store.save("node1", [{"text": "a"}])
+            loaded = []
+
+            for _ in range(5):
+                thread = threading.Thread(target=lambda: loaded.append(store.load("node1")))
+                thread.start()
+                thread.join()
+
+            self.assertEqual(loaded, [[{"text": "a"}]] * 5)
+            self.assertEqual(len(sqlite_store._idle[(os.getpid(), store.database)]), 1)
+            close_idle_connections(store.database)
+            self.assertNotIn((os.getpid(), store.database), sqlite_store._idle)
+
 
 class PersonServiceTest(unittest.TestCase):
     def test_reads_person_by_node_id_from_source_file(self):
@@ -71,6 +440,227 @@ class PersonServiceTest(unittest.TestCase):
                 },
             )
 
+    def test_reloads_index_when_source_file_is_replaced(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source_file = Path(temp_dir) / "source.txt"
+            source_file.write_text("12 - Иванов Иван (1901-1980)\n", encoding="utf-8")
+            service = PersonService(source_file=source_file)
+            self.assertEqual(service.get_person_info("node12")["name"], "Иванов Иван")
+
+            replacement = Path(temp_dir) / "source.new"
+            replacement.write_text(
+                "12 - Иванов Иван Петрович (1901-1980)\n"
+                "120 - Сидоров Петр (1930)\n",
+                encoding="utf-8",
+            )
+            replacement.replace(source_file)
+
+            self.assertEqual(service.get_person_info("12")["name"], "Иванов Иван Петрович")
+            self.assertEqual(service.get_person_info("node120")["dates"], "1930")
+            self.assertEqual(service.get_person_info("node13")["name"], "Персона node13")
+
+
+class RelativesServiceTest(unittest.TestCase):
+    SOURCE = (
+        "1 - Иванов Петр (1870-1940)\n"
+        "2 - Иванова Анна (1875-1950)\n"
+        "3 - Иванов Иван (1901-1980)\n"
+        "4 - Иванова Мария (1903-1990)\n"
+        "5 - Смирнова Ольга (1905-1985)\n"
+        "6 - Иванов Сергей (1930-2000)\n"
+        "7 - Смирнов Олег (1900-1970)\n"
+        "1 -- 2 (3, 4)\n"
+        "3 -- 5 (6)\n"
+        "4 -- 7\n"
+    )
+
+    def make_service(self, temp_dir):
+        source_file = Path(temp_dir) / "source.txt"
+        source_file.write_text(self.SOURCE, encoding="utf-8")
+        return RelativesService(PersonService(source_file=source_file)), source_file
+
+    def test_returns_immediate_family_with_relation_lists(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            service, _ = self.make_service(temp_dir)
+
+            relatives = service.get_relatives("node3")
+            people = {person["id"]: person for person in relatives["people"]}
+
+            self.assertEqual(relatives["people"][0]["id"], "node3")
+            self.assertEqual(set(people), {"node1", "node2", "node3", "node4", "node5", "node6"})
+            self.assertEqual(people["node3"]["parents"], ["node1", "node2"])
+            self.assertEqual(people["node3"]["spouses"], ["node5"])
+            self.assertEqual(people["node3"]["children"], ["node6"])
+            self.assertEqual(people["node3"]["siblings"], ["node4"])
+            self.assertEqual(people["node6"]["name"], "Иванов Сергей")
+            self.assertEqual(people["node6"]["distance"], 1)
+            self.assertIsNone(service.get_relatives("node99"))
+
+    def test_depth_reaches_in_laws_and_follows_source_changes(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            service, source_file = self.make_service(temp_dir)
+
+            relatives = service.get_relatives("node6", depth=2)
+            distances = {person["id"]: person["distance"] for person in relatives["people"]}
+            self.assertEqual(distances, {"node6": 0, "node3": 1, "node5": 1, "node1": 2, "node2": 2, "node4": 2})
+
+            replacement = Path(temp_dir) / "source.new"
+            replacement.write_text(self.SOURCE + "8 - Иванов Глеб (1960)\n6 -> 8\n", encoding="utf-8")
+            replacement.replace(source_file)
+            relatives = service.get_relatives("node6")
+
+            self.assertEqual(relatives["people"][0]["children"], ["node8"])
+
+
+class SearchServiceTest(unittest.TestCase):
+    def make_service(self, temp_dir, source):
+        source_file = Path(temp_dir) / "source.txt"
+        source_file.write_text(source, encoding="utf-8")
+        return SearchService(PersonService(source_file=source_file)), source_file
+
+    def names(self, results):
+        return [person["name"] for person in results["results"]]
+
+    def test_matches_folded_words_prefixes_and_typos(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            service, _ = self.make_service(
+                temp_dir,
+                "1 - Семёнов Пётр Ильич (1870-1940)\n"
+                "2 - Иванова Анна Петровна (1875)\n"
+                "3 - Иванов Иван (1901-1980)\n",
+            )
+
+            self.assertEqual(self.names(service.search("семенов петр")), ["Семёнов Пётр Ильич"])
+            self.assertEqual(self.names(service.search("ИЛЬИЧ")), ["Семёнов Пётр Ильич"])
+            self.assertEqual(self.names(service.search("Иванов")), ["Иванов Иван", "Иванова Анна Петровна"])
+            self.assertEqual(self.names(service.search("петро")), ["Иванова Анна Петровна"])
+            self.assertEqual(self.names(service.search("Смёнов")), ["Семёнов Пётр Ильич"])
+            self.assertEqual(self.names(service.search("1875")), ["Иванова Анна Петровна"])
+            self.assertEqual(service.search("Сидоров")["total"], 0)
+
+    def test_paginates_and_reindexes_changed_people(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            service, source_file = self.make_service(
+                temp_dir,
+                "".join(f"{index} - Петров Номер{index} (1900)\n" for index in range(1, 6)),
+            )
+
+            page = service.search("петров", limit=2, offset=2)
+            self.assertEqual(page["total"], 5)
+            self.assertEqual(self.names(page), ["Петров Номер3", "Петров Номер4"])
+
+            replacement = Path(temp_dir) / "source.new"
+            replacement.write_text(
+                "1 - Петров Номер1 (1900)\n2 - Сидоров Номер2 (1900)\n",
+                encoding="utf-8",
+            )
+            replacement.replace(source_file)
+
+            self.assertEqual(self.names(service.search("петров")), ["Петров Номер1"])
+            self.assertEqual(self.names(service.search("сидоров")), ["Сидоров Номер2"])
+            self.assertEqual(set(service.index.documents), {"1", "2"})
+
+
+class ItemListServiceTest(unittest.TestCase):
+    BACKENDS = ("json", "jsonl", "sqlite")
+
+    def test_pages_follow_cursors_from_the_newest_item(self):
+        for backend in self.BACKENDS:
+            with self.subTest(backend=backend), tempfile.TemporaryDirectory() as temp_dir:
+                messages = MessageService(Path(temp_dir) / "messages", backend=backend)
+                photos = PhotoService(Path(temp_dir) / "photos", backend=backend)
+                # Списки, записанные до появления ID.
+                messages.store.save("node1", [{"text": f"m{index}"} for index in range(5)])
+                photos.store.save("node1", [{"filename": f"p{index}"} for index in range(5)])
+                stored_version = messages.version("node1")
+
+                first = messages.get_page("node1", limit=2)
+                second = messages.get_page("node1", limit=2, before=first["next"])
+                last = messages.get_page("node1", limit=2, before=second["next"])
+                newest_photos = photos.get_page("node1", limit=3)
+                older_photos = photos.get_page("node1", limit=3, before=newest_photos["next"])
+
+                self.assertEqual([item["text"] for item in first["items"]], ["m0", "m1"])
+                self.assertEqual([item["text"] for item in second["items"]], ["m2", "m3"])
+                self.assertEqual(([item["text"] for item in last["items"]], last["next"]), (["m4"], None))
+                self.assertEqual([item["filename"] for item in newest_photos["items"]], ["p2", "p3", "p4"])
+                self.assertEqual([item["filename"] for item in older_photos["items"]], ["p0", "p1"])
+                self.assertIsNone(older_photos["next"])
+                # Каждое чтение дает те же ID, а список при чтении не переписывается.
+                self.assertEqual(
+                    [item["id"] for item in messages.get_messages("node1")[:2]],
+                    [item["id"] for item in first["items"]],
+                )
+                self.assertEqual(messages.version("node1"), stored_version)
+                self.assertEqual(messages.get_changes("node1", 0)["ids"][2], second["items"][0]["id"])
+                with self.assertRaises(KeyError):
+                    messages.get_page("node1", limit=2, before="missing")
+
+                # Первая запись сохраняет ID, выданные при чтении.
+                edited = messages.update_message("node1", first["items"][1]["id"], {"text": "m1!"}, 0)
+                self.assertEqual(
+                    [item.get("id") for item in messages.store.load("node1")],
+                    [item["id"] for item in first["items"] + second["items"] + last["items"]],
+                )
+                self.assertEqual(messages.get_page("node1", limit=2)["items"][1], edited)
+
+    def test_item_changes_check_versions_and_write_one_line(self):
+        for backend in self.BACKENDS:
+            with self.subTest(backend=backend), tempfile.TemporaryDirectory() as temp_dir:
+                service = MessageService(
+                    Path(temp_dir) / "messages", cache=JsonListCache(), backend=backend
+                )
+                reader = MessageService(Path(temp_dir) / "messages", backend=backend)
+                older = service.add_message("node1", {"text": "a"})
+                self.assertEqual(service.get_messages("node1"), [older])
+                newer_cached = service.add_message("node1", {"text": "c"})
+                self.assertEqual(service.get_messages("node1"), [newer_cached, older])
+                service.delete_message("node1", newer_cached["id"])
+                newer = service.add_message("node1", {"text": "b", "id": "forged"})
+
+                edited = service.update_message(
+                    "node1", older["id"], {"text": "a!", "version": 1}, older["version"]
+                )
+                with self.assertRaises(VersionConflict) as conflict:
+                    service.update_message("node1", older["id"], {"text": "lost"}, older["version"])
+                with self.assertRaises(VersionConflict):
+                    service.delete_message("node1", newer["id"], newer["version"] - 1)
+                with self.assertRaises(KeyError):
+                    service.delete_message("node1", "missing")
+                service.delete_message("node1", newer["id"], newer["version"])
+
+                self.assertNotEqual(newer["id"], "forged")
+                self.assertGreater(edited["version"], newer["version"])
+                self.assertEqual(conflict.exception.current, edited)
+                self.assertEqual(service.get_messages("node1"), [edited])
+                self.assertEqual(reader.get_messages("node1"), [edited])
+                if backend == "jsonl":
+                    log = (Path(temp_dir) / "messages" / "node1.jsonl").read_text(encoding="utf-8")
+                    self.assertEqual(
+                        [sorted(json.loads(line)) for line in log.splitlines()],
+                        [["set"], ["prepend"], ["delete"], ["prepend"], ["replace"], ["delete"]],
+                    )
+
+    def test_changes_return_only_new_and_edited_items(self):
+        for backend in self.BACKENDS:
+            with self.subTest(backend=backend), tempfile.TemporaryDirectory() as temp_dir:
+                service = MessageService(Path(temp_dir) / "messages", backend=backend)
+                service.save_messages("node1", [{"text": "a"}, {"text": "b"}, {"text": "c"}])
+                page = service.get_page("node1", limit=10)
+                known = page["items"]
+
+                edited = [dict(known[0], text="a!"), known[2], {"text": "d"}]
+                service.save_messages("node1", edited)
+                changes = service.get_changes("node1", page["version"])
+                unchanged = service.get_changes("node1", changes["version"])
+
+                self.assertEqual([item["text"] for item in changes["items"]], ["a!", "d"])
+                self.assertEqual(changes["ids"][:2], [known[0]["id"], known[2]["id"]])
+                self.assertEqual(changes["items"][0]["id"], known[0]["id"])
+                self.assertEqual(len(changes["ids"]), 3)
+                self.assertEqual(unchanged["items"], [])
+                self.assertEqual(unchanged["version"], changes["version"])
+
 
 class MessageServiceTest(unittest.TestCase):
     def test_saves_and_loads_messages_as_json_list(self):
@@ -80,7 +670,8 @@ class MessageServiceTest(unittest.TestCase):
 
             service.save_messages("node7", messages)
 
-            self.assertEqual(service.get_messages("node7"), messages)
+            saved = service.get_messages("node7")
+            self.assertEqual(saved, [{"id": "m1", "text": "memo", "version": saved[0]["version"]}])
 
     def test_rejects_non_list_messages(self):
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -148,7 +739,9 @@ class PhotoServiceTest(unittest.TestCase):
                 encoding="utf-8",
             )
 
-            service.delete_photo("node9", 0)
+            # Элементы старого списка без ID получают их при чтении.
+            photo_id = service.get_photos("node9")[0]["id"]
+            service.delete_photo("node9", photo_id)
 
             self.assertEqual(object_storage.deleted_keys, ["photos/node9/face.png"])
             self.assertEqual(service.get_photos("node9"), [])
@@ -1,5 +1,16 @@
+import asyncio
+import dataclasses
+import gzip
+import http.client
+import http.server
+import json
+import os
+import signal
+import socket
+import socketserver
 import sys
 import tempfile
+import threading
 import unittest
 import urllib.error
 import urllib.request
@@ -11,20 +22,37 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 SITE_ROOT = PROJECT_ROOT / "site"
 sys.path.insert(0, str(SITE_ROOT))
 
-from api.routes import parse_api_path
+from api.routes import Request, Router, parse_api_path, request_for
+from async_server import AsyncFamilyTreeServer, StreamWriterFile
 from auth.yandex_id import AuthConfig, YandexIDAuth
 from config.settings import load_settings
 from handlers.http_handler import PersonalDataHandler
+from server import FamilyTreeTCPServer, PooledFamilyTreeTCPServer
+from utils import compression
+from utils.compression import SUPPORTED_ENCODINGS, CompressedAssetCache, negotiate_encoding
 from utils.file_utils import serve_file
+from utils.http_range import RangeNotSatisfiable, parse_range
+from utils.limits import ConcurrencyLimiter, ServerMetrics
+from utils.rate_limit import RateLimiter
 from utils.response_utils import setup_cors_headers
+from utils.shared_rate_limit import SharedRateLimiter
 
 
 class FakeReadableObjectStorage:
     def __init__(self, objects):
         self.objects = objects
 
-    def get_object(self, key):
-        return self.objects.get(key)
+    def get_object(self, key, byte_range=None):
+        stored_object = self.objects.get(key)
+        if stored_object is None or byte_range is None:
+            return stored_object
+        data = stored_object["data"]
+        start, end = parse_range(byte_range, len(data))
+        return {
+            **stored_object,
+            "data": data[start:end + 1],
+            "content_range": f"bytes {start}-{end}/{len(data)}",
+        }
 
 
 class SettingsTest(unittest.TestCase):
@@ -244,6 +272,84 @@ class RateLimiterTest(unittest.TestCase):
         self.assertFalse(limiter.allow("ip", now=102))
         self.assertTrue(limiter.allow("ip", now=161))
 
+    def test_per_call_limit_overrides_default(self):
+        limiter = RateLimiter(limit=100, window_seconds=60)
+
+        self.assertTrue(limiter.allow("upload:ip", now=100, limit=1))
+        self.assertFalse(limiter.allow("upload:ip", now=101, limit=1))
+        self.assertTrue(limiter.allow("ip", now=101))
+
+    def test_idle_keys_are_evicted_to_bound_memory(self):
+        limiter = RateLimiter(limit=5, window_seconds=60, stripes=2, max_keys=8)
+
+        for client in range(100):
+            limiter.allow(f"scanner-{client}", now=100)
+        limiter.allow("late", now=400)
+
+        self.assertLessEqual(len(limiter), 8)
+
+    def test_full_stripe_drops_the_least_recently_used_key(self):
+        limiter = RateLimiter(limit=2, window_seconds=60, stripes=1, max_keys=2)
+
+        limiter.allow("busy", now=100)
+        limiter.allow("quiet", now=101)
+        limiter.allow("busy", now=102)
+        limiter.allow("new", now=103)
+
+        self.assertEqual(len(limiter), 2)
+        self.assertFalse(limiter.allow("busy", now=104))
+        self.assertTrue(limiter.allow("quiet", now=104))
+
+    def test_counts_are_exact_under_concurrent_threads(self):
+        limiter = RateLimiter(limit=1000, window_seconds=60)
+        allowed = []
+
+        def hammer():
+            allowed.append(sum(limiter.allow("ip", now=100) for _ in range(300)))
+
+        threads = [threading.Thread(target=hammer) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sum(allowed), 1000)
+
+    def test_upload_route_has_its_own_limit_per_login(self):
+        class FakeHandler:
+            command = "POST"
+            path = "/api/person/node7/photos"
+            client_address = ("127.0.0.1", 12345)
+            settings = dataclasses.replace(load_settings(SITE_ROOT), login_rate_limit=100)
+            rate_limiter = RateLimiter(limit=100, window_seconds=60)
+            route_rate_limits = {"upload": 1}
+            metrics = ServerMetrics()
+            _check_client_rate_limits = PersonalDataHandler._check_client_rate_limits
+            _allow_request = PersonalDataHandler._allow_request
+            _client_ip = PersonalDataHandler._client_ip
+            _route_class = PersonalDataHandler._route_class
+            _path_parts = PersonalDataHandler._path_parts
+
+            def __init__(self):
+                self.responses = []
+
+            def send_response(self, code):
+                self.responses.append(code)
+
+            def send_header(self, name, value):
+                pass
+
+            def end_headers(self):
+                pass
+
+        first, second = FakeHandler(), FakeHandler()
+        for handler in (first, second):
+            request_for(handler).login = "alice"
+
+        self.assertTrue(first._check_client_rate_limits())
+        self.assertFalse(second._check_client_rate_limits())
+        self.assertEqual(second.responses, [429])
+
 
 class ApiRoutesTest(unittest.TestCase):
     def test_parse_api_path_ignores_query_string(self):
@@ -258,6 +364,44 @@ class ApiRoutesTest(unittest.TestCase):
             ["api", "person", "node 7", "messages"],
         )
 
+    def make_router(self):
+        router = Router()
+        router.add("GET", "/api/person/{person_id}", "person")
+        router.add("PATCH", "/api/person/{person_id}/photos/reorder", "reorder")
+        router.add("DELETE", "/api/person/{person_id}/photos/{item_id}", "delete")
+        return router
+
+    def test_router_matches_parameters_from_one_parsed_request(self):
+        request = Request("GET", "/api/person/node%207?tab=photos")
+
+        match = self.make_router().match("GET", request.parts)
+
+        self.assertEqual(match.endpoint, "person")
+        self.assertEqual(match.params, {"person_id": "node 7"})
+        self.assertEqual(request.query_value("tab"), "photos")
+
+    def test_router_prefers_static_segments_but_falls_back_to_parameters(self):
+        router = self.make_router()
+
+        reorder = router.match("PATCH", ("api", "person", "node7", "photos", "reorder"))
+        delete = router.match("DELETE", ("api", "person", "node7", "photos", "reorder"))
+
+        self.assertEqual(reorder.endpoint, "reorder")
+        self.assertEqual(delete.endpoint, "delete")
+        self.assertEqual(delete.params, {"person_id": "node7", "item_id": "reorder"})
+
+    def test_router_reports_allowed_methods_and_unknown_paths(self):
+        router = self.make_router()
+
+        wrong_method = router.match("POST", ("api", "person", "node7"))
+
+        self.assertIsNone(wrong_method.endpoint)
+        self.assertEqual(wrong_method.allowed_methods, ("GET", "HEAD"))
+        self.assertEqual(router.match("HEAD", ("api", "person", "node7")).endpoint, "person")
+        self.assertIsNone(router.match("GET", ("api", "people")))
+        with self.assertRaises(ValueError):
+            router.add("GET", "/api/person/{id}/blog", "conflict")
+
 
 class ResponseHeadersTest(unittest.TestCase):
     def test_same_origin_responses_do_not_allow_all_origins(self):
@@ -464,81 +608,143 @@ class AuthGuardTest(unittest.TestCase):
         self.assertEqual(handler.responses, [403])
 
 
-class FileServingTest(unittest.TestCase):
-    def test_person_data_serves_from_configured_data_dir(self):
-        with tempfile.TemporaryDirectory() as temp_dir:
-            data_dir = Path(temp_dir) / "private_data"
-            photo_dir = data_dir / "photos" / "node1"
-            photo_dir.mkdir(parents=True)
-            (photo_dir / "face.png").write_bytes(b"image")
+class FakeFileHandler:
+    def __init__(self, request_headers=None):
+        self.headers = dict(request_headers or {})
+        self.responses = []
+        self.sent_headers = []
+        self.body = bytearray()
 
-            class FakeHandler:
-                def __init__(self):
-                    self.responses = []
-                    self.headers = []
-                    self.body = bytearray()
+        class Writer:
+            def __init__(self, outer):
+                self.outer = outer
 
-                    class Writer:
-                        def __init__(self, outer):
-                            self.outer = outer
+            def write(self, data):
+                self.outer.body.extend(data)
 
-                        def write(self, data):
-                            self.outer.body.extend(data)
+        self.wfile = Writer(self)
 
-                    self.wfile = Writer(self)
+    def send_response(self, code):
+        self.responses.append(code)
 
-                def send_response(self, code):
-                    self.responses.append(code)
+    def send_header(self, name, value):
+        self.sent_headers.append((name, value))
 
-                def send_header(self, name, value):
-                    self.headers.append((name, value))
+    def end_headers(self):
+        pass
 
-                def end_headers(self):
-                    pass
+    def send_error(self, code, message=None):
+        self.responses.append(code)
 
-                def send_error(self, code, message=None):
-                    self.responses.append(code)
+    def header(self, name):
+        return dict(self.sent_headers).get(name)
 
-            handler = FakeHandler()
+
+class FileServingTest(unittest.TestCase):
+    def test_person_data_serves_from_configured_data_dir(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            data_dir = Path(temp_dir) / "private_data"
+            photo_dir = data_dir / "photos" / "node1"
+            photo_dir.mkdir(parents=True)
+            (photo_dir / "face.png").write_bytes(b"image")
+
+            handler = FakeFileHandler()
 
             serve_file(handler, "/person_data/photos/node1/face.png", data_dir=data_dir)
 
             self.assertEqual(handler.responses, [200])
             self.assertEqual(bytes(handler.body), b"image")
 
-    def test_person_data_serves_photos_from_object_storage(self):
-        class FakeHandler:
-            def __init__(self):
-                self.responses = []
-                self.headers = []
-                self.body = bytearray()
-
-                class Writer:
-                    def __init__(self, outer):
-                        self.outer = outer
-
-                    def write(self, data):
-                        self.outer.body.extend(data)
+    def test_person_data_does_not_serve_the_sqlite_database(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            data_dir = Path(temp_dir)
+            (data_dir / "person_data.sqlite3").write_bytes(b"SQLite format 3")
+            (data_dir / "person_data.sqlite3-wal").write_bytes(b"wal")
 
-                self.wfile = Writer(self)
+            for name in ("person_data.sqlite3", "person_data.sqlite3-wal"):
+                handler = FakeFileHandler()
+                serve_file(handler, f"/person_data/{name}", data_dir=data_dir)
+                self.assertEqual(handler.responses, [403])
 
-            def send_response(self, code):
-                self.responses.append(code)
+    def test_person_data_answers_304_for_matching_etag(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            data_dir = Path(temp_dir)
+            photo_dir = data_dir / "photos" / "node1"
+            photo_dir.mkdir(parents=True)
+            (photo_dir / "face.png").write_bytes(b"image")
+            path = "/person_data/photos/node1/face.png"
+
+            first = FakeFileHandler()
+            serve_file(first, path, data_dir=data_dir)
+            etag = first.header("ETag")
+            repeat = FakeFileHandler({"If-None-Match": f"W/{etag}"})
+            serve_file(repeat, path, data_dir=data_dir)
+            since = FakeFileHandler({"If-Modified-Since": first.header("Last-Modified")})
+            serve_file(since, path, data_dir=data_dir)
+            (photo_dir / "face.png").write_bytes(b"other image")
+            changed = FakeFileHandler({"If-None-Match": etag})
+            serve_file(changed, path, data_dir=data_dir)
+
+            self.assertEqual(repeat.responses, [304])
+            self.assertEqual(bytes(repeat.body), b"")
+            self.assertEqual(since.responses, [304])
+            self.assertEqual(changed.responses, [200])
+            self.assertNotEqual(changed.header("ETag"), etag)
 
-            def send_header(self, name, value):
-                self.headers.append((name, value))
+    def test_person_data_serves_photos_from_object_storage(self):
+        handler = FakeFileHandler()
+        object_storage = FakeReadableObjectStorage({
+            "photos/node1/face.png": {
+                "data": b"image-from-s3",
+                "content_type": "image/png",
+            }
+        })
 
-            def end_headers(self):
-                pass
+        serve_file(
+            handler,
+            "/person_data/photos/node1/face.png",
+            data_dir=Path("/does/not/exist"),
+            object_storage=object_storage,
+        )
 
-            def send_error(self, code, message=None):
-                self.responses.append(code)
+        self.assertEqual(handler.responses, [200])
+        self.assertIn(("Content-Type", "image/png"), handler.sent_headers)
+        self.assertEqual(bytes(handler.body), b"image-from-s3")
 
-        handler = FakeHandler()
+    def test_person_data_answers_byte_ranges(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            data_dir = Path(temp_dir)
+            photo_dir = data_dir / "photos" / "node1"
+            photo_dir.mkdir(parents=True)
+            (photo_dir / "face.png").write_bytes(b"0123456789")
+            path = "/person_data/photos/node1/face.png"
+
+            partial = FakeFileHandler({"Range": "bytes=2-5"})
+            serve_file(partial, path, data_dir=data_dir)
+            suffix = FakeFileHandler({"Range": "bytes=-3"})
+            serve_file(suffix, path, data_dir=data_dir)
+            beyond = FakeFileHandler({"Range": "bytes=10-"})
+            serve_file(beyond, path, data_dir=data_dir)
+            stale = FakeFileHandler({"Range": "bytes=2-5", "If-Range": '"old"'})
+            serve_file(stale, path, data_dir=data_dir)
+
+            self.assertEqual(partial.responses, [206])
+            self.assertEqual(bytes(partial.body), b"2345")
+            self.assertEqual(partial.header("Content-Range"), "bytes 2-5/10")
+            self.assertEqual(partial.header("Content-Length"), "4")
+            self.assertEqual(bytes(suffix.body), b"789")
+            self.assertEqual(beyond.responses, [416])
+            self.assertEqual(beyond.header("Content-Range"), "bytes */10")
+            self.assertEqual(stale.responses, [200])
+            self.assertEqual(bytes(stale.body), b"0123456789")
+
+    def test_object_storage_ranges_are_passed_through(self):
+        handler = FakeFileHandler({"Range": "bytes=6-"})
         object_storage = FakeReadableObjectStorage({
             "photos/node1/face.png": {
                 "data": b"image-from-s3",
                 "content_type": "image/png",
+                "etag": '"s3"',
             }
         })
 
@@ -549,9 +755,26 @@ class FileServingTest(unittest.TestCase):
             object_storage=object_storage,
         )
 
-        self.assertEqual(handler.responses, [200])
-        self.assertIn(("Content-Type", "image/png"), handler.headers)
-        self.assertEqual(bytes(handler.body), b"image-from-s3")
+        self.assertEqual(handler.responses, [206])
+        self.assertEqual(handler.header("Content-Range"), "bytes 6-12/13")
+        self.assertEqual(bytes(handler.body), b"from-s3")
+
+
+class ByteRangeTest(unittest.TestCase):
+    def test_parse_range_handles_open_suffix_and_clamped_ranges(self):
+        self.assertEqual(parse_range("bytes=0-0", 10), (0, 0))
+        self.assertEqual(parse_range("bytes=4-", 10), (4, 9))
+        self.assertEqual(parse_range("bytes=-4", 10), (6, 9))
+        self.assertEqual(parse_range("bytes=-40", 10), (0, 9))
+        self.assertEqual(parse_range("bytes=8-100", 10), (8, 9))
+
+    def test_parse_range_ignores_invalid_and_rejects_unsatisfiable(self):
+        self.assertIsNone(parse_range("bytes=-", 10))
+        self.assertIsNone(parse_range("bytes=5-2", 10))
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range("bytes=10-", 10)
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range("bytes=-0", 10)
 
 
 class CachePolicyTest(unittest.TestCase):
@@ -574,5 +797,773 @@ class CachePolicyTest(unittest.TestCase):
         )
 
 
+class OverloadProtectionTest(unittest.TestCase):
+    def test_concurrency_limiter_refuses_without_blocking_and_counts(self):
+        metrics = ServerMetrics()
+        limiter = ConcurrencyLimiter({"upload": 1, "read": 2}, metrics)
+
+        self.assertTrue(limiter.try_acquire("upload"))
+        self.assertFalse(limiter.try_acquire("upload"))
+        self.assertTrue(limiter.try_acquire("read"))
+        limiter.release("upload")
+        self.assertTrue(limiter.try_acquire("upload"))
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["counters"]["rejected.upload"], 1)
+        self.assertEqual(snapshot["gauges"]["in_flight.upload"], 1)
+        self.assertEqual(snapshot["gauges"]["in_flight.read"], 1)
+
+    def test_handler_answers_503_when_route_class_is_saturated(self):
+        class FakeHandler:
+            command = "POST"
+            path = "/api/person/node7/photos"
+            settings = dataclasses.replace(load_settings(SITE_ROOT), retry_after_seconds=7)
+            concurrency = ConcurrencyLimiter({"upload": 0})
+            _route_class = PersonalDataHandler._route_class
+            _path_parts = PersonalDataHandler._path_parts
+            _send_overloaded = PersonalDataHandler._send_overloaded
+
+            def __init__(self):
+                self.responses = []
+                self.sent_headers = []
+                self.called = False
+
+            def send_response(self, code):
+                self.responses.append(code)
+
+            def send_header(self, name, value):
+                self.sent_headers.append((name, value))
+
+            def end_headers(self):
+                pass
+
+        handler = FakeHandler()
+        PersonalDataHandler.do_POST(handler)
+
+        self.assertEqual(handler.responses, [503])
+        self.assertIn(("Retry-After", "7"), handler.sent_headers)
+        self.assertTrue(handler.close_connection)
+
+    def test_pooled_server_rejects_connections_beyond_the_accept_queue(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        class BlockingHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                started.set()
+                release.wait(5)
+                self.request.sendall(b"done")
+
+        metrics = ServerMetrics()
+        server = PooledFamilyTreeTCPServer(
+            ("127.0.0.1", 0),
+            BlockingHandler,
+            worker_threads=1,
+            queue_size=1,
+            retry_after_seconds=3,
+            metrics=metrics,
+        )
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        address = server.server_address
+        clients = []
+        try:
+            clients.append(socket.create_connection(address, timeout=5))
+            self.assertTrue(started.wait(5))
+            clients.append(socket.create_connection(address, timeout=5))
+            rejected = socket.create_connection(address, timeout=5)
+            clients.append(rejected)
+
+            response = rejected.recv(1024).decode("ascii")
+            self.assertTrue(response.startswith("HTTP/1.1 503"))
+            self.assertIn("Retry-After: 3", response)
+            self.assertEqual(metrics.snapshot()["counters"]["rejected.accept_queue"], 1)
+        finally:
+            release.set()
+            server.shutdown()
+            server.server_close()
+            for client in clients:
+                client.close()
+            thread.join(5)
+
+
+class AsyncServerTest(unittest.TestCase):
+    def start_server(self, temp_dir, handler_base=PersonalDataHandler):
+        class Handler(handler_base):
+            pass
+
+        with patch.dict("os.environ", {}, clear=True):
+            settings = load_settings(SITE_ROOT)
+        Handler.configure(dataclasses.replace(
+            settings,
+            data_dir=Path(temp_dir) / "person_data",
+            source_file=Path(temp_dir) / "source.txt",
+        ))
+        (Path(temp_dir) / "source.txt").write_text(
+            "7 - Иванов Иван (1901-1980)\n",
+            encoding="utf-8",
+        )
+
+        loop = asyncio.new_event_loop()
+        server = AsyncFamilyTreeServer(Handler, "127.0.0.1", 0, worker_threads=2)
+        port = loop.run_until_complete(server.start())
+        thread = threading.Thread(
+            target=loop.run_until_complete,
+            args=(server.serve_forever(),),
+            daemon=True,
+        )
+        thread.start()
+
+        def stop():
+            loop.call_soon_threadsafe(server.request_shutdown)
+            thread.join(timeout=5)
+            loop.close()
+
+        self.addCleanup(stop)
+        return f"http://127.0.0.1:{port}"
+
+    def test_serves_api_requests_through_personal_data_handler(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            base_url = self.start_server(temp_dir)
+
+            with urllib.request.urlopen(f"{base_url}/api/health", timeout=5) as response:
+                self.assertEqual(json.loads(response.read()), {"status": "ok"})
+            with urllib.request.urlopen(f"{base_url}/api/person/node7", timeout=5) as response:
+                self.assertEqual(json.loads(response.read())["name"], "Иванов Иван")
+
+    def test_handlers_go_through_setup_and_finish(self):
+        calls = []
+
+        class RecordingHandler(PersonalDataHandler):
+            def setup(self):
+                super().setup()
+                calls.append(("setup", self.connection is self.request))
+
+            def finish(self):
+                calls.append(("finish", self.requests_handled))
+                super().finish()
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            base_url = self.start_server(temp_dir, RecordingHandler)
+            connection = http.client.HTTPConnection(base_url.removeprefix("http://"), timeout=5)
+            try:
+                for _ in range(2):
+                    connection.request("GET", "/api/health")
+                    response = connection.getresponse()
+                    response.read()
+                    self.assertFalse(response.will_close)
+            finally:
+                connection.close()
+
+        self.assertEqual(
+            calls,
+            [("setup", True), ("finish", 1), ("setup", True), ("finish", 2)],
+        )
+
+    def test_accepts_request_bodies_and_reports_missing_routes(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            base_url = self.start_server(temp_dir)
+            request = urllib.request.Request(
+                f"{base_url}/api/person/node7/messages",
+                data=json.dumps([{"id": "m1", "text": "привет"}]).encode("utf-8"),
+                headers={"Content-Type": "application/json"},
+                method="PUT",
+            )
+
+            with urllib.request.urlopen(request, timeout=5) as response:
+                self.assertEqual(json.loads(response.read()), {"success": True})
+            with self.assertRaises(urllib.error.HTTPError) as missing:
+                urllib.request.urlopen(f"{base_url}/api/unknown", timeout=5)
+            self.assertEqual(missing.exception.code, 404)
+
+    def test_known_path_with_unsupported_method_answers_405(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            base_url = self.start_server(temp_dir)
+            request = urllib.request.Request(
+                f"{base_url}/api/person/node7/blog",
+                data=b"[]",
+                method="PUT",
+            )
+
+            with self.assertRaises(urllib.error.HTTPError) as not_allowed:
+                urllib.request.urlopen(request, timeout=5)
+            self.assertEqual(not_allowed.exception.code, 405)
+            self.assertEqual(not_allowed.exception.headers["Allow"], "GET, HEAD, POST")
+
+    def test_sends_person_files_and_ranges_through_the_loop(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            base_url = self.start_server(temp_dir)
+            photo = Path(temp_dir) / "person_data" / "photos" / "node7" / "face.jpg"
+            photo.parent.mkdir(parents=True)
+            content = os.urandom(3 * 1024 * 1024 + 17)
+            photo.write_bytes(content)
+            url = f"{base_url}/person_data/photos/node7/face.jpg"
+
+            with urllib.request.urlopen(url, timeout=5) as response:
+                body = response.read()
+            ranged = urllib.request.Request(url, headers={"Range": "bytes=100-199"})
+            with urllib.request.urlopen(ranged, timeout=5) as response:
+                part = response.read()
+                status = response.status
+
+            self.assertEqual(body, content)
+            self.assertEqual(status, 206)
+            self.assertEqual(part, content[100:200])
+
+    def test_write_to_client_that_stops_reading_times_out(self):
+        class StalledTransport:
+            aborted = False
+
+            def abort(self):
+                StalledTransport.aborted = True
+
+        class StalledWriter:
+            transport = StalledTransport()
+
+            def write(self, data):
+                pass
+
+            async def drain(self):
+                await asyncio.Event().wait()
+
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        try:
+            wfile = StreamWriterFile(StalledWriter(), loop, timeout=0.1)
+            with self.assertRaises(ConnectionError):
+                wfile.write(b"response")
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(5)
+            loop.close()
+        self.assertTrue(StalledTransport.aborted)
+
+
+class ThreadedServerTestCase(unittest.TestCase):
+    def start_server(self, temp_dir, server_factory=FamilyTreeTCPServer, **overrides):
+        class Handler(PersonalDataHandler):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, directory=str(SITE_ROOT), **kwargs)
+
+        with patch.dict("os.environ", {}, clear=True):
+            settings = load_settings(SITE_ROOT)
+        Handler.configure(dataclasses.replace(
+            settings,
+            data_dir=Path(temp_dir) / "person_data",
+            source_file=Path(temp_dir) / "source.txt",
+            **overrides,
+        ))
+        (Path(temp_dir) / "source.txt").write_text(
+            "7 - Иванов Иван (1901-1980)\n",
+            encoding="utf-8",
+        )
+        Handler.log_message = lambda *args: None
+
+        server = server_factory(("127.0.0.1", 0), Handler)
+        self.server = server
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        def stop():
+            server.shutdown()
+            server.server_close()
+            thread.join(5)
+
+        self.addCleanup(stop)
+        connection = http.client.HTTPConnection(*server.server_address, timeout=5)
+        self.addCleanup(connection.close)
+        return connection
+
+    def request(self, connection, method, path, body=None):
+        connection.request(method, path, body=body)
+        response = connection.getresponse()
+        return response, response.read()
+
+
+class KeepAliveTest(ThreadedServerTestCase):
+    def test_serves_several_requests_on_one_connection(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            connection = self.start_server(temp_dir)
+
+            response, body = self.request(connection, "GET", "/api/health")
+            first_socket = connection.sock
+            self.assertEqual(response.version, 11)
+            self.assertEqual(json.loads(body), {"status": "ok"})
+
+            response, body = self.request(connection, "GET", "/api/person/node7")
+            self.assertEqual(json.loads(body)["name"], "Иванов Иван")
+            response, body = self.request(connection, "OPTIONS", "/api/health")
+            self.assertEqual((response.status, body), (200, b""))
+            self.assertIs(connection.sock, first_socket)
+
+    def test_unread_request_body_does_not_break_the_next_request(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            connection = self.start_server(temp_dir)
+
+            response, _ = self.request(
+                connection, "PUT", "/api/person/node7/blog", body=b'{"text": "x"}'
+            )
+            self.assertEqual(response.status, 405)
+            first_socket = connection.sock
+
+            response, body = self.request(connection, "GET", "/api/health")
+            self.assertEqual(json.loads(body), {"status": "ok"})
+            self.assertIs(connection.sock, first_socket)
+
+    def test_api_reads_revalidate_with_etag(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            connection = self.start_server(temp_dir)
+            path = "/api/person/node7/messages"
+
+            first, _ = self.request(connection, "GET", path)
+            etag = first.getheader("ETag")
+            connection.request("GET", path, headers={"If-None-Match": etag})
+            repeat = connection.getresponse()
+            repeat_body = repeat.read()
+            self.request(connection, "PUT", path, body=b'[{"id": "m1"}]')
+            connection.request("GET", path, headers={"If-None-Match": etag})
+            changed = connection.getresponse()
+            changed_body = changed.read()
+
+            self.assertEqual(first.getheader("Cache-Control"), "private, no-cache")
+            self.assertEqual((repeat.status, repeat_body), (304, b""))
+            self.assertEqual(changed.status, 200)
+            self.assertEqual([message["id"] for message in json.loads(changed_body)], ["m1"])
+            self.assertNotEqual(changed.getheader("ETag"), etag)
+
+    def test_static_files_answer_304_for_matching_etag(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            connection = self.start_server(temp_dir)
+
+            first, body = self.request(connection, "GET", "/assets/css/main.css")
+            connection.request(
+                "GET",
+                "/assets/css/main.css",
+                headers={"If-None-Match": first.getheader("ETag")},
+            )
+            repeat = connection.getresponse()
+
+            self.assertTrue(body)
+            self.assertEqual(repeat.status, 304)
+            self.assertEqual(repeat.read(), b"")
+            self.assertEqual(repeat.getheader("ETag"), first.getheader("ETag"))
+
+    def test_person_data_files_are_sent_through_the_socket_intact(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            connection = self.start_server(temp_dir)
+            photo = Path(temp_dir) / "person_data" / "photos" / "node7" / "face.jpg"
+            photo.parent.mkdir(parents=True)
+            photo.write_bytes(os.urandom(300 * 1024))
+
+            response, body = self.request(
+                connection, "GET", "/person_data/photos/node7/face.jpg"
+            )
+            health, _ = self.request(connection, "GET", "/api/health")
+
+            self.assertEqual(response.status, 200)
+            self.assertEqual(body, photo.read_bytes())
+            self.assertEqual(health.status, 200)
+
+    def test_static_files_answer_byte_ranges_uncompressed(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            connection = self.start_server(temp_dir)
+            full = (SITE_ROOT / "assets" / "css" / "main.css").read_bytes()
+
+            connection.request(
+                "GET",
+                "/assets/css/main.css",
+                headers={"Range": "bytes=10-19", "Accept-Encoding": "gzip"},
+            )
+            response = connection.getresponse()
+            body = response.read()
+
+            self.assertEqual(response.status, 206)
+            self.assertIsNone(response.getheader("Content-Encoding"))
+            self.assertEqual(response.getheader("Content-Range"), f"bytes 10-19/{len(full)}")
+            self.assertEqual(body, full[10:20])
+
+    def test_head_range_does_not_leak_into_next_request(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            connection = self.start_server(temp_dir)
+            full = (SITE_ROOT / "assets" / "js" / "utils.js").read_bytes()
+
+            connection.request("HEAD", "/assets/js/utils.js", headers={"Range": "bytes=0-9"})
+            head = connection.getresponse()
+            head.read()
+            response, body = self.request(connection, "GET", "/assets/js/utils.js")
+
+            self.assertEqual(head.status, 206)
+            self.assertEqual(response.status, 200)
+            self.assertEqual(body, full)
+
+    def test_head_on_api_route_answers_like_get_without_body(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            connection = self.start_server(temp_dir)
+
+            get, body = self.request(connection, "GET", "/api/person/node7")
+            head, head_body = self.request(connection, "HEAD", "/api/person/node7")
+            after, after_body = self.request(connection, "GET", "/api/health")
+
+            self.assertEqual(head.status, 200)
+            self.assertEqual(head_body, b"")
+            self.assertEqual(head.getheader("Content-Length"), str(len(body)))
+            self.assertEqual(head.getheader("ETag"), get.getheader("ETag"))
+            self.assertEqual(json.loads(after_body), {"status": "ok"})
+
+    def test_closes_connection_after_max_requests(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            connection = self.start_server(temp_dir, keepalive_max_requests=2)
+
+            first, _ = self.request(connection, "GET", "/api/health")
+            second, _ = self.request(connection, "GET", "/api/health")
+
+            self.assertIsNone(first.getheader("Connection"))
+            self.assertEqual(second.getheader("Connection"), "close")
+
+    def test_idle_connections_do_not_starve_the_worker_pool(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            metrics = ServerMetrics()
+            connection = self.start_server(
+                temp_dir,
+                server_factory=lambda address, handler: PooledFamilyTreeTCPServer(
+                    address, handler, worker_threads=2, metrics=metrics
+                ),
+            )
+            second = http.client.HTTPConnection(*self.server.server_address, timeout=5)
+            self.addCleanup(second.close)
+            for client in (connection, second):
+                response, _ = self.request(client, "GET", "/api/health")
+                self.assertEqual(response.getheader("Connection"), None)
+
+            fresh = http.client.HTTPConnection(*self.server.server_address, timeout=3)
+            self.addCleanup(fresh.close)
+            response, body = self.request(fresh, "GET", "/api/health")
+
+            self.assertEqual(json.loads(body), {"status": "ok"})
+            self.assertEqual(metrics.snapshot()["counters"]["closed.idle_keepalive"], 1)
+
+
+class PersonApiTest(ThreadedServerTestCase):
+    def test_batch_lookup_returns_people_in_request_order(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            connection = self.start_server(temp_dir)
+
+            response, body = self.request(
+                connection, "GET", "/api/people?ids=node7,node8,node7"
+            )
+            people = json.loads(body)["people"]
+            too_many = ",".join(f"node{index}" for index in range(201))
+            rejected, _ = self.request(connection, "GET", f"/api/people?ids={too_many}")
+            missing, _ = self.request(connection, "GET", "/api/people")
+
+            self.assertEqual(response.status, 200)
+            self.assertTrue(response.getheader("ETag"))
+            self.assertEqual([person["id"] for person in people], ["node7", "node8"])
+            self.assertEqual(people[0]["name"], "Иванов Иван")
+            self.assertEqual(people[1]["name"], "Персона node8")
+            self.assertEqual(rejected.status, 400)
+            self.assertEqual(missing.status, 400)
+
+
+    def test_relatives_depth_is_validated(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            connection = self.start_server(temp_dir)
+
+            too_deep, _ = self.request(connection, "GET", "/api/person/node7/relatives?depth=9")
+            not_a_number, _ = self.request(connection, "GET", "/api/person/node7/relatives?depth=x")
+
+            self.assertEqual(too_deep.status, 400)
+            self.assertEqual(not_a_number.status, 400)
+
+
+    def test_search_endpoint_returns_ranked_page(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            connection = self.start_server(temp_dir)
+
+            response, body = self.request(connection, "GET", "/api/search?q=%D0%B8%D0%B2%D0%B0%D0%BD")
+            empty, _ = self.request(connection, "GET", "/api/search?q=")
+            bad_page, _ = self.request(connection, "GET", "/api/search?q=x&limit=1000")
+
+            results = json.loads(body)
+            self.assertEqual(response.status, 200)
+            self.assertEqual(results["total"], 1)
+            self.assertEqual(results["results"][0]["id"], "node7")
+            self.assertEqual(empty.status, 400)
+            self.assertEqual(bad_page.status, 400)
+
+    def test_messages_are_paged_and_delivered_as_changes(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            connection = self.start_server(temp_dir)
+            path = "/api/person/node7/messages"
+            messages = [{"text": f"m{index}"} for index in range(5)]
+            self.request(connection, "PUT", path, body=json.dumps(messages).encode("utf-8"))
+
+            _, body = self.request(connection, "GET", f"{path}?limit=2")
+            page = json.loads(body)
+            _, body = self.request(connection, "GET", f"{path}?limit=2&before={page['next']}")
+            older = json.loads(body)
+            _, body = self.request(connection, "GET", f"{path}?since={page['version']}")
+            changes = json.loads(body)
+            bad_limit, _ = self.request(connection, "GET", f"{path}?limit=0")
+            bad_since, _ = self.request(connection, "GET", f"{path}?since=x")
+            bad_cursor, _ = self.request(connection, "GET", f"{path}?before=missing")
+
+            self.assertEqual([item["text"] for item in page["items"]], ["m0", "m1"])
+            self.assertEqual([item["text"] for item in older["items"]], ["m2", "m3"])
+            self.assertEqual(changes["items"], [])
+            self.assertEqual(len(changes["ids"]), 5)
+            self.assertEqual(
+                (bad_limit.status, bad_since.status, bad_cursor.status), (400, 400, 400)
+            )
+
+    def test_single_items_are_added_edited_and_deleted_by_id(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            connection = self.start_server(temp_dir)
+            path = "/api/person/node7/messages"
+
+            _, body = self.request(connection, "POST", path, body=b'{"text": "a"}')
+            message = json.loads(body)["message"]
+            item_path = f"{path}/{message['id']}"
+            edit = json.dumps({"text": "a!", "version": message["version"]}).encode("utf-8")
+            edited, body = self.request(connection, "PATCH", item_path, body=edit)
+            edited_message = json.loads(body)["message"]
+            stale, body = self.request(connection, "PATCH", item_path, body=edit)
+            conflict = json.loads(body)
+            unversioned, _ = self.request(connection, "PATCH", item_path, body=b'{"text": "b"}')
+            stale_delete, _ = self.request(
+                connection, "DELETE", f"{item_path}?version={message['version']}"
+            )
+            deleted, _ = self.request(
+                connection, "DELETE", f"{item_path}?version={edited_message['version']}"
+            )
+            missing, _ = self.request(connection, "DELETE", item_path)
+            _, body = self.request(connection, "GET", path)
+
+            self.assertEqual(edited.status, 200)
+            self.assertEqual(edited_message["text"], "a!")
+            self.assertEqual(stale.status, 409)
+            self.assertEqual(conflict["message"], edited_message)
+            self.assertEqual(unversioned.status, 400)
+            self.assertEqual(stale_delete.status, 409)
+            self.assertEqual(deleted.status, 200)
+            self.assertEqual(missing.status, 404)
+            self.assertEqual(json.loads(body), [])
+
+    def test_blog_posts_are_deleted_by_id(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            connection = self.start_server(temp_dir)
+            path = "/api/person/node7/blog"
+
+            _, body = self.request(connection, "POST", path, body=b'{"text": "first"}')
+            first = json.loads(body)["post"]
+            self.request(connection, "POST", path, body=b'{"text": "second"}')
+            not_an_object, _ = self.request(connection, "POST", path, body=b'["text"]')
+            deleted, _ = self.request(connection, "DELETE", f"{path}/{first['id']}")
+            by_index, _ = self.request(connection, "DELETE", f"{path}/0")
+            _, body = self.request(connection, "GET", path)
+
+            self.assertEqual(not_an_object.status, 400)
+            self.assertEqual(deleted.status, 200)
+            self.assertEqual(by_index.status, 404)
+            self.assertEqual([post["text"] for post in json.loads(body)], ["second"])
+
+
+class CompressionTest(ThreadedServerTestCase):
+    def test_negotiates_best_supported_encoding(self):
+        self.assertEqual(negotiate_encoding("gzip, deflate"), "gzip")
+        self.assertEqual(negotiate_encoding("gzip;q=0, identity"), None)
+        self.assertEqual(negotiate_encoding(""), None)
+        self.assertEqual(negotiate_encoding("*"), SUPPORTED_ENCODINGS[0])
+
+    def test_every_supported_encoding_round_trips(self):
+        decompressors = {
+            "gzip": gzip.decompress,
+            "br": lambda data: compression.brotli.decompress(data),
+            "zstd": lambda data: (
+                compression.zstd.decompress(data)
+                if compression.zstd is not None
+                else compression.zstandard.ZstdDecompressor().decompress(data)
+            ),
+        }
+        original = "hello world ".encode("utf-8") * 200
+        for name in SUPPORTED_ENCODINGS:
+            for static in (False, True):
+                with self.subTest(encoding=name, static=static):
+                    data = compression.compress(original, name, static=static)
+                    self.assertLess(len(data), len(original))
+                    self.assertEqual(decompressors[name](data), original)
+
+    def test_asset_cache_is_bounded_by_bytes(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = CompressedAssetCache(max_bytes=200)
+            for index in range(5):
+                path = Path(temp_dir) / f"{index}.css"
+                path.write_bytes(os.urandom(100))
+                cache.get(path, path.stat(), "gzip")
+
+            self.assertLessEqual(cache.size, 200)
+
+    def test_static_assets_are_served_compressed_and_revalidated(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            connection = self.start_server(temp_dir)
+            path = "/assets/css/main.css"
+            original = (SITE_ROOT / "assets" / "css" / "main.css").read_bytes()
+
+            connection.request("GET", path, headers={"Accept-Encoding": "gzip"})
+            response = connection.getresponse()
+            body = response.read()
+            connection.request("GET", path, headers={
+                "Accept-Encoding": "gzip",
+                "If-None-Match": response.getheader("ETag"),
+            })
+            repeat = connection.getresponse()
+            repeat.read()
+
+            self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+            self.assertEqual(response.getheader("Vary"), "Accept-Encoding")
+            self.assertTrue(response.getheader("ETag").endswith('-gzip"'))
+            self.assertEqual(gzip.decompress(body), original)
+            self.assertLess(len(body), len(original))
+            self.assertEqual(repeat.status, 304)
+            self.assertEqual(repeat.getheader("ETag"), response.getheader("ETag"))
+            self.assertEqual(repeat.getheader("Vary"), "Accept-Encoding")
+
+    def test_error_response_drops_headers_staged_for_success(self):
+        def file_vanished(handler):
+            handler.send_error(404, "File not found")
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            connection = self.start_server(temp_dir)
+            with patch.object(http.server.SimpleHTTPRequestHandler, "send_head", file_vanished):
+                missing, _ = self.request(connection, "GET", "/assets/css/main.css")
+            health, _ = self.request(connection, "GET", "/api/health")
+
+            self.assertEqual(missing.status, 404)
+            self.assertIsNone(missing.getheader("ETag"))
+            self.assertIsNone(missing.getheader("Vary"))
+            self.assertIsNone(missing.getheader("Accept-Ranges"))
+            self.assertEqual(health.status, 200)
+            self.assertIsNone(health.getheader("ETag"))
+
+    def test_revalidated_compressed_json_keeps_the_variant_etag(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            connection = self.start_server(temp_dir)
+            messages = [{"id": f"m{index}", "text": "привет"} for index in range(100)]
+            self.request(
+                connection,
+                "PUT",
+                "/api/person/node7/messages",
+                body=json.dumps(messages).encode("utf-8"),
+            )
+            path = "/api/person/node7/messages"
+
+            connection.request("GET", path, headers={"Accept-Encoding": "gzip"})
+            response = connection.getresponse()
+            response.read()
+            connection.request("GET", path, headers={
+                "Accept-Encoding": "gzip",
+                "If-None-Match": response.getheader("ETag"),
+            })
+            repeat = connection.getresponse()
+            repeat.read()
+            connection.request("GET", path, headers={
+                "If-None-Match": response.getheader("ETag")[:-len('-gzip"')] + '"',
+            })
+            identity = connection.getresponse()
+            identity.read()
+
+            self.assertTrue(response.getheader("ETag").endswith('-gzip"'))
+            self.assertEqual(repeat.status, 304)
+            self.assertEqual(repeat.getheader("ETag"), response.getheader("ETag"))
+            self.assertEqual(repeat.getheader("Vary"), "Accept-Encoding")
+            self.assertEqual(identity.status, 304)
+            self.assertFalse(identity.getheader("ETag").endswith('-gzip"'))
+
+    def test_large_json_is_compressed_and_small_json_is_not(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            connection = self.start_server(temp_dir)
+            messages = [{"id": f"m{index}", "text": "привет"} for index in range(100)]
+            self.request(
+                connection,
+                "PUT",
+                "/api/person/node7/messages",
+                body=json.dumps(messages).encode("utf-8"),
+            )
+
+            connection.request(
+                "GET", "/api/person/node7/messages", headers={"Accept-Encoding": "gzip"}
+            )
+            large = connection.getresponse()
+            large_body = large.read()
+            connection.request("GET", "/api/health", headers={"Accept-Encoding": "gzip"})
+            small = connection.getresponse()
+            small_body = small.read()
+
+            self.assertEqual(large.getheader("Content-Encoding"), "gzip")
+            self.assertEqual(
+                [message["text"] for message in json.loads(gzip.decompress(large_body))],
+                [message["text"] for message in messages],
+            )
+            self.assertIsNone(small.getheader("Content-Encoding"))
+            self.assertEqual(json.loads(small_body), {"status": "ok"})
+
+
+class SharedRateLimiterTest(unittest.TestCase):
+    def test_blocks_requests_over_limit_and_recovers_after_window(self):
+        limiter = SharedRateLimiter(limit=2, window_seconds=60, slots=16)
+
+        self.assertTrue(limiter.allow("client", now=120))
+        self.assertTrue(limiter.allow("client", now=121))
+        self.assertFalse(limiter.allow("client", now=122))
+        self.assertTrue(limiter.allow("other", now=122))
+        self.assertTrue(limiter.allow("client", now=300))
+
+    def test_previous_window_still_counts_towards_the_limit(self):
+        limiter = SharedRateLimiter(limit=2, window_seconds=60, slots=16)
+        limiter.allow("client", now=110)
+        limiter.allow("client", now=115)
+
+        self.assertTrue(limiter.allow("client", now=125))
+        self.assertFalse(limiter.allow("client", now=126))
+        self.assertTrue(limiter.allow("client", now=170))
+
+    def test_reuses_slots_when_table_is_full(self):
+        limiter = SharedRateLimiter(limit=1, window_seconds=60, slots=4)
+
+        for client in range(20):
+            self.assertTrue(limiter.allow(f"client-{client}", now=120))
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+    def test_counts_are_shared_with_forked_workers(self):
+        limiter = SharedRateLimiter(limit=3, window_seconds=60, slots=16)
+
+        pid = os.fork()
+        if pid == 0:
+            limiter.allow("client", now=120)
+            limiter.allow("client", now=120)
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+        self.assertTrue(limiter.allow("client", now=120))
+        self.assertFalse(limiter.allow("client", now=120))
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+    def test_worker_killed_while_holding_the_lock_does_not_block_others(self):
+        limiter = SharedRateLimiter(limit=3, window_seconds=60, slots=16)
+
+        pid = os.fork()
+        if pid == 0:
+            with limiter._locked():
+                os.kill(os.getpid(), signal.SIGKILL)
+        os.waitpid(pid, 0)
+        allowed = []
+        thread = threading.Thread(target=lambda: allowed.append(limiter.allow("client")))
+        thread.start()
+        thread.join(5)
+
+        self.assertEqual(allowed, [True])
+
+
 if __name__ == "__main__":
     unittest.main()
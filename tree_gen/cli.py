@@ -1,10 +1,45 @@
+import argparse
 import os
+from concurrent.futures import ThreadPoolExecutor
 from family_tree_builder import FamilyTreeBuilder
 from gedcom_exporter import GedcomExporter
 from gedcom_tree_builder import GedcomTreeBuilder
 
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Построение генеалогического дерева из source.txt",
+    )
+    parser.add_argument(
+        "--verify-gedcom",
+        action="store_true",
+        help="Перечитать записанный family_tree.ged и сверить его с моделью рендера",
+    )
+    return parser.parse_args(argv)
+
+
+def verify_gedcom_round_trip(gedcom_path, tree_builder):
+    """Сравнивает модель, прочитанную из GEDCOM-файла, с моделью рендера."""
+    file_builder = GedcomTreeBuilder()
+    file_builder.parse_gedcom_file(gedcom_path)
+    fields = [
+        "people",
+        "marriages",
+        "single_parent_children",
+        "childless_marriages",
+        "unknown_children_marriages",
+        "mixed_children_marriages",
+    ]
+    return [
+        field
+        for field in fields
+        if getattr(file_builder, field) != getattr(tree_builder, field)
+    ]
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
     print("Программа построения генеалогического дерева")
     print("=" * 45)
 
@@ -31,22 +66,39 @@ def main():
         png_output_path = os.path.join(source_dir, 'family_tree')
 
         gedcom_output_path = os.path.join(source_dir, 'family_tree.ged')
-        GedcomExporter(tree_builder).write_file(gedcom_output_path)
+        exporter = GedcomExporter(tree_builder)
+        gedcom_model = exporter.build_model()
 
+        # Рендер берет GEDCOM-модель из памяти, а файл пишется параллельно
         gedcom_tree_builder = GedcomTreeBuilder()
-        gedcom_tree_builder.parse_gedcom_file(gedcom_output_path)
-
-        # Создаем PNG файл в корневой директории из GEDCOM-модели
-        gedcom_tree_builder.create_family_tree(png_output_path)
-
-        # Создаем SVG файл в папке site
-        site_dir = os.path.join(source_dir, 'site')
-        if not os.path.exists(site_dir):
-            os.makedirs(site_dir)
-        svg_output_path = os.path.join(site_dir, 'family_tree_vector')
-
-        # Создаем отдельно SVG файл в папке site
-        gedcom_tree_builder.create_svg_only(svg_output_path)
+        gedcom_tree_builder.load_gedcom_model(gedcom_model)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            gedcom_written = executor.submit(
+                exporter.write_file, gedcom_output_path, gedcom_model)
+
+            # Создаем PNG файл в корневой директории из GEDCOM-модели
+            gedcom_tree_builder.create_family_tree(png_output_path)
+
+            # Создаем SVG файл в папке site
+            site_dir = os.path.join(source_dir, 'site')
+            if not os.path.exists(site_dir):
+                os.makedirs(site_dir)
+            svg_output_path = os.path.join(site_dir, 'family_tree_vector')
+
+            # Создаем отдельно SVG файл в папке site
+            gedcom_tree_builder.create_svg_only(svg_output_path)
+
+            gedcom_written.result()
+
+        if args.verify_gedcom:
+            mismatches = verify_gedcom_round_trip(
+                gedcom_output_path, gedcom_tree_builder)
+            if mismatches:
+                print("❌ GEDCOM-файл расходится с моделью рендера: "
+                      + ", ".join(mismatches))
+            else:
+                print("✅ GEDCOM-файл совпадает с моделью рендера")
 
         # Удаляем временные DOT файлы
         dot_file = png_output_path  # Graphviz создает файл без расширения
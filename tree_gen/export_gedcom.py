@@ -2,15 +2,48 @@
 """Export family_tree source.txt to GEDCOM."""
 
 import argparse
+import os
+import sys
 from pathlib import Path
 
 from family_tree_builder import FamilyTreeBuilder
+from gedcom7_exporter import Gedcom7Exporter, PersonPhotoSource
 from gedcom_exporter import GedcomExporter
+from gedcom_incremental import IncrementalGedcomWriter
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+
+def use_site_modules():
+    site_root = str(PROJECT_ROOT / "site")
+    if site_root not in sys.path:
+        sys.path.insert(0, site_root)
+
+
+def load_object_storage():
+    """Reuse the site's S3 settings so GEDZIP sees the same photos as the site."""
+    if not os.environ.get("FAMILY_TREE_S3_BUCKET", "").strip():
+        return None
+
+    use_site_modules()
+    from config.settings import load_object_storage_config
+    from storage.object_storage import S3ObjectStorage
+
+    return S3ObjectStorage.from_config(load_object_storage_config())
+
+
+def open_photo_lists(data_dir, storage_backend):
+    """The site's photo list store, so GEDZIP sees the lists of any backend."""
+    use_site_modules()
+    from storage.backends import open_list_store
+
+    return open_list_store(storage_backend, Path(data_dir) / "photos")
 
 
 def main():
     parser = argparse.ArgumentParser(
-        description="Export family tree source data to GEDCOM 5.5.1",
+        description="Export family tree source data to GEDCOM 5.5.1, 7.0 or GEDZIP",
     )
     parser.add_argument(
         "source",
@@ -24,6 +57,28 @@ def main():
         default="family_tree.ged",
         help="Output GEDCOM file path",
     )
+    parser.add_argument(
+        "--format",
+        choices=["5.5.1", "7.0", "gedzip"],
+        default="5.5.1",
+        help="GEDCOM version; gedzip packages GEDCOM 7.0 with person photos",
+    )
+    parser.add_argument(
+        "--data-dir",
+        default=os.environ.get("FAMILY_TREE_DATA_DIR", "person_data"),
+        help="person_data directory with photo lists (used by gedzip)",
+    )
+    parser.add_argument(
+        "--storage-backend",
+        choices=["json", "jsonl", "sqlite"],
+        default=os.environ.get("FAMILY_TREE_STORAGE_BACKEND", "json").strip().lower() or "json",
+        help="site storage backend of the photo lists (used by gedzip)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Rewrite only changed records, keeping a manifest next to the output",
+    )
     args = parser.parse_args()
 
     source_path = Path(args.source)
@@ -38,7 +93,21 @@ def main():
             + "\n".join(f"- {issue}" for issue in issues)
         )
 
-    GedcomExporter(builder).write_file(output_path)
+    if args.format == "gedzip":
+        media_source = PersonPhotoSource(
+            args.data_dir,
+            open_photo_lists(args.data_dir, args.storage_backend),
+            object_storage=load_object_storage(),
+        )
+        media_keys = Gedcom7Exporter(builder, media_source=media_source).write_gedzip(output_path)
+        print(f"GEDZIP saved to {output_path} ({len(media_keys)} photos)")
+        return
+    exporter = Gedcom7Exporter(builder) if args.format == "7.0" else GedcomExporter(builder)
+    if args.incremental:
+        report = IncrementalGedcomWriter(exporter).write_file(output_path)
+        print(f"GEDCOM saved to {output_path}: {report.summary()}")
+        return
+    exporter.write_file(output_path)
     print(f"GEDCOM saved to {output_path}")
 
 
@@ -0,0 +1,179 @@
+"""GEDCOM 7.0 export and GEDZIP packaging with person photos."""
+
+import mimetypes
+import shutil
+import zipfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from urllib.parse import quote
+
+from gedcom_exporter import GedcomExporter
+
+
+GEDZIP_GEDCOM_NAME = "gedcom.ged"
+MEDIA_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class MediaRecord:
+    xref: str
+    storage_key: str
+    media_type: str
+    title: str = ""
+
+    @property
+    def file_path(self):
+        return quote(self.storage_key)
+
+
+class PersonPhotoSource:
+    """Read photo lists and photo bytes the same way the site serves them.
+
+    Photo lists come from ``photo_lists``, the site's list store for
+    ``<data_dir>/photos`` (see ``open_photo_lists`` in ``export_gedcom``), so
+    the ``jsonl`` and ``sqlite`` backends export the same photos as ``json``.
+    Bytes come from object storage when it is configured and fall back to the
+    local ``<data_dir>/photos/node<ID>/`` directory, mirroring ``serve_file``.
+    """
+
+    def __init__(self, data_dir, photo_lists, object_storage=None):
+        self.data_dir = Path(data_dir)
+        self.photo_lists = photo_lists
+        self.object_storage = object_storage
+
+    def photos_for(self, person_id):
+        return self.photo_lists.load(f"node{person_id}")
+
+    @contextmanager
+    def open(self, storage_key):
+        if self.object_storage:
+            stored_object = self.object_storage.open_object(storage_key)
+            if stored_object:
+                body = stored_object["body"]
+                try:
+                    yield body
+                finally:
+                    body.close()
+                return
+
+        local_path = self.data_dir / storage_key
+        if not local_path.is_file():
+            raise FileNotFoundError(storage_key)
+        with local_path.open("rb") as source:
+            yield source
+
+
+class Gedcom7Exporter(GedcomExporter):
+    """Write GEDCOM 7.0 text and optionally package it as GEDZIP.
+
+    Person photos become ``OBJE`` records whose ``FILE`` paths match the
+    archive layout (``photos/node<ID>/<filename>``), so the ``.gdz`` file is
+    self-contained.  Photos are copied into the archive in fixed-size chunks
+    and are never held in memory as a whole.
+    """
+
+    def __init__(self, builder, media_source=None):
+        super().__init__(builder)
+        self.media_source = media_source
+
+    def build_model(self):
+        model = super().build_model()
+        if self.media_source:
+            model.media = self._build_media(model)
+        return model
+
+    def write_gedzip(self, output_path, model=None):
+        model = model or self.build_model()
+        output_path = Path(output_path)
+
+        with zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            written = self._write_media(archive, model.media)
+            self._drop_missing_media(model, written)
+
+            with archive.open(GEDZIP_GEDCOM_NAME, "w", force_zip64=True) as target:
+                for chunk in self.iter_chunks(model):
+                    target.write(chunk.encode("utf-8"))
+
+        return [media.storage_key for media in model.media]
+
+    def _build_media(self, model):
+        media = []
+        for individual in model.sorted_individuals():
+            if not individual.source_id.isdigit():
+                continue
+            for photo in self.media_source.photos_for(individual.source_id):
+                filename = Path(str(photo.get("filename", ""))).name
+                if not filename:
+                    continue
+                storage_key = f"photos/node{individual.source_id}/{filename}"
+                record = MediaRecord(
+                    xref=f"@O{len(media) + 1}@",
+                    storage_key=storage_key,
+                    media_type=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+                    title=str(photo.get("caption", "")),
+                )
+                media.append(record)
+                individual.media.append(record.xref)
+        return media
+
+    def _write_media(self, archive, media):
+        written = set()
+        for record in media:
+            info = zipfile.ZipInfo(record.storage_key)
+            # Photos are already compressed; deflating them only costs CPU.
+            info.compress_type = zipfile.ZIP_STORED
+            try:
+                with self.media_source.open(record.storage_key) as source:
+                    with archive.open(info, "w", force_zip64=True) as target:
+                        shutil.copyfileobj(source, target, MEDIA_CHUNK_SIZE)
+            except FileNotFoundError:
+                print(f"Фотография не найдена и пропущена: {record.storage_key}")
+                continue
+            written.add(record.xref)
+        return written
+
+    def _drop_missing_media(self, model, written):
+        model.media = [record for record in model.media if record.xref in written]
+        for individual in model.individuals.values():
+            individual.media = [xref for xref in individual.media if xref in written]
+
+    def _header_lines(self):
+        return [
+            "0 HEAD",
+            "1 GEDC",
+            "2 VERS 7.0",
+            "1 SOUR family_tree",
+        ]
+
+    def _individual_lines(self, individual):
+        lines = super()._individual_lines(individual)
+        for media_xref in individual.media:
+            lines.append(f"1 OBJE {media_xref}")
+        return lines
+
+    def _extra_records(self, model):
+        for record in model.media:
+            yield record.xref, record, partial(self._media_lines, record)
+
+    def _media_lines(self, record):
+        lines = [
+            f"0 {record.xref} OBJE",
+            f"1 FILE {record.file_path}",
+            f"2 FORM {record.media_type}",
+        ]
+        if record.title:
+            lines.extend(self._text_lines(2, "TITL", record.title))
+        return lines
+
+    def _text_lines(self, level, tag, value):
+        # GEDCOM 7 keeps line breaks as CONT lines and escapes only a leading @.
+        parts = str(value).replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        lines = [f"{level} {tag} {gedcom7_text(parts[0])}".rstrip()]
+        lines.extend(f"{level + 1} CONT {gedcom7_text(part)}".rstrip() for part in parts[1:])
+        return lines
+
+
+def gedcom7_text(value):
+    return f"@{value}" if value.startswith("@") else value
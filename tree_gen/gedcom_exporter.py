@@ -2,23 +2,18 @@
 
 import re
 from dataclasses import dataclass, field
+from functools import partial
 from pathlib import Path
 
-
-GEDCOM_MONTHS = {
-    "01": "JAN",
-    "02": "FEB",
-    "03": "MAR",
-    "04": "APR",
-    "05": "MAY",
-    "06": "JUN",
-    "07": "JUL",
-    "08": "AUG",
-    "09": "SEP",
-    "10": "OCT",
-    "11": "NOV",
-    "12": "DEC",
-}
+# Date/name helpers used to live here; keep the old import paths working.
+from gedcom_normalize import (  # noqa: F401
+    GEDCOM_MONTHS,
+    extract_name,
+    format_date,
+    format_gedcom_name,
+    gedcom_text,
+    parse_dates,
+)
 
 
 @dataclass
@@ -32,6 +27,7 @@ class IndividualRecord:
     notes: list[str] = field(default_factory=list)
     fams: list[str] = field(default_factory=list)
     famc: list[str] = field(default_factory=list)
+    media: list[str] = field(default_factory=list)
 
 
 @dataclass
@@ -43,25 +39,97 @@ class FamilyRecord:
     notes: list[str] = field(default_factory=list)
 
 
+@dataclass
+class GedcomModel:
+    """Normalized GEDCOM records, shared by the text writer and the renderer.
+
+    ``records()`` yields the same dictionaries ``parse_gedcom_records`` would
+    return for ``GedcomExporter.to_string()``, so callers can skip writing and
+    re-reading the file when they only need the tree model.
+    """
+
+    individuals: dict[str, IndividualRecord]
+    families: list[FamilyRecord]
+    media: list = field(default_factory=list)
+
+    def sorted_individuals(self):
+        for xref in sorted(self.individuals, key=xref_sort_key):
+            yield self.individuals[xref]
+
+    def records(self):
+        records = []
+        for individual in self.sorted_individuals():
+            record = {
+                "xref": individual.xref,
+                "tag": "INDI",
+                "NAME": [gedcom_text(individual.name)],
+            }
+            if individual.birth_date:
+                record["BIRT"] = [""]
+                record["BIRT.DATE"] = [individual.birth_date]
+            if individual.death_date:
+                record["DEAT"] = [""]
+                record["DEAT.DATE"] = [individual.death_date]
+            if individual.fams:
+                record["FAMS"] = list(individual.fams)
+            if individual.famc:
+                record["FAMC"] = list(individual.famc)
+            if individual.notes:
+                record["NOTE"] = [gedcom_text(note) for note in individual.notes]
+            records.append(record)
+
+        for family in self.families:
+            record = {"xref": family.xref, "tag": "FAM"}
+            if family.parent1:
+                record["HUSB"] = [family.parent1]
+            if family.parent2:
+                record["WIFE"] = [family.parent2]
+            if family.children:
+                record["CHIL"] = list(family.children)
+            if family.notes:
+                record["NOTE"] = [gedcom_text(note) for note in family.notes]
+            records.append(record)
+        return records
+
+
 class GedcomExporter:
     def __init__(self, builder):
         self.builder = builder
 
-    def to_string(self):
+    def build_model(self):
         individuals = self._build_individuals()
         families = self._build_families(individuals)
+        return GedcomModel(individuals=individuals, families=families)
 
-        lines = self._header_lines()
-        for xref in sorted(individuals, key=self._xref_sort_key):
-            lines.extend(self._individual_lines(individuals[xref]))
-        for family in families:
-            lines.extend(self._family_lines(family))
-        lines.append("0 TRLR")
-        return "\n".join(lines) + "\n"
+    def to_string(self, model=None):
+        return "".join(self.iter_chunks(model))
 
-    def write_file(self, output_path):
+    def write_file(self, output_path, model=None):
         output_path = Path(output_path)
-        output_path.write_text(self.to_string(), encoding="utf-8")
+        with output_path.open("w", encoding="utf-8", newline="\n") as target:
+            target.writelines(self.iter_chunks(model))
+
+    def iter_chunks(self, model=None):
+        """Yield the GEDCOM text record by record instead of as one string."""
+        model = model or self.build_model()
+        for _, _, render in self.iter_records(model):
+            yield join_lines(render())
+
+    def iter_records(self, model):
+        """Yield ``(key, record, render)`` for every GEDCOM record in file order.
+
+        ``record`` is the data the block is rendered from and ``render()``
+        returns its lines, so callers can decide per record whether the text
+        needs to be produced at all.
+        """
+        header = self._header_lines()
+        yield "HEAD", header, lambda: header
+        for individual in model.sorted_individuals():
+            yield individual.xref, individual, partial(self._individual_lines, individual)
+        for family in model.families:
+            yield family.xref, family, partial(self._family_lines, family)
+        yield from self._extra_records(model)
+        yield "TRLR", None, lambda: ["0 TRLR"]
 
     def _build_individuals(self):
         individuals = {}
@@ -86,10 +154,42 @@ class GedcomExporter:
 
     def _build_families(self, individuals):
         families = []
+        used_xrefs = set()
+
+        def family_xref(parent1, parent2, children):
+            # Derived from the parents' source IDs rather than the position in
+            # the list, so adding a marriage doesn't renumber every later family
+            # and the FAMS/FAMC lines of its members (see gedcom_incremental).
+            parents = sorted(
+                (parent for parent in (parent1, parent2) if parent is not None),
+                key=lambda parent: xref_sort_key(str(parent)),
+            )
+            key = "_".join(str(parent) for parent in parents)
+            if len(parents) < 2 and children:
+                key += f"_C{children[0]}"
+            xref, suffix = f"@F{key}@", 2
+            while xref in used_xrefs:
+                xref, suffix = f"@F{key}_{suffix}@", suffix + 1
+            used_xrefs.add(xref)
+            return xref
+
+        def add_unknown_children(xref, count):
+            placeholders = []
+            for index in range(1, count + 1):
+                child_xref = f"@IUNKNOWN{xref.strip('@')[1:]}_{index}@"
+                individuals[child_xref] = IndividualRecord(
+                    xref=child_xref,
+                    name="? //",
+                    source_id=child_xref.strip("@"),
+                    original_info="?",
+                    notes=["Unknown child placeholder"],
+                )
+                placeholders.append(child_xref)
+            return placeholders
 
-        def add_family(parent1=None, parent2=None, children=None, notes=None):
+        def add_family(parent1=None, parent2=None, children=None, notes=None, xref=None):
             family = FamilyRecord(
-                xref=f"@F{len(families) + 1}@",
+                xref=xref or family_xref(parent1, parent2, children),
                 parent1=self._person_xref(parent1) if parent1 is not None else None,
                 parent2=self._person_xref(parent2) if parent2 is not None else None,
                 children=[
@@ -112,36 +212,29 @@ class GedcomExporter:
         for parent1, parent2, children in self.builder.marriages:
             add_family(parent1, parent2, children)
 
-        unknown_child_counter = 1
         for parent1, parent2, known_children, unknown_count in self.builder.mixed_children_marriages:
-            children = list(known_children)
-            for _ in range(unknown_count):
-                xref = f"@IUNKNOWN{unknown_child_counter}@"
-                unknown_child_counter += 1
-                individuals[xref] = IndividualRecord(
-                    xref=xref,
-                    name="? //",
-                    source_id=xref.strip("@"),
-                    original_info="?",
-                    notes=["Unknown child placeholder"],
-                )
-                children.append(xref)
-            add_family(parent1, parent2, children, notes=["Family has unknown child placeholders"])
+            xref = family_xref(parent1, parent2, known_children)
+            children = list(known_children) + add_unknown_children(xref, unknown_count)
+            add_family(
+                parent1,
+                parent2,
+                children,
+                notes=["Family has unknown child placeholders"],
+                xref=xref,
+            )
 
         for parent1, parent2 in self.builder.childless_marriages:
             add_family(parent1, parent2, notes=["Family has no known children in source"])
 
         for parent1, parent2 in self.builder.unknown_children_marriages:
-            xref = f"@IUNKNOWN{unknown_child_counter}@"
-            unknown_child_counter += 1
-            individuals[xref] = IndividualRecord(
+            xref = family_xref(parent1, parent2, [])
+            add_family(
+                parent1,
+                parent2,
+                add_unknown_children(xref, 1),
+                notes=["Family has unknown children in source"],
                 xref=xref,
-                name="? //",
-                source_id=xref.strip("@"),
-                original_info="?",
-                notes=["Unknown child placeholder"],
             )
-            add_family(parent1, parent2, [xref], notes=["Family has unknown children in source"])
 
         for parent, child in self.builder.single_parent_children:
             add_family(parent1=parent, children=[child], notes=["Single-parent relationship in source"])
@@ -162,7 +255,7 @@ class GedcomExporter:
         for famc in individual.famc:
             lines.append(f"1 FAMC {famc}")
         for note in individual.notes:
-            lines.append(f"1 NOTE {gedcom_text(note)}")
+            lines.extend(self._text_lines(1, "NOTE", note))
         return lines
 
     def _family_lines(self, family):
@@ -174,9 +267,15 @@ class GedcomExporter:
         for child in family.children:
             lines.append(f"1 CHIL {child}")
         for note in family.notes:
-            lines.append(f"1 NOTE {gedcom_text(note)}")
+            lines.extend(self._text_lines(1, "NOTE", note))
         return lines
 
+    def _text_lines(self, level, tag, value):
+        return [f"{level} {tag} {gedcom_text(value)}"]
+
+    def _extra_records(self, model):
+        return []
+
     def _header_lines(self):
         return [
             "0 HEAD",
@@ -191,63 +290,15 @@ class GedcomExporter:
         return f"@I{person_id}@"
 
     def _xref_sort_key(self, xref):
-        match = re.search(r"\d+", xref)
-        if match:
-            return (0, int(match.group(0)), xref)
-        return (1, 0, xref)
-
-
-def extract_name(info):
-    return info.split("(", 1)[0].strip()
-
-
-def format_gedcom_name(name):
-    name = gedcom_text(name.strip())
-    if name == "?":
-        return "? //"
-    parts = name.split()
-    if len(parts) >= 2:
-        return f"{' '.join(parts[1:])} /{parts[0]}/"
-    return name
-
-
-def parse_dates(info):
-    match = re.search(r"\(([^)]*)\)", info)
-    if not match:
-        return "", "", ""
-    value = " ".join(match.group(1).split())
-    if not value or "неизвест" in value.lower():
-        return "", "", f"Date text: {value}" if value else ""
-
-    date_range = re.fullmatch(r"(.+?)\s*-\s*(.+)", value)
-    if date_range:
-        birth_date = format_date(date_range.group(1).strip())
-        death_date = format_date(date_range.group(2).strip())
-        return birth_date, death_date, "" if birth_date or death_date else f"Date text: {value}"
-
-    date_value = format_date(value)
-    return date_value, "", "" if date_value else f"Date text: {value}"
-
-
-def format_date(value):
-    value = value.strip()
-    if not value or value in {"...", "?", "неизвестно", "неизвестны"}:
-        return ""
-
-    full_date = re.fullmatch(r"(\d{1,2})\.(\d{1,2})\.(\d{4})", value)
-    if full_date:
-        day = str(int(full_date.group(1)))
-        month = GEDCOM_MONTHS.get(full_date.group(2).zfill(2))
-        year = full_date.group(3)
-        if month:
-            return f"{day} {month} {year}"
+        return xref_sort_key(xref)
 
-    year = re.fullmatch(r"\d{4}", value)
-    if year:
-        return value
 
-    return ""
+def xref_sort_key(xref):
+    match = re.search(r"\d+", xref)
+    if match:
+        return (0, int(match.group(0)), xref)
+    return (1, 0, xref)
 
 
-def gedcom_text(value):
-    return str(value).replace("\r", " ").replace("\n", " ").replace("@", "(at)")
+def join_lines(lines):
+    return "\n".join(lines) + "\n"
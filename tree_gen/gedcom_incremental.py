@@ -0,0 +1,174 @@
+"""Incremental GEDCOM export that reuses unchanged records from the last run."""
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from gedcom_exporter import join_lines
+
+
+MANIFEST_VERSION = 1
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class ChangeReport:
+    added: list[str] = field(default_factory=list)
+    changed: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    reused: int = 0
+    rewritten: bool = True
+
+    @property
+    def has_changes(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def summary(self):
+        if not self.rewritten:
+            return "GEDCOM не изменился, файл не перезаписан"
+        return (
+            f"добавлено {len(self.added)}, изменено {len(self.changed)}, "
+            f"удалено {len(self.removed)}, без изменений {self.reused}"
+        )
+
+    def to_dict(self):
+        return {
+            "added": self.added,
+            "changed": self.changed,
+            "removed": self.removed,
+            "reused": self.reused,
+            "rewritten": self.rewritten,
+        }
+
+
+class IncrementalGedcomWriter:
+    """Write a GEDCOM file, re-rendering only records whose content changed.
+
+    Next to ``<output>`` the writer keeps ``<output>.manifest.json`` with a
+    digest and byte range per record.  On the next run each record's digest
+    is computed from the exporter model; unchanged records are copied from
+    the previous file by byte range instead of being rendered again, and if
+    nothing changed the file is left untouched.
+
+    What this saves is rendering, not I/O: when anything changed, the whole
+    file is still written anew through ``<output>.tmp`` and swapped in, since
+    records that change length shift every later byte range.  Family xrefs
+    are derived from the parents' IDs, so one edit changes only its own
+    records and the records that link to them.
+    """
+
+    def __init__(self, exporter):
+        self.exporter = exporter
+
+    @staticmethod
+    def manifest_path(output_path):
+        output_path = Path(output_path)
+        return output_path.with_name(f"{output_path.name}.manifest.json")
+
+    def write_file(self, output_path, model=None):
+        output_path = Path(output_path)
+        model = model or self.exporter.build_model()
+        entries = [
+            (key, self._digest(record), render)
+            for key, record, render in self.exporter.iter_records(model)
+        ]
+        previous = self._load_manifest(output_path)
+        previous_records = {record["key"]: record for record in previous.get("records", [])}
+        report = self._change_report(entries, previous_records)
+
+        same_layout = [
+            (record["key"], record["digest"]) for record in previous.get("records", [])
+        ] == [(key, digest) for key, digest, _ in entries]
+        if previous and same_layout:
+            report.rewritten = False
+            return report
+
+        temp_path = output_path.with_name(f"{output_path.name}.tmp")
+        manifest_records = []
+        offset = 0
+        with temp_path.open("wb") as target:
+            source = output_path.open("rb") if previous_records else None
+            try:
+                for key, digest, render in entries:
+                    old = previous_records.get(key)
+                    if source and old and old["digest"] == digest:
+                        length = self._copy_range(source, target, old["offset"], old["length"])
+                    else:
+                        data = join_lines(render()).encode("utf-8")
+                        target.write(data)
+                        length = len(data)
+                    manifest_records.append(
+                        {"key": key, "digest": digest, "offset": offset, "length": length}
+                    )
+                    offset += length
+            finally:
+                if source:
+                    source.close()
+
+        temp_path.replace(output_path)
+        self._save_manifest(output_path, manifest_records, offset, report)
+        return report
+
+    def _digest(self, record):
+        # repr() of the dataclass records covers every field that is rendered.
+        payload = f"{type(self.exporter).__name__}\0{record!r}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _change_report(self, entries, previous_records):
+        report = ChangeReport()
+        keys = set()
+        for key, digest, _ in entries:
+            keys.add(key)
+            old = previous_records.get(key)
+            if old is None:
+                report.added.append(key)
+            elif old["digest"] != digest:
+                report.changed.append(key)
+            else:
+                report.reused += 1
+        report.removed = [key for key in previous_records if key not in keys]
+        return report
+
+    def _load_manifest(self, output_path):
+        manifest_path = self.manifest_path(output_path)
+        if not output_path.exists() or not manifest_path.exists():
+            return {}
+        try:
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        except ValueError:
+            return {}
+
+        # A file edited or replaced by hand can't be patched by byte ranges.
+        if (
+            manifest.get("version") != MANIFEST_VERSION
+            or manifest.get("size") != output_path.stat().st_size
+            or manifest.get("mtime_ns") != output_path.stat().st_mtime_ns
+        ):
+            return {}
+        return manifest
+
+    def _save_manifest(self, output_path, records, size, report):
+        manifest_path = self.manifest_path(output_path)
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "size": size,
+            "mtime_ns": output_path.stat().st_mtime_ns,
+            "records": records,
+            "last_report": report.to_dict(),
+        }
+        temp_path = manifest_path.with_name(f"{manifest_path.name}.tmp")
+        temp_path.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+        os.replace(temp_path, manifest_path)
+
+    def _copy_range(self, source, target, offset, length):
+        source.seek(offset)
+        remaining = length
+        while remaining:
+            chunk = source.read(min(COPY_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise ValueError("Previous GEDCOM file is shorter than its manifest")
+            target.write(chunk)
+            remaining -= len(chunk)
+        return length
@@ -0,0 +1,280 @@
+"""Date and name normalisation shared by GEDCOM export and import.
+
+Both directions run on every person, and the same date strings ("1950",
+"неизвестны", "около 1900") repeat thousands of times in a family tree, so
+the grammars are compiled once and results are memoised by input string.
+
+Supported source date forms and their GEDCOM equivalents::
+
+    01.02.1980            1 FEB 1980
+    02.1980               FEB 1980
+    1980                  1980
+    около 1980 / ~1980    ABT 1980
+    до 1980               BEF 1980
+    после 1980            AFT 1980
+    между 1980 и 1985     BET 1980 AND 1985
+    с 1980 по 1985        FROM 1980 TO 1985
+
+Run ``python gedcom_normalize.py`` to benchmark a million conversions.
+"""
+
+import re
+from functools import lru_cache
+
+
+CACHE_SIZE = 65536
+
+GEDCOM_MONTHS = {
+    "01": "JAN",
+    "02": "FEB",
+    "03": "MAR",
+    "04": "APR",
+    "05": "MAY",
+    "06": "JUN",
+    "07": "JUL",
+    "08": "AUG",
+    "09": "SEP",
+    "10": "OCT",
+    "11": "NOV",
+    "12": "DEC",
+}
+SOURCE_MONTHS = {month: number for number, month in GEDCOM_MONTHS.items()}
+
+UNKNOWN_DATES = {"...", "?", "неизвестно", "неизвестны"}
+
+PARENTHESES = re.compile(r"\(([^)]*)\)")
+DATE_RANGE = re.compile(r"(.+?)\s*-\s*(.+)")
+SOURCE_FULL_DATE = re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{4})")
+SOURCE_MONTH_DATE = re.compile(r"(\d{1,2})\.(\d{4})")
+YEAR = re.compile(r"\d{4}")
+SOURCE_APPROXIMATE = re.compile(r"(?:около|ок\.|примерно|~)\s*(.+)", re.IGNORECASE)
+SOURCE_BEFORE = re.compile(r"до\s+(.+)", re.IGNORECASE)
+SOURCE_AFTER = re.compile(r"после\s+(.+)", re.IGNORECASE)
+SOURCE_BETWEEN = re.compile(r"между\s+(.+?)\s+и\s+(.+)", re.IGNORECASE)
+SOURCE_PERIOD = re.compile(r"с\s+(.+?)\s+по\s+(.+)", re.IGNORECASE)
+
+GEDCOM_CALENDAR = re.compile(r"^(?:@#DGREGORIAN@|GREGORIAN)\s+")
+GEDCOM_FULL_DATE = re.compile(r"(\d{1,2})\s+([A-Z]{3})\s+(\d{4})")
+GEDCOM_MONTH_DATE = re.compile(r"([A-Z]{3})\s+(\d{4})")
+GEDCOM_QUALIFIED = re.compile(r"(ABT|CAL|EST|BEF|AFT)\s+(.+)")
+GEDCOM_BETWEEN = re.compile(r"BET\s+(.+?)\s+AND\s+(.+)")
+GEDCOM_PERIOD = re.compile(r"FROM\s+(.+?)\s+TO\s+(.+)")
+
+GEDCOM_QUALIFIER_TEXT = {
+    "ABT": "около",
+    "CAL": "около",
+    "EST": "около",
+    "BEF": "до",
+    "AFT": "после",
+}
+
+NAME_SURNAME = re.compile(r"/([^/]*)/")
+
+
+def extract_name(info):
+    return info.split("(", 1)[0].strip()
+
+
+def gedcom_text(value):
+    return str(value).replace("\r", " ").replace("\n", " ").replace("@", "(at)")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def format_gedcom_name(name):
+    name = gedcom_text(name.strip())
+    if name == "?":
+        return "? //"
+    parts = name.split()
+    if len(parts) >= 2:
+        return f"{' '.join(parts[1:])} /{parts[0]}/"
+    return name
+
+
+def parse_dates(info):
+    """Return ``(birth, death, note)`` GEDCOM values for a source.txt line."""
+    match = PARENTHESES.search(info)
+    if not match:
+        return "", "", ""
+    return _parse_date_text(" ".join(match.group(1).split()))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_date_text(value):
+    if not value or "неизвест" in value.lower():
+        return "", "", f"Date text: {value}" if value else ""
+
+    date_range = DATE_RANGE.fullmatch(value)
+    if date_range:
+        birth_date = format_date(date_range.group(1).strip())
+        death_date = format_date(date_range.group(2).strip())
+        return birth_date, death_date, "" if birth_date or death_date else f"Date text: {value}"
+
+    date_value = format_date(value)
+    return date_value, "", "" if date_value else f"Date text: {value}"
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def format_date(value):
+    """Convert one source date to a GEDCOM date value, or "" if unsupported."""
+    value = value.strip()
+    if not value or value in UNKNOWN_DATES:
+        return ""
+
+    between = SOURCE_BETWEEN.fullmatch(value)
+    if between:
+        return _qualified_range("BET", "AND", between.group(1), between.group(2))
+    period = SOURCE_PERIOD.fullmatch(value)
+    if period:
+        return _qualified_range("FROM", "TO", period.group(1), period.group(2))
+
+    for qualifier, pattern in (
+        ("ABT", SOURCE_APPROXIMATE),
+        ("BEF", SOURCE_BEFORE),
+        ("AFT", SOURCE_AFTER),
+    ):
+        match = pattern.fullmatch(value)
+        if match:
+            date_value = _format_exact_date(match.group(1).strip())
+            return f"{qualifier} {date_value}" if date_value else ""
+
+    return _format_exact_date(value)
+
+
+def _qualified_range(start_keyword, end_keyword, start, end):
+    start_date = _format_exact_date(start.strip())
+    end_date = _format_exact_date(end.strip())
+    if not start_date or not end_date:
+        return ""
+    return f"{start_keyword} {start_date} {end_keyword} {end_date}"
+
+
+def _format_exact_date(value):
+    full_date = SOURCE_FULL_DATE.fullmatch(value)
+    if full_date:
+        day = str(int(full_date.group(1)))
+        month = GEDCOM_MONTHS.get(full_date.group(2).zfill(2))
+        if month:
+            return f"{day} {month} {full_date.group(3)}"
+        return ""
+
+    month_date = SOURCE_MONTH_DATE.fullmatch(value)
+    if month_date:
+        month = GEDCOM_MONTHS.get(month_date.group(1).zfill(2))
+        return f"{month} {month_date.group(2)}" if month else ""
+
+    if YEAR.fullmatch(value):
+        return value
+
+    return ""
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def gedcom_date_to_source_date(value):
+    """Convert a GEDCOM date value back to the source.txt notation."""
+    value = (value or "").strip()
+    if not value:
+        return ""
+    normalized = GEDCOM_CALENDAR.sub("", value.upper())
+
+    between = GEDCOM_BETWEEN.fullmatch(normalized)
+    if between:
+        start = _source_exact_date(between.group(1))
+        end = _source_exact_date(between.group(2))
+        if start and end:
+            return f"между {start} и {end}"
+        return value
+    period = GEDCOM_PERIOD.fullmatch(normalized)
+    if period:
+        start = _source_exact_date(period.group(1))
+        end = _source_exact_date(period.group(2))
+        if start and end:
+            return f"с {start} по {end}"
+        return value
+
+    qualified = GEDCOM_QUALIFIED.fullmatch(normalized)
+    if qualified:
+        date_value = _source_exact_date(qualified.group(2))
+        if date_value:
+            return f"{GEDCOM_QUALIFIER_TEXT[qualified.group(1)]} {date_value}"
+        return value
+
+    return _source_exact_date(normalized) or value
+
+
+def _source_exact_date(value):
+    if YEAR.fullmatch(value):
+        return value
+
+    full_date = GEDCOM_FULL_DATE.fullmatch(value)
+    if full_date:
+        month = SOURCE_MONTHS.get(full_date.group(2))
+        if month:
+            return f"{int(full_date.group(1)):02d}.{month}.{full_date.group(3)}"
+        return ""
+
+    month_date = GEDCOM_MONTH_DATE.fullmatch(value)
+    if month_date:
+        month = SOURCE_MONTHS.get(month_date.group(1))
+        if month:
+            return f"{month}.{month_date.group(2)}"
+
+    return ""
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def gedcom_name_to_display(value):
+    value = " ".join(value.replace("/", " / ").split())
+    surname_match = NAME_SURNAME.search(value)
+    if not surname_match:
+        return value.replace("/", "").strip()
+
+    surname = surname_match.group(1).strip()
+    given = (value[:surname_match.start()] + value[surname_match.end():]).strip()
+    return " ".join(part for part in [surname, given] if part)
+
+
+def clear_caches():
+    for cached in (
+        format_gedcom_name,
+        _parse_date_text,
+        format_date,
+        gedcom_date_to_source_date,
+        gedcom_name_to_display,
+    ):
+        cached.cache_clear()
+
+
+def benchmark(count=1_000_000):
+    import random
+    import time
+
+    samples = [
+        "неизвестны", "1950", "01.02.1980-03.04.2020", "1901-1980",
+        "около 1900", "между 1900 и 1905", "12.1941", "...-1999",
+    ] + [str(year) for year in range(1800, 2025)]
+    gedcom_samples = [
+        "1950", "1 FEB 1980", "ABT 1900", "BET 1900 AND 1905", "DEC 1941", "BEF 1800",
+    ] + [str(year) for year in range(1800, 2025)]
+    rng = random.Random(0)
+    dates = [rng.choice(samples) for _ in range(count)]
+    gedcom_dates = [rng.choice(gedcom_samples) for _ in range(count)]
+
+    clear_caches()
+    started = time.perf_counter()
+    for value in dates:
+        _parse_date_text(value)
+    export_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for value in gedcom_dates:
+        gedcom_date_to_source_date(value)
+    import_seconds = time.perf_counter() - started
+
+    print(f"{count} source dates -> GEDCOM: {export_seconds:.2f}s")
+    print(f"{count} GEDCOM dates -> source: {import_seconds:.2f}s")
+    print(f"export cache: {_parse_date_text.cache_info()}")
+    print(f"import cache: {gedcom_date_to_source_date.cache_info()}")
+
+
+if __name__ == "__main__":
+    benchmark()
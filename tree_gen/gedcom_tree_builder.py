@@ -4,6 +4,11 @@ import re
 from pathlib import Path
 
 from family_tree_builder import FamilyTreeBuilder
+from gedcom_normalize import (  # noqa: F401
+    SOURCE_MONTHS,
+    gedcom_date_to_source_date,
+    gedcom_name_to_display,
+)
 
 
 class GedcomTreeBuilder(FamilyTreeBuilder):
@@ -15,7 +20,23 @@ class GedcomTreeBuilder(FamilyTreeBuilder):
     back to numeric parts of ``@I...@`` xrefs or generated IDs.
     """
 
+    def __init__(self):
+        super().__init__()
+        self._used_person_ids = set()
+        self._next_unknown_id = 1000
+
     def parse_gedcom_file(self, filename):
+        self.load_gedcom_records(parse_gedcom_records(Path(filename)))
+
+    def load_gedcom_model(self, model):
+        """Build the tree straight from an exporter ``GedcomModel``.
+
+        This is the in-memory equivalent of writing the model with
+        ``GedcomExporter`` and reading it back with ``parse_gedcom_file``.
+        """
+        self.load_gedcom_records(model.records())
+
+    def load_gedcom_records(self, records):
         self.people.clear()
         self.marriages.clear()
         self.single_parent_children.clear()
@@ -23,7 +44,6 @@ class GedcomTreeBuilder(FamilyTreeBuilder):
         self.unknown_children_marriages.clear()
         self.mixed_children_marriages.clear()
 
-        records = parse_gedcom_records(Path(filename))
         individuals = {
             record["xref"]: record
             for record in records
@@ -35,11 +55,11 @@ class GedcomTreeBuilder(FamilyTreeBuilder):
             if record["tag"] == "FAM" and record["xref"]
         ]
 
-        xref_to_person_id = {}
+        self._used_person_ids = set()
+        self._next_unknown_id = 1000
+        xref_to_person_id = self._assign_person_ids(individuals)
         for xref, record in individuals.items():
-            person_id = self._person_id_for_record(xref, record, xref_to_person_id)
-            xref_to_person_id[xref] = person_id
-            self.people[person_id] = self._person_info_for_record(record)
+            self.people[xref_to_person_id[xref]] = self._person_info_for_record(record)
 
         for family in families:
             parent_xrefs = family.get("HUSB", []) + family.get("WIFE", [])
@@ -63,20 +83,47 @@ class GedcomTreeBuilder(FamilyTreeBuilder):
                 for child_id in child_ids:
                     self.single_parent_children.append((parent_ids[0], child_id))
 
-    def _person_id_for_record(self, xref, record, used_ids):
-        source_id = first_source_id(record)
-        if source_id and source_id.isdigit():
-            candidate = int(source_id)
-            if candidate not in used_ids.values():
-                return candidate
-
-        match = re.search(r"\d+", xref)
-        if match:
-            candidate = int(match.group(0))
-            if candidate not in used_ids.values():
-                return candidate
+    def _assign_person_ids(self, individuals):
+        """Map INDI xrefs to numeric person IDs in three deterministic passes.
 
-        return self._get_next_unknown_id()
+        ``Source ID`` notes are claimed first, in file order, so an explicit
+        ID always wins over a record whose xref merely contains the same
+        digits.  Remaining records then try their xref digits, and whatever
+        still collides gets a generated unknown ID.
+        """
+        xref_to_person_id = {}
+        for xref, record in individuals.items():
+            source_id = first_source_id(record)
+            if source_id.isdigit():
+                self._claim_person_id(xref, int(source_id), xref_to_person_id)
+
+        for xref in individuals:
+            if xref in xref_to_person_id:
+                continue
+            match = XREF_DIGITS.search(xref)
+            if match:
+                self._claim_person_id(xref, int(match.group(0)), xref_to_person_id)
+
+        for xref in individuals:
+            if xref not in xref_to_person_id:
+                xref_to_person_id[xref] = self._get_next_unknown_id()
+        return xref_to_person_id
+
+    def _claim_person_id(self, xref, candidate, xref_to_person_id):
+        if candidate in self._used_person_ids:
+            return
+        self._used_person_ids.add(candidate)
+        xref_to_person_id[xref] = candidate
+
+    def _get_next_unknown_id(self):
+        # Unknown IDs only grow, so each allocation skips past claimed IDs
+        # once instead of rescanning from 1000 on every call.
+        while self._next_unknown_id in self._used_person_ids:
+            self._next_unknown_id += 1
+        unknown_id = self._next_unknown_id
+        self._used_person_ids.add(unknown_id)
+        self._next_unknown_id += 1
+        return unknown_id
 
     def _person_id_for_xref(self, xref, xref_to_person_id):
         if xref in xref_to_person_id:
@@ -105,6 +152,9 @@ class GedcomTreeBuilder(FamilyTreeBuilder):
         return name
 
 
+XREF_DIGITS = re.compile(r"\d+")
+
+
 def parse_gedcom_records(path):
     records = []
     current = None
@@ -185,48 +235,3 @@ def first_prefixed_note(record, prefix):
 
 def first_source_id(record):
     return first_prefixed_note(record, "Source ID:")
-
-
-def gedcom_name_to_display(value):
-    value = " ".join(value.replace("/", " / ").split())
-    surname_match = re.search(r"/([^/]*)/", value)
-    if not surname_match:
-        return value.replace("/", "").strip()
-
-    surname = surname_match.group(1).strip()
-    given = (value[:surname_match.start()] + value[surname_match.end():]).strip()
-    return " ".join(part for part in [surname, given] if part)
-
-
-def gedcom_date_to_source_date(value):
-    value = (value or "").strip()
-    if not value:
-        return ""
-
-    year = re.fullmatch(r"\d{4}", value)
-    if year:
-        return value
-
-    full_date = re.fullmatch(r"(\d{1,2})\s+([A-Z]{3})\s+(\d{4})", value.upper())
-    if full_date:
-        month = SOURCE_MONTHS.get(full_date.group(2))
-        if month:
-            return f"{int(full_date.group(1)):02d}.{month}.{full_date.group(3)}"
-
-    return value
-
-
-SOURCE_MONTHS = {
-    "JAN": "01",
-    "FEB": "02",
-    "MAR": "03",
-    "APR": "04",
-    "MAY": "05",
-    "JUN": "06",
-    "JUL": "07",
-    "AUG": "08",
-    "SEP": "09",
-    "OCT": "10",
-    "NOV": "11",
-    "DEC": "12",
-}